@@ -0,0 +1,129 @@
+"""Análise de consumo: médias de saída, dias de cobertura e pontos de reposição
+
+Os cálculos são feitos em SQL sobre consumo_diario, um resumo das saídas por
+produto e dia que é atualizado incrementalmente: cada execução agrega apenas as
+movimentações gravadas depois da anterior.
+"""
+import math
+import sqlite3
+from datetime import datetime
+
+from banco import TIPOS_MOVIMENTACAO, conectar, definir_estoques_minimos
+
+# Movimentações agregadas por transação ao atualizar o resumo de consumo
+TAMANHO_BLOCO_ANALISE = 500_000
+
+# Parâmetros padrão do cálculo de reposição
+JANELA_DIAS = 90        # histórico considerado nas médias e no desvio
+PRAZO_ENTREGA = 7       # dias entre o pedido e a chegada da mercadoria
+COBERTURA_PEDIDO = 14   # dias de consumo que cada pedido deve cobrir
+NIVEL_SERVICO = 1.65    # fator z do estoque de segurança (~95% sem ruptura)
+
+def _garantir_funcoes_matematicas(conn):
+    """Registra sqrt e ceil na conexão se o SQLite não tiver as funções matemáticas"""
+    try:
+        conn.execute('SELECT sqrt(4), ceil(1.5)')
+    except sqlite3.OperationalError:
+        conn.create_function('sqrt', 1, math.sqrt, deterministic=True)
+        conn.create_function('ceil', 1, math.ceil, deterministic=True)
+
+def atualizar_consumo(progresso=None, cancelar=None):
+    """Agrega em consumo_diario as saídas registradas desde a última atualização
+
+    Processa as movimentações em blocos de id, cada um em sua transação;
+    progresso(movimentacoes_processadas, fracao) é chamado após cada bloco e
+    cancelar.is_set() interrompe entre blocos (o que já foi agregado é mantido).
+    Retorna quantas movimentações foram processadas.
+    """
+    conn = conectar()
+    ultima = conn.execute('SELECT ultima_movimentacao FROM analise_controle WHERE id = 1').fetchone()[0]
+    maior = conn.execute('SELECT COALESCE(MAX(id), 0) FROM movimentacoes').fetchone()[0]
+    total = max(maior - ultima, 1)
+    processadas = 0
+
+    while ultima < maior:
+        if cancelar is not None and cancelar.is_set():
+            break
+        ate = min(ultima + TAMANHO_BLOCO_ANALISE, maior)
+        # IMMEDIATE: dois processos não agregam o mesmo intervalo
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            inicio = conn.execute(
+                'SELECT ultima_movimentacao FROM analise_controle WHERE id = 1'
+            ).fetchone()[0]
+            if inicio < ate:
+                conn.execute('''
+                    INSERT INTO consumo_diario (dia, produto_id, saidas)
+                    SELECT date(data, 'unixepoch'), produto_id, SUM(quantidade)
+                    FROM movimentacoes
+                    WHERE id > ? AND id <= ? AND tipo = ?
+                    GROUP BY 1, 2
+                    ON CONFLICT (dia, produto_id) DO UPDATE SET saidas = saidas + excluded.saidas
+                ''', (inicio, ate, TIPOS_MOVIMENTACAO['saida']))
+                conn.execute('UPDATE analise_controle SET ultima_movimentacao = ? WHERE id = 1', (ate,))
+        processadas += ate - ultima
+        ultima = ate
+        if progresso:
+            progresso(processadas, processadas / total)
+
+    return processadas
+
+def relatorio_reposicao(janela=JANELA_DIAS, prazo=PRAZO_ENTREGA, cobertura=COBERTURA_PEDIDO,
+                        nivel_servico=NIVEL_SERVICO, hoje=None, limite=None):
+    """Calcula consumo e reposição de todos os produtos, os mais urgentes primeiro
+
+    Usa o resumo de consumo como está; chame atualizar_consumo antes para incluir
+    as movimentações mais recentes. Retorna tuplas (id, nome, quantidade,
+    estoque_minimo, media_7_dias, media_janela, desvio, dias_cobertura,
+    ponto_reposicao, quantidade_sugerida); dias_cobertura é None sem consumo.
+    O ponto de reposição cobre o consumo médio no prazo de entrega mais o estoque
+    de segurança; a sugestão repõe até o ponto mais `cobertura` dias de consumo.
+    """
+    hoje = hoje or datetime.now().strftime('%Y-%m-%d')
+    conn = conectar()
+    _garantir_funcoes_matematicas(conn)
+    cursor = conn.execute(f'''
+        WITH janela AS (
+            SELECT produto_id,
+                   SUM(saidas) * 1.0 / :janela AS media,
+                   SUM(saidas * saidas) * 1.0 / :janela AS quadrados,
+                   SUM(CASE WHEN dia > date(:hoje, '-7 days') THEN saidas ELSE 0 END) / 7.0 AS media_7
+            FROM consumo_diario
+            WHERE dia > date(:hoje, '-' || :janela || ' days') AND dia <= :hoje
+            GROUP BY produto_id
+        ),
+        estatisticas AS (
+            SELECT p.id, p.nome, p.quantidade, p.estoque_minimo,
+                   COALESCE(j.media_7, 0) AS media_7,
+                   COALESCE(j.media, 0) AS media,
+                   sqrt(max(COALESCE(j.quadrados - j.media * j.media, 0), 0)) AS desvio
+            FROM produtos p LEFT JOIN janela j ON j.produto_id = p.id
+        ),
+        pontos AS (
+            SELECT *, CAST(ceil(media * :prazo + :z * desvio * sqrt(:prazo)) AS INTEGER) AS ponto
+            FROM estatisticas
+        )
+        SELECT id, nome, quantidade, estoque_minimo,
+               round(media_7, 2), round(media, 2), round(desvio, 2),
+               CASE WHEN media > 0 THEN round(quantidade / media, 1) END AS dias_cobertura,
+               ponto,
+               CASE WHEN quantidade <= ponto
+                    THEN CAST(ceil(ponto + media * :cobertura - quantidade) AS INTEGER)
+                    ELSE 0 END
+        FROM pontos
+        ORDER BY dias_cobertura IS NULL, dias_cobertura, id
+        {'LIMIT :limite' if limite else ''}
+    ''', {'janela': janela, 'hoje': hoje, 'prazo': prazo, 'z': nivel_servico,
+          'cobertura': cobertura, 'limite': limite})
+    return cursor.fetchall()
+
+def aplicar_pontos_reposicao(janela=JANELA_DIAS, prazo=PRAZO_ENTREGA, nivel_servico=NIVEL_SERVICO,
+                             hoje=None):
+    """Grava o ponto de reposição calculado como estoque mínimo de cada produto
+
+    Produtos sem consumo na janela mantêm o mínimo atual. Retorna quantos mudaram.
+    """
+    relatorio = relatorio_reposicao(janela, prazo, nivel_servico=nivel_servico, hoje=hoje)
+    return definir_estoques_minimos(
+        [(linha[0], linha[8]) for linha in relatorio if linha[5] > 0]
+    )
@@ -0,0 +1,31 @@
+"""Arquiva as movimentações antigas em um banco por ano (para agendar no cron ou no Agendador)
+
+Uso: python arquivar.py [--dias 730] [--lote 5000]
+
+As movimentações com mais de --dias dias saem da tabela principal para
+estoque_arquivo_<ano>.db, ao lado do banco, em lotes de --lote linhas, cada um
+em sua transação: os terminais continuam gravando durante o arquivamento. O
+histórico, as exportações e o estoque em datas passadas continuam enxergando
+as movimentações arquivadas; os arquivos precisam acompanhar o banco nos backups
+(sem eles, as consultas que alcançam o ano faltante falham).
+"""
+import argparse
+import time
+
+import banco
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argumentos.add_argument('--dias', type=int, default=banco.HORIZONTE_ARQUIVO_DIAS,
+                            help="idade mínima das movimentações arquivadas")
+    argumentos.add_argument('--lote', type=int, default=banco.TAMANHO_LOTE_ARQUIVO,
+                            help="movimentações por transação")
+    opcoes = argumentos.parse_args()
+    inicio = time.perf_counter()
+    resultado = banco.arquivar_movimentacoes(
+        opcoes.dias, opcoes.lote,
+        progresso=lambda arquivadas: print(f"\r{arquivadas:,} movimentações arquivadas", end='', flush=True)
+    )
+    print(f"\r{resultado['arquivadas']:,} movimentações anteriores a {resultado['corte']} arquivadas "
+          f"em {time.perf_counter() - inicio:.1f}s"
+          + (f" (anos: {', '.join(map(str, resultado['anos']))})" if resultado['anos'] else ""))
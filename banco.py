@@ -1,253 +1,2157 @@
 import sqlite3
+import threading
+import atexit
+import os
 from datetime import datetime
-import csv
+import io
+import re
+from collections import OrderedDict
+# csv, gzip e concurrent.futures são importados só nas funções que os usam,
+# para não pesar na inicialização dos terminais
+
+# Instrumentação de chamadas e log de consultas lentas (ver metricas.py);
+# desligada, o módulo nem é importado e as funções não mudam
+METRICAS = os.environ.get('ESTOQUE_METRICAS') == '1'
+if METRICAS:
+    import metricas
+
+# Caminho do banco (pode ser definido pela variável de ambiente ESTOQUE_DB)
+CAMINHO_BANCO = os.environ.get('ESTOQUE_DB', 'estoque.db')
+
+# Quantidade de comandos preparados mantidos em cache em cada conexão
+TAMANHO_CACHE_COMANDOS = 256
+
+# Perfis de armazenamento aplicados a cada nova conexão (escolhidos por
+# ESTOQUE_PERFIL ou definir_perfil_armazenamento)
+PERFIS_ARMAZENAMENTO = {
+    # Durabilidade total: cada commit é sincronizado em disco
+    'seguro': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -8000,         # KiB (valores negativos = tamanho em KiB)
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,        # ms
+    },
+    # Maior vazão de escrita: em WAL, NORMAL só sincroniza nos checkpoints
+    'desempenho': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,      # 256 MiB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 10000,
+    },
+}
+PERFIL_ARMAZENAMENTO = os.environ.get('ESTOQUE_PERFIL', 'seguro')
+
+_NOMES_SYNCHRONOUS = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+_NOMES_TEMP_STORE = {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+
+# Cada thread mantém sua própria conexão persistente
+_local = threading.local()
+_conexoes_abertas = set()
+_trava_conexoes = threading.Lock()
+
+# O esquema é conferido (e criado ou migrado, se preciso) uma vez por processo,
+# ao abrir a primeira conexão, e não ao importar o módulo
+_esquema_conferido = False
+_trava_esquema = threading.Lock()
+
+def _conexao_saudavel(conn):
+    """Verifica se a conexão ainda está aberta e utilizável"""
+    try:
+        conn.total_changes
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+def _perfil_atual():
+    """Retorna as configurações do perfil de armazenamento em uso"""
+    if isinstance(PERFIL_ARMAZENAMENTO, dict):
+        return PERFIL_ARMAZENAMENTO
+    try:
+        return PERFIS_ARMAZENAMENTO[PERFIL_ARMAZENAMENTO]
+    except KeyError:
+        raise ValueError(f"Perfil de armazenamento desconhecido: {PERFIL_ARMAZENAMENTO}")
+
+def _aplicar_perfil(conn, perfil):
+    """Aplica os PRAGMAs do perfil a uma conexão recém-aberta"""
+    # busy_timeout primeiro, para que a troca de journal_mode também espere pelo lock
+    conn.execute(f"PRAGMA busy_timeout = {int(perfil['busy_timeout'])}")
+    conn.execute(f"PRAGMA journal_mode = {perfil['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {perfil['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {int(perfil['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(perfil['mmap_size'])}")
+    conn.execute(f"PRAGMA temp_store = {perfil['temp_store']}")
 
 def conectar():
-    """Conecta ao banco de dados SQLite"""
-    conn = sqlite3.connect('estoque.db')
+    """Retorna a conexão persistente da thread atual, abrindo-a se necessário"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _conexao_saudavel(conn):
+        return conn
+    
+    # check_same_thread=False apenas para permitir o fechamento em fechar_conexoes();
+    # cada conexão continua sendo usada somente pela thread que a abriu
+    perfil = _perfil_atual()
+    conn = sqlite3.connect(
+        CAMINHO_BANCO,
+        timeout=perfil['busy_timeout'] / 1000,
+        check_same_thread=False,
+        cached_statements=TAMANHO_CACHE_COMANDOS,
+        factory=metricas.ConexaoInstrumentada if METRICAS else sqlite3.Connection
+    )
+    if METRICAS:
+        metricas.rastrear_conexao(conn)
+    _aplicar_perfil(conn, perfil)
+    _local.conn = conn
+    with _trava_conexoes:
+        _conexoes_abertas.add(conn)
+    if not _esquema_conferido:
+        _conferir_esquema(conn)
     return conn
 
+def _conferir_esquema(conn):
+    """Cria as tabelas e aplica as migrações pendentes, se houver
+
+    Com o esquema em dia, custa só a leitura de PRAGMA user_version. As outras
+    threads esperam a conferência terminar antes de usar suas conexões.
+    """
+    global _esquema_conferido
+    with _trava_esquema:
+        if _esquema_conferido:
+            return
+        # criar_tabelas usa a conexão desta thread, já registrada em _local
+        if conn.execute('PRAGMA user_version').fetchone()[0] < len(MIGRACOES):
+            criar_tabelas()
+        _esquema_conferido = True
+
+def fechar_conexao():
+    """Fecha a conexão da thread atual (usado ao final de threads de trabalho)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _trava_conexoes:
+        _conexoes_abertas.discard(conn)
+    conn.close()
+
+def fechar_conexoes():
+    """Fecha todas as conexões abertas (chamado automaticamente ao encerrar)"""
+    with _trava_conexoes:
+        conexoes = list(_conexoes_abertas)
+        _conexoes_abertas.clear()
+    for conn in conexoes:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+def definir_caminho_banco(caminho):
+    """Troca o arquivo de banco usado pelo módulo (útil para benchmarks e cópias isoladas)"""
+    global CAMINHO_BANCO, _esquema_conferido
+    fechar_conexoes()
+    limpar_cache_produtos()
+    CAMINHO_BANCO = caminho
+    # O novo arquivo é conferido na próxima conexão
+    _esquema_conferido = False
+
+def definir_perfil_armazenamento(perfil):
+    """Seleciona o perfil de armazenamento ('seguro', 'desempenho' ou um dicionário)
+
+    As conexões abertas são fechadas e reabertas com o novo perfil no próximo uso.
+    """
+    global PERFIL_ARMAZENAMENTO
+    if isinstance(perfil, dict):
+        # Completa com o perfil seguro as chaves não informadas
+        perfil = {**PERFIS_ARMAZENAMENTO['seguro'], **perfil}
+    elif perfil not in PERFIS_ARMAZENAMENTO:
+        raise ValueError(f"Perfil de armazenamento desconhecido: {perfil}")
+    fechar_conexoes()
+    PERFIL_ARMAZENAMENTO = perfil
+
+def configuracoes_ativas():
+    """Lê da conexão atual os PRAGMAs efetivamente em vigor"""
+    conn = conectar()
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    temp_store = conn.execute('PRAGMA temp_store').fetchone()[0]
+    return {
+        'journal_mode': conn.execute('PRAGMA journal_mode').fetchone()[0].upper(),
+        'synchronous': _NOMES_SYNCHRONOUS.get(synchronous, synchronous),
+        'cache_size': conn.execute('PRAGMA cache_size').fetchone()[0],
+        'mmap_size': conn.execute('PRAGMA mmap_size').fetchone()[0],
+        'temp_store': _NOMES_TEMP_STORE.get(temp_store, temp_store),
+        'busy_timeout': conn.execute('PRAGMA busy_timeout').fetchone()[0],
+    }
+
+def verificar_perfil_armazenamento():
+    """Compara o perfil selecionado com as configurações ativas
+
+    Retorna um dicionário {pragma: (esperado, ativo)} apenas com as divergências;
+    vazio quando tudo foi aplicado. mmap_size pode ficar abaixo do pedido quando o
+    SQLite foi compilado com um limite menor.
+    """
+    esperado = _perfil_atual()
+    ativo = configuracoes_ativas()
+    divergencias = {}
+    for pragma, valor in esperado.items():
+        if str(valor).upper() != str(ativo[pragma]).upper():
+            divergencias[pragma] = (valor, ativo[pragma])
+    return divergencias
+
+atexit.register(fechar_conexoes)
+
 def criar_tabelas():
     """Cria as tabelas necessárias no banco de dados"""
     conn = conectar()
-    cursor = conn.cursor()
     
-    # Tabela de usuários
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS usuarios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nome TEXT NOT NULL,
-        senha TEXT NOT NULL,
-        tipo TEXT NOT NULL
-    )''')
-    
-    # Tabela de produtos (ATUALIZADA com estoque_minimo)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS produtos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nome TEXT NOT NULL,
-        descricao TEXT,
-        quantidade INTEGER NOT NULL,
-        estoque_minimo INTEGER DEFAULT 0
-    )''')
-    
-    # Tabela de movimentações
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS movimentacoes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        produto_id INTEGER NOT NULL,
-        tipo TEXT NOT NULL,  -- 'entrada' ou 'saida'
-        quantidade INTEGER NOT NULL,
-        data TEXT NOT NULL,
-        responsavel TEXT NOT NULL,
-        motivo TEXT,
-        FOREIGN KEY (produto_id) REFERENCES produtos (id)
-    )''')
-    
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor = conn.cursor()
+        
+        # Tabela de usuários
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            senha TEXT NOT NULL,
+            tipo TEXT NOT NULL
+        )''')
+        
+        # Tabela de produtos (ATUALIZADA com estoque_minimo)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            descricao TEXT,
+            quantidade INTEGER NOT NULL,
+            estoque_minimo INTEGER DEFAULT 0
+        )''')
+        
+        # Tabela de movimentações (a migração 9 a converte para o formato compacto)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS movimentacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,  -- 'entrada' ou 'saida'
+            quantidade INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            responsavel TEXT NOT NULL,
+            motivo TEXT,
+            FOREIGN KEY (produto_id) REFERENCES produtos (id)
+        )''')
+    
+    aplicar_migracoes()
+
+def _migracao_indices(conn):
+    """Versão 1: índices para histórico, nomes únicos e estoque baixo"""
+    # Nomes repetidos impediriam o índice único; os mais novos recebem o id como sufixo
+    conn.execute('''
+        UPDATE produtos SET nome = nome || ' (' || id || ')'
+        WHERE id NOT IN (SELECT MIN(id) FROM produtos GROUP BY nome)
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_produtos_nome ON produtos (nome)')
+    # Índice parcial: contém apenas os produtos abaixo do mínimo
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_produtos_estoque_baixo ON produtos (id)
+        WHERE quantidade < estoque_minimo
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_movimentacoes_produto_data
+        ON movimentacoes (produto_id, data)
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON movimentacoes (data)')
+
+def _migracao_versao_produtos(conn):
+    """Versão 2: contador de alterações do catálogo para atualizações incrementais
+
+    Cada inclusão, alteração ou remoção de produto incrementa sequencia_versao e grava
+    o novo valor em produtos.versao (ou em produtos_removidos), permitindo às telas
+    buscar apenas o que mudou desde a última leitura. Os triggers cobrem os comandos
+    de uma linha; os caminhos em lote definem a versão por conta própria.
+    """
+    conn.execute('ALTER TABLE produtos ADD COLUMN versao INTEGER NOT NULL DEFAULT 0')
+    conn.execute('CREATE INDEX idx_produtos_versao ON produtos (versao)')
+    conn.execute('''
+        CREATE TABLE sequencia_versao (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            valor INTEGER NOT NULL
+        )''')
+    conn.execute('INSERT INTO sequencia_versao (id, valor) VALUES (1, 0)')
+    conn.execute('''
+        CREATE TABLE produtos_removidos (
+            id INTEGER PRIMARY KEY,
+            versao INTEGER NOT NULL
+        )''')
+    conn.execute('CREATE INDEX idx_produtos_removidos_versao ON produtos_removidos (versao)')
+    
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_versao_insert AFTER INSERT ON produtos
+        WHEN NEW.versao = 0
+        BEGIN
+            UPDATE sequencia_versao SET valor = valor + 1 WHERE id = 1;
+            UPDATE produtos SET versao = (SELECT valor FROM sequencia_versao WHERE id = 1)
+            WHERE id = NEW.id;
+        END''')
+    # Só colunas de dados, e só quando o próprio comando não definiu a versão
+    # (operações em lote gravam uma versão única com _proxima_versao_produtos)
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_versao_update
+        AFTER UPDATE OF nome, descricao, quantidade, estoque_minimo ON produtos
+        WHEN NEW.versao = OLD.versao
+        BEGIN
+            UPDATE sequencia_versao SET valor = valor + 1 WHERE id = 1;
+            UPDATE produtos SET versao = (SELECT valor FROM sequencia_versao WHERE id = 1)
+            WHERE id = NEW.id;
+        END''')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_versao_delete AFTER DELETE ON produtos
+        BEGIN
+            UPDATE sequencia_versao SET valor = valor + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO produtos_removidos (id, versao)
+            VALUES (OLD.id, (SELECT valor FROM sequencia_versao WHERE id = 1));
+        END''')
+
+def _migracao_busca_textual(conn):
+    """Versão 3: índice FTS5 sobre nome e descrição, mantido por triggers
+
+    remove_diacritics faz "acucar" encontrar "açúcar"; os índices de prefixo de
+    2 e 3 letras aceleram a busca enquanto o usuário digita. Se o SQLite não tiver
+    FTS5, a migração não cria nada e obter_produtos continua usando LIKE.
+    """
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE produtos_fts USING fts5(
+                nome, descricao,
+                content='produtos', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )''')
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        print(f"Busca textual indisponível (SQLite sem FTS5): {e}")
+        return
+    
+    conn.execute("INSERT INTO produtos_fts (produtos_fts) VALUES ('rebuild')")
+    # Como nos triggers de versão, os caminhos em lote (que definem produtos.versao)
+    # atualizam o índice de uma vez com _reindexar_busca, bem mais rápido que linha a linha
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_fts_insert AFTER INSERT ON produtos
+        WHEN NEW.versao = 0
+        BEGIN
+            INSERT INTO produtos_fts (rowid, nome, descricao)
+            VALUES (NEW.id, NEW.nome, NEW.descricao);
+        END''')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_fts_delete AFTER DELETE ON produtos
+        BEGIN
+            INSERT INTO produtos_fts (produtos_fts, rowid, nome, descricao)
+            VALUES ('delete', OLD.id, OLD.nome, OLD.descricao);
+        END''')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_fts_update AFTER UPDATE OF nome, descricao ON produtos
+        WHEN NEW.versao = OLD.versao
+        BEGIN
+            INSERT INTO produtos_fts (produtos_fts, rowid, nome, descricao)
+            VALUES ('delete', OLD.id, OLD.nome, OLD.descricao);
+            INSERT INTO produtos_fts (rowid, nome, descricao)
+            VALUES (NEW.id, NEW.nome, NEW.descricao);
+        END''')
+
+def _migracao_alertas_estoque(conn):
+    """Versão 4: alertas gravados quando um produto fica abaixo do estoque mínimo
+
+    Os triggers registram só a passagem (estava no mínimo ou acima e ficou abaixo),
+    em qualquer caminho de escrita, inclusive os em lote. O conjunto dos produtos
+    abaixo do mínimo em cada momento já é mantido pelo índice parcial
+    idx_produtos_estoque_baixo.
+    """
+    conn.execute('''
+        CREATE TABLE alertas_estoque (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            estoque_minimo INTEGER NOT NULL,
+            data TEXT NOT NULL
+        )''')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_alerta_insert AFTER INSERT ON produtos
+        WHEN NEW.quantidade < NEW.estoque_minimo
+        BEGIN
+            INSERT INTO alertas_estoque (produto_id, quantidade, estoque_minimo, data)
+            VALUES (NEW.id, NEW.quantidade, NEW.estoque_minimo, datetime('now', 'localtime'));
+        END''')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_alerta_update
+        AFTER UPDATE OF quantidade, estoque_minimo ON produtos
+        WHEN NEW.quantidade < NEW.estoque_minimo AND OLD.quantidade >= OLD.estoque_minimo
+        BEGIN
+            INSERT INTO alertas_estoque (produto_id, quantidade, estoque_minimo, data)
+            VALUES (NEW.id, NEW.quantidade, NEW.estoque_minimo, datetime('now', 'localtime'));
+        END''')
+
+# Códigos gravados em movimentacoes.tipo (migração 9); o histórico devolve os nomes
+TIPOS_MOVIMENTACAO = {'entrada': 1, 'saida': 2, 'ajuste': 3}
+# Tipo de usuarios das pessoas e sistemas que só aparecem como responsáveis por
+# movimentações (importação, coletores, integrações): não fazem login
+TIPO_RESPONSAVEL = 'responsavel'
+
+# Sinal de cada movimentação no saldo; 'ajuste' já grava a diferença com sinal
+_DELTA_MOVIMENTACAO = "CASE {0}tipo WHEN 2 THEN -{0}quantidade ELSE {0}quantidade END"
+
+# movimentacoes.data guarda a hora local em segundos desde 1970-01-01, sem fuso:
+# datetime(data, 'unixepoch') devolve o mesmo texto 'AAAA-MM-DD HH:MM:SS' de antes
+_EPOCA = datetime(1970, 1, 1)
+
+def _segundos(data):
+    """Converte 'AAAA-MM-DD[ HH:MM:SS]' (ou um datetime) para o formato de movimentacoes.data"""
+    if isinstance(data, str):
+        data = datetime.fromisoformat(data)
+    return int((data - _EPOCA).total_seconds())
+
+def _migracao_saldos_diarios(conn):
+    """Versão 5: saldo de fechamento de cada produto nos dias em que ele mudou
+
+    Mantido pelos triggers nos comandos de uma linha e por _registrar_saldos nos
+    caminhos em lote. O estoque em uma data passada é o último saldo até ela, sem
+    percorrer o histórico (estoque_em). Edições diretas de quantidade passam a gravar
+    movimentações do tipo 'ajuste', com a diferença (positiva ou negativa).
+    """
+    conn.execute('''
+        CREATE TABLE saldos_diarios (
+            produto_id INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (produto_id, dia)
+        ) WITHOUT ROWID''')
+    _preencher_saldos(conn)
+    
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_saldo_insert AFTER INSERT ON produtos
+        WHEN NEW.versao = 0
+        BEGIN
+            INSERT INTO saldos_diarios (produto_id, dia, quantidade)
+            VALUES (NEW.id, date('now', 'localtime'), NEW.quantidade)
+            ON CONFLICT (produto_id, dia) DO UPDATE SET quantidade = excluded.quantidade;
+        END''')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_saldo_update AFTER UPDATE OF quantidade ON produtos
+        WHEN NEW.versao = OLD.versao AND NEW.quantidade <> OLD.quantidade
+        BEGIN
+            INSERT INTO saldos_diarios (produto_id, dia, quantidade)
+            VALUES (NEW.id, date('now', 'localtime'), NEW.quantidade)
+            ON CONFLICT (produto_id, dia) DO UPDATE SET quantidade = excluded.quantidade;
+        END''')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_saldo_delete AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM saldos_diarios WHERE produto_id = OLD.id;
+        END''')
+
+def _preencher_saldos(conn):
+    """Reconstrói saldos_diarios a partir da quantidade atual e do histórico
+
+    Percorre as movimentações de trás para frente: o saldo de um dia é a quantidade
+    atual menos tudo o que foi movimentado depois dele. A linha do dia '0000-00-00'
+    guarda o saldo anterior a todo o histórico. Os saldos dos dias já arquivados
+    são mantidos como estão, e o saldo transportado entra na linha '0000-00-00'.
+    """
+    if _movimentacoes_em_texto(conn):
+        # Chamado pela migração 5, antes do formato compacto
+        dia = 'substr(data, 1, 10)'
+        delta = "CASE tipo WHEN 'saida' THEN -quantidade ELSE quantidade END"
+    else:
+        dia = "date(data, 'unixepoch')"
+        delta = _DELTA_MOVIMENTACAO.format('')
+    arquivado_ate = '0000-00-00'
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'arquivos_movimentacoes'").fetchone():
+        arquivado_ate = conn.execute(
+            "SELECT COALESCE(substr(MAX(ultima_data), 1, 10), '0000-00-00') FROM arquivos_movimentacoes"
+        ).fetchone()[0]
+        transportado = '(SELECT quantidade FROM saldos_arquivados a WHERE a.produto_id = p.id)'
+    else:
+        # Chamado pela migração 5, antes de existir o arquivo
+        transportado = '0'
+    conn.execute("DELETE FROM saldos_diarios WHERE dia > ? OR dia = '0000-00-00'", (arquivado_ate,))
+    conn.execute(f'''
+        WITH por_dia AS (
+            SELECT produto_id, {dia} AS dia, SUM({delta}) AS delta
+            FROM movimentacoes
+            GROUP BY produto_id, dia
+        ),
+        posteriores AS (
+            SELECT produto_id, dia, delta, COALESCE(SUM(delta) OVER (
+                PARTITION BY produto_id ORDER BY dia DESC
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+            ), 0) AS depois
+            FROM por_dia
+        )
+        INSERT OR REPLACE INTO saldos_diarios (produto_id, dia, quantidade)
+        SELECT p.id, d.dia, p.quantidade - d.depois
+        FROM posteriores d JOIN produtos p ON p.id = d.produto_id
+        UNION ALL
+        SELECT p.id, '0000-00-00', p.quantidade - COALESCE(
+            (SELECT SUM(delta) FROM por_dia WHERE por_dia.produto_id = p.id), 0)
+            - COALESCE({transportado}, 0)
+        FROM produtos p
+    ''')
+
+def _migracao_consumo_diario(conn):
+    """Versão 6: resumo das saídas por dia e produto, usado pelo módulo analise
+
+    A chave começa pelo dia para que as médias leiam só a janela pedida;
+    analise_controle guarda a última movimentação já somada ao resumo.
+    """
+    conn.execute('''
+        CREATE TABLE consumo_diario (
+            dia TEXT NOT NULL,
+            produto_id INTEGER NOT NULL,
+            saidas INTEGER NOT NULL,
+            PRIMARY KEY (dia, produto_id)
+        ) WITHOUT ROWID''')
+    conn.execute('''
+        CREATE TABLE analise_controle (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultima_movimentacao INTEGER NOT NULL
+        )''')
+    conn.execute('INSERT INTO analise_controle (id, ultima_movimentacao) VALUES (1, 0)')
+
+def _migracao_reservas(conn):
+    """Versão 7: reservas de estoque e proteção contra estoque negativo
+
+    produtos.reservado soma as reservas em aberto; o estoque livre para saídas e
+    novas reservas é quantidade - reservado. O trigger impede que qualquer
+    comando reduza a quantidade para baixo de zero (produtos que já estejam
+    negativos ainda podem receber entradas).
+    """
+    conn.execute('ALTER TABLE produtos ADD COLUMN reservado INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+        CREATE TABLE reservas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            responsavel TEXT NOT NULL,
+            data TEXT NOT NULL,
+            FOREIGN KEY (produto_id) REFERENCES produtos (id)
+        )''')
+    conn.execute('CREATE INDEX idx_reservas_produto ON reservas (produto_id)')
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_estoque_negativo
+        BEFORE UPDATE OF quantidade ON produtos
+        WHEN NEW.quantidade < 0 AND NEW.quantidade < OLD.quantidade
+        BEGIN
+            SELECT RAISE(ABORT, 'Estoque insuficiente');
+        END''')
+
+def _migracao_arquivo_movimentacoes(conn):
+    """Versão 8: registro das movimentações levadas para os arquivos anuais
+
+    arquivos_movimentacoes diz, para cada ano arquivado, o período que o arquivo
+    cobre, para as consultas só anexarem os anos que o período pedido alcança.
+    saldos_arquivados guarda, por produto, o saldo transportado (soma das
+    movimentações arquivadas) e quantas foram, para os cálculos sobre o histórico
+    completo não precisarem abrir os arquivos.
+    """
+    conn.execute('''
+        CREATE TABLE arquivos_movimentacoes (
+            ano INTEGER PRIMARY KEY,
+            movimentacoes INTEGER NOT NULL,
+            primeira_data TEXT NOT NULL,
+            ultima_data TEXT NOT NULL
+        )''')
+    conn.execute('''
+        CREATE TABLE saldos_arquivados (
+            produto_id INTEGER PRIMARY KEY,
+            quantidade INTEGER NOT NULL,
+            movimentacoes INTEGER NOT NULL
+        )''')
+
+def _movimentacoes_em_texto(conn, esquema='main'):
+    """True se a tabela movimentacoes do esquema ainda está no formato anterior à migração 9"""
+    coluna = conn.execute(
+        "SELECT type FROM pragma_table_info('movimentacoes', ?) WHERE name = 'data'", (esquema,)
+    ).fetchone()
+    return coluna is not None and coluna[0] == 'TEXT'
+
+def _criar_tabela_movimentacoes(conn, esquema='main'):
+    """Cria a tabela movimentacoes do esquema no formato compacto, com seus índices
+
+    Os arquivos anuais recebem os ids da tabela principal, sem AUTOINCREMENT, e
+    não declaram chaves estrangeiras (produtos e usuarios ficam no banco principal).
+    """
+    if esquema == 'main':
+        chave = 'id INTEGER PRIMARY KEY AUTOINCREMENT'
+        referencias = ''',
+            FOREIGN KEY (produto_id) REFERENCES produtos (id),
+            FOREIGN KEY (responsavel) REFERENCES usuarios (id)'''
+    else:
+        chave, referencias = 'id INTEGER PRIMARY KEY', ''
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {esquema}.movimentacoes (
+            {chave},
+            produto_id INTEGER NOT NULL,
+            tipo INTEGER NOT NULL,  -- TIPOS_MOVIMENTACAO
+            quantidade INTEGER NOT NULL,
+            data INTEGER NOT NULL,  -- hora local em segundos (_segundos)
+            responsavel INTEGER NOT NULL,  -- usuarios.id
+            motivo TEXT{referencias}
+        )''')
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {esquema}.idx_movimentacoes_produto_data
+        ON movimentacoes (produto_id, data)
+    ''')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS {esquema}.idx_movimentacoes_data ON movimentacoes (data)')
+
+def _compactar_movimentacoes(conn, esquema='main'):
+    """Reescreve a tabela movimentacoes do esquema no formato compacto, mantendo os ids
+
+    Responsáveis que não são usuários passam a existir em usuarios com o tipo
+    TIPO_RESPONSAVEL. Tipos diferentes de 'entrada' e 'ajuste' viram 'saida',
+    que é como registrar_movimentacao sempre os descontou do estoque.
+    """
+    conn.execute(f'''
+        INSERT INTO main.usuarios (nome, senha, tipo)
+        SELECT DISTINCT responsavel, '', ? FROM {esquema}.movimentacoes
+        WHERE responsavel NOT IN (SELECT nome FROM main.usuarios)
+    ''', (TIPO_RESPONSAVEL,))
+    conn.execute(f'DROP INDEX IF EXISTS {esquema}.idx_movimentacoes_produto_data')
+    conn.execute(f'DROP INDEX IF EXISTS {esquema}.idx_movimentacoes_data')
+    conn.execute(f'ALTER TABLE {esquema}.movimentacoes RENAME TO movimentacoes_texto')
+    _criar_tabela_movimentacoes(conn, esquema)
+    conn.execute(f'''
+        INSERT INTO {esquema}.movimentacoes (id, produto_id, tipo, quantidade, data, responsavel, motivo)
+        SELECT t.id, t.produto_id, CASE t.tipo WHEN 'entrada' THEN 1 WHEN 'ajuste' THEN 3 ELSE 2 END,
+               t.quantidade, CAST(strftime('%s', t.data) AS INTEGER),
+               (SELECT MIN(u.id) FROM main.usuarios u WHERE u.nome = t.responsavel), t.motivo
+        FROM {esquema}.movimentacoes_texto t
+        ORDER BY t.id
+    ''')
+    if esquema == 'main':
+        # O AUTOINCREMENT continua de onde parou, mesmo que as últimas já tenham sido arquivadas
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'movimentacoes'")
+        conn.execute("UPDATE sqlite_sequence SET name = 'movimentacoes' WHERE name = 'movimentacoes_texto'")
+    conn.execute(f'DROP TABLE {esquema}.movimentacoes_texto')
+
+# Colunas de obter_movimentacoes() sobre o alias m, e as junções de que elas precisam
+_COLUNAS_HISTORICO = '''m.id, datetime(m.data, 'unixepoch') AS data,
+    CASE m.tipo WHEN 1 THEN 'entrada' WHEN 2 THEN 'saida' WHEN 3 THEN 'ajuste' END AS tipo,
+    p.nome AS produto, m.quantidade, u.nome AS responsavel, m.motivo'''
+_JUNCOES_HISTORICO = '''JOIN produtos p ON m.produto_id = p.id
+    LEFT JOIN usuarios u ON u.id = m.responsavel'''
+
+def _migracao_movimentacoes_compactas(conn):
+    """Versão 9: movimentações em formato compacto
+
+    data passa a ser a hora local em segundos, tipo um código de TIPOS_MOVIMENTACAO
+    e responsavel o id em usuarios: a tabela e o índice de datas encolhem, e os
+    filtros e a ordenação por período comparam inteiros. A view
+    historico_movimentacoes devolve as linhas no formato de obter_movimentacoes(),
+    para relatórios e consultas avulsas. Os arquivos anuais já gravados são
+    convertidos ao serem anexados pela primeira vez.
+    """
+    conn.execute('CREATE INDEX idx_usuarios_nome ON usuarios (nome)')
+    _compactar_movimentacoes(conn)
+    conn.execute(f'''
+        CREATE VIEW historico_movimentacoes AS
+        SELECT {_COLUNAS_HISTORICO}
+        FROM movimentacoes m
+        {_JUNCOES_HISTORICO}
+    ''')
+
+def _migracao_estoque_reservado(conn):
+    """Versão 10: a quantidade não pode ficar abaixo do que está reservado
+
+    Ajustes de quantidade e importações gravavam qualquer valor, e a reserva
+    deixava de ter estoque para ser confirmada. O trigger recusa comandos que
+    deixem o estoque livre (quantidade - reservado) negativo; produtos que já
+    estejam nessa situação só podem ter o estoque livre aumentado.
+    """
+    conn.execute('''
+        CREATE TRIGGER trg_produtos_estoque_reservado
+        BEFORE UPDATE OF quantidade, reservado ON produtos
+        WHEN NEW.quantidade - NEW.reservado < 0
+         AND NEW.quantidade - NEW.reservado < OLD.quantidade - OLD.reservado
+        BEGIN
+            SELECT RAISE(ABORT, 'Quantidade abaixo do estoque reservado');
+        END''')
+
+# Migrações de esquema em ordem; a posição na lista (a partir de 1) é a versão
+# gravada em PRAGMA user_version após sua aplicação
+MIGRACOES = [
+    _migracao_indices,
+    _migracao_versao_produtos,
+    _migracao_busca_textual,
+    _migracao_alertas_estoque,
+    _migracao_saldos_diarios,
+    _migracao_consumo_diario,
+    _migracao_reservas,
+    _migracao_arquivo_movimentacoes,
+    _migracao_movimentacoes_compactas,
+    _migracao_estoque_reservado,
+]
+
+def versao_esquema():
+    """Retorna a versão de esquema gravada no banco (PRAGMA user_version)"""
+    return conectar().execute('PRAGMA user_version').fetchone()[0]
+
+def aplicar_migracoes():
+    """Aplica as migrações pendentes, cada uma em sua própria transação"""
+    conn = conectar()
+    while versao_esquema() < len(MIGRACOES):
+        # BEGIN IMMEDIATE garante que outro processo não aplique a mesma migração
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            versao = versao_esquema()
+            if versao < len(MIGRACOES):
+                MIGRACOES[versao](conn)
+                conn.execute(f'PRAGMA user_version = {versao + 1}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def plano_consulta(sql, parametros=()):
+    """Retorna as linhas de EXPLAIN QUERY PLAN de uma consulta (para diagnóstico)"""
+    cursor = conectar().execute(f'EXPLAIN QUERY PLAN {sql}', parametros)
+    return [linha[3] for linha in cursor.fetchall()]
 
 def validar_login(nome, senha):
     """Valida as credenciais do usuário"""
     conn = conectar()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT id, nome, tipo FROM usuarios WHERE nome = ? AND senha = ?', 
-                  (nome, senha))
+    cursor.execute('SELECT id, nome, tipo FROM usuarios WHERE nome = ? AND senha = ? AND tipo <> ?', 
+                  (nome, senha, TIPO_RESPONSAVEL))
     usuario = cursor.fetchone()
-    conn.close()
     
     if usuario:
         return {'id': usuario[0], 'nome': usuario[1], 'tipo': usuario[2]}
     return None
 
-def cadastrar_usuario(nome, senha, tipo):
-    """Cadastra um novo usuário"""
+def cadastrar_usuario(nome, senha, tipo, assumir_responsavel=False):
+    """Cadastra um novo usuário
+
+    Se o nome já aparece como responsável de movimentações (importação,
+    coletores, integrações), o cadastro é recusado: o histórico gravado com
+    esse nome não pode passar para quem escolher o mesmo login. Com
+    assumir_responsavel=True o registro do responsável vira o usuário, e a
+    conversão fica registrada no log.
+    """
+    conn = conectar()
     try:
-        conn = conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute('INSERT INTO usuarios (nome, senha, tipo) VALUES (?, ?, ?)', 
-                      (nome, senha, tipo))
-        conn.commit()
+        with conn:
+            responsavel = conn.execute(
+                'SELECT MIN(id) FROM usuarios WHERE nome = ? AND tipo = ?', (nome, TIPO_RESPONSAVEL)
+            ).fetchone()[0]
+            if responsavel is None:
+                conn.execute('INSERT INTO usuarios (nome, senha, tipo) VALUES (?, ?, ?)', 
+                             (nome, senha, tipo))
+            elif not assumir_responsavel:
+                print(f"Usuário não cadastrado: '{nome}' já é responsável por movimentações")
+                return False
+            else:
+                conn.execute('UPDATE usuarios SET senha = ?, tipo = ? WHERE id = ?',
+                             (senha, tipo, responsavel))
+                print(f"Responsável '{nome}' (id {responsavel}) convertido em usuário do tipo '{tipo}'")
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
+
+def _ids_responsaveis(conn, nomes):
+    """Retorna {nome: id em usuarios} dos responsáveis, cadastrando os que faltarem
+
+    Os nomes que não são usuários entram com o tipo TIPO_RESPONSAVEL (sem login).
+    Deve ser chamada dentro da transação que grava as movimentações.
+    """
+    nomes = list(set(nomes))
+    ids = {}
+    for i in range(0, len(nomes), 500):
+        bloco = nomes[i:i + 500]
+        marcadores = ','.join('?' * len(bloco))
+        ids.update(conn.execute(
+            f'SELECT nome, MIN(id) FROM usuarios WHERE nome IN ({marcadores}) GROUP BY nome', bloco))
+    for nome in nomes:
+        if nome not in ids:
+            ids[nome] = conn.execute(
+                "INSERT INTO usuarios (nome, senha, tipo) VALUES (?, '', ?)", (nome, TIPO_RESPONSAVEL)
+            ).lastrowid
+    return ids
+
+def obter_id_responsavel(nome):
+    """Id gravado em movimentacoes.responsavel para o nome (cadastrado sem login, se preciso)"""
+    conn = conectar()
+    conn.execute('BEGIN IMMEDIATE')
+    with conn:
+        return _ids_responsaveis(conn, [nome])[nome]
 
 def adicionar_produto(nome, descricao, quantidade, estoque_minimo=0):
     """Adiciona um novo produto ao estoque (ATUALIZADA com estoque_minimo)"""
     conn = conectar()
-    cursor = conn.cursor()
+    try:
+        with conn:
+            conn.execute('''
+                INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo) 
+                VALUES (?, ?, ?, ?)
+            ''', (nome, descricao, quantidade, estoque_minimo))
+        _invalidar_cache_produtos()
+        return True
+    except sqlite3.IntegrityError:
+        return False  # Já existe um produto com este nome
+
+# Máximo de produtos retornados por uma busca
+LIMITE_BUSCA = 100
+
+_busca_textual_disponivel = {}
+
+def _tem_busca_textual(conn):
+    """Verifica (uma vez por banco) se a tabela FTS5 de produtos existe"""
+    if CAMINHO_BANCO not in _busca_textual_disponivel:
+        cursor = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'produtos_fts'"
+        )
+        _busca_textual_disponivel[CAMINHO_BANCO] = cursor.fetchone() is not None
+    return _busca_textual_disponivel[CAMINHO_BANCO]
+
+def _expressoes_busca(texto):
+    """Converte o texto digitado nas consultas FTS5 usadas, da mais para a menos relevante
+
+    Todas exigem todas as palavras: primeiro palavras exatas no nome, depois em
+    qualquer campo, e por fim com a última palavra (ainda sendo digitada) como
+    prefixo. As exatas são mais baratas: o FTS5 precisa montar a lista completa
+    de documentos de um prefixo antes de devolver o primeiro resultado.
+    """
+    palavras = re.findall(r'\w+', texto)
+    if not palavras:
+        return []
+    exata = ' '.join(f'"{palavra}"' for palavra in palavras)
+    prefixo = ' '.join([f'"{palavra}"' for palavra in palavras[:-1]] + [f'"{palavras[-1]}"*'])
+    return [f'nome : ({exata})', exata, f'nome : ({prefixo})', prefixo]
+
+def _buscar_produtos(conn, texto, limite):
+    """Busca textual por nível de relevância, parando assim que houver resultados suficientes"""
+    ids = []
+    vistos = set()
+    for expressao in _expressoes_busca(texto):
+        cursor = conn.execute(
+            'SELECT rowid FROM produtos_fts WHERE produtos_fts MATCH ? LIMIT ?',
+            (expressao, limite)
+        )
+        for (produto_id,) in cursor:
+            if produto_id not in vistos:
+                vistos.add(produto_id)
+                ids.append(produto_id)
+        if len(ids) >= limite:
+            break
     
-    cursor.execute('''
-        INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo) 
-        VALUES (?, ?, ?, ?)
-    ''', (nome, descricao, quantidade, estoque_minimo))
-    conn.commit()
-    conn.close()
+    ids = ids[:limite]
+    if not ids:
+        return []
+    marcadores = ','.join('?' * len(ids))
+    cursor = conn.execute(f'''
+        SELECT id, nome, descricao, quantidade, estoque_minimo 
+        FROM produtos 
+        WHERE id IN ({marcadores})
+    ''', ids)
+    por_id = {prod[0]: prod for prod in cursor}
+    return [por_id[produto_id] for produto_id in ids if produto_id in por_id]
+
+# Cache do catálogo em memória (ESTOQUE_CACHE=0 desliga). As leituras passam
+# pelo cache, que é conferido contra a versão do catálogo antes de responder
+CACHE_PRODUTOS = os.environ.get('ESTOQUE_CACHE', '1') != '0'
+TAMANHO_CACHE_PRODUTOS = 2048  # consultas individuais mantidas (LRU)
+
+_cache_produtos = {
+    'versao': None,              # versão do catálogo refletida no cache
+    'confirmado': False,         # False após escrita local: relê a versão na próxima leitura
+    'catalogo': None,            # {id: produto} com o catálogo completo, após a primeira leitura
+    'consultas': OrderedDict(),  # ('id', x), ('nome', x) ou ('busca', texto, limite) -> resultado
+}
+_estatisticas_cache = {'acertos': 0, 'falhas': 0, 'invalidacoes': 0}
+_trava_cache = threading.Lock()
+
+def _invalidar_cache_produtos():
+    """Avisa o cache de que esta thread gravou no catálogo (chamar após o commit)"""
+    with _trava_cache:
+        _cache_produtos['confirmado'] = False
+
+def limpar_cache_produtos():
+    """Descarta o conteúdo do cache (os contadores são mantidos)"""
+    with _trava_cache:
+        _cache_produtos.update(versao=None, confirmado=False, catalogo=None)
+        _cache_produtos['consultas'].clear()
+
+def definir_cache_produtos(ativo):
+    """Liga ou desliga o cache do catálogo (para comparações e depuração)"""
+    global CACHE_PRODUTOS
+    limpar_cache_produtos()
+    CACHE_PRODUTOS = bool(ativo)
+
+def estatisticas_cache_produtos():
+    """Retorna os contadores de acertos, falhas e invalidações e o tamanho do cache"""
+    with _trava_cache:
+        catalogo = _cache_produtos['catalogo']
+        return {
+            **_estatisticas_cache,
+            'produtos': len(catalogo) if catalogo is not None else 0,
+            'consultas': len(_cache_produtos['consultas']),
+        }
+
+def _validar_cache_produtos(conn):
+    """Acompanha as alterações do catálogo desde a última leitura (com _trava_cache adquirida)
 
-def obter_produtos(filtro=None):
-    """Obtém todos os produtos, opcionalmente filtrados (ATUALIZADA com estoque_minimo)"""
+    PRAGMA data_version só muda quando outra conexão (outra thread ou outro
+    processo) grava no banco; as gravações locais avisam por _invalidar_cache_produtos.
+    Fora desses casos nenhuma tabela é lida.
+    """
+    versao_dados = conn.execute('PRAGMA data_version').fetchone()[0]
+    if _cache_produtos['confirmado'] and getattr(_local, 'versao_dados', None) == (conn, versao_dados):
+        return
+    versao = conn.execute('SELECT valor FROM sequencia_versao WHERE id = 1').fetchone()[0]
+    if versao != _cache_produtos['versao']:
+        _estatisticas_cache['invalidacoes'] += 1
+        _cache_produtos['consultas'].clear()
+        catalogo = _cache_produtos['catalogo']
+        if catalogo is not None:
+            # O catálogo completo recebe só o que mudou
+            versao, alterados, removidos = obter_alteracoes_produtos(_cache_produtos['versao'])
+            for produto_id in removidos:
+                catalogo.pop(produto_id, None)
+            for prod in alterados:
+                catalogo[prod[0]] = prod
+        _cache_produtos['versao'] = versao
+    _cache_produtos['confirmado'] = True
+    _local.versao_dados = (conn, versao_dados)
+
+def _consulta_em_cache(chave, consulta):
+    """Retorna o resultado guardado para a chave ou executa consulta(conn) e o guarda"""
     conn = conectar()
-    cursor = conn.cursor()
-    
+    if not CACHE_PRODUTOS:
+        return consulta(conn)
+    with _trava_cache:
+        _validar_cache_produtos(conn)
+        consultas = _cache_produtos['consultas']
+        if chave in consultas:
+            consultas.move_to_end(chave)
+            _estatisticas_cache['acertos'] += 1
+            return consultas[chave]
+        _estatisticas_cache['falhas'] += 1
+        resultado = consulta(conn)
+        consultas[chave] = resultado
+        if len(consultas) > TAMANHO_CACHE_PRODUTOS:
+            consultas.popitem(last=False)
+        return resultado
+
+def _catalogo_em_cache(conn):
+    """Retorna o catálogo completo a partir do cache, lendo-o do banco só na primeira vez"""
+    with _trava_cache:
+        _validar_cache_produtos(conn)
+        if _cache_produtos['catalogo'] is not None:
+            _estatisticas_cache['acertos'] += 1
+        else:
+            _estatisticas_cache['falhas'] += 1
+            conn.execute('BEGIN')
+            try:
+                versao = conn.execute('SELECT valor FROM sequencia_versao WHERE id = 1').fetchone()[0]
+                produtos = conn.execute('''
+                    SELECT id, nome, descricao, quantidade, estoque_minimo 
+                    FROM produtos
+                ''').fetchall()
+            finally:
+                conn.commit()
+            if versao != _cache_produtos['versao']:
+                _cache_produtos['consultas'].clear()
+                _cache_produtos['versao'] = versao
+            _cache_produtos['catalogo'] = {prod[0]: prod for prod in produtos}
+        return list(_cache_produtos['catalogo'].values())
+
+def obter_produtos(filtro=None, limite=LIMITE_BUSCA):
+    """Obtém todos os produtos, ou os que correspondem ao filtro (ATUALIZADA com estoque_minimo)
+
+    Com filtro, busca todas as palavras no nome e na descrição, sem diferenciar
+    acentos ("acucar" encontra "Açúcar"), com a última palavra como prefixo, e
+    retorna até `limite` produtos, os mais relevantes primeiro.
+    """
     if filtro:
-        cursor.execute('''
+        return list(_consulta_em_cache(('busca', filtro, limite),
+                                       lambda conn: _filtrar_produtos(conn, filtro, limite)))
+    
+    conn = conectar()
+    if CACHE_PRODUTOS:
+        return _catalogo_em_cache(conn)
+    cursor = conn.execute('''
+        SELECT id, nome, descricao, quantidade, estoque_minimo 
+        FROM produtos
+    ''')
+    return cursor.fetchall()
+
+def _filtrar_produtos(conn, filtro, limite):
+    """Executa a busca por filtro no banco (FTS5, ou LIKE se indisponível)"""
+    if _tem_busca_textual(conn):
+        return tuple(_buscar_produtos(conn, filtro, limite))
+    cursor = conn.execute('''
+        SELECT id, nome, descricao, quantidade, estoque_minimo 
+        FROM produtos 
+        WHERE nome LIKE ?
+        LIMIT ?
+    ''', (f'%{filtro}%', limite))
+    return tuple(cursor)
+
+def _reindexar_busca(conn, versao, antigos=()):
+    """Atualiza o índice de busca após uma gravação em lote com a versão informada
+
+    antigos: (id, nome, descricao) como estavam indexados, para os produtos alterados.
+    """
+    if not _tem_busca_textual(conn):
+        return
+    conn.executemany('''
+        INSERT INTO produtos_fts (produtos_fts, rowid, nome, descricao)
+        VALUES ('delete', ?, ?, ?)
+    ''', antigos)
+    conn.execute('''
+        INSERT INTO produtos_fts (rowid, nome, descricao)
+        SELECT id, nome, descricao FROM produtos WHERE versao = ?
+    ''', (versao,))
+
+def _registrar_saldos(conn, versao):
+    """Grava o saldo do dia dos produtos alterados em um lote com a versão informada"""
+    conn.execute('''
+        INSERT INTO saldos_diarios (produto_id, dia, quantidade)
+        SELECT id, date('now', 'localtime'), quantidade FROM produtos WHERE versao = ?
+        ON CONFLICT (produto_id, dia) DO UPDATE SET quantidade = excluded.quantidade
+    ''', (versao,))
+
+def _proxima_versao_produtos(conn):
+    """Reserva uma nova versão do catálogo para um lote de alterações (dentro da transação)
+
+    Linhas gravadas já com a versão não disparam os triggers de versão, de busca nem
+    de saldo; quem grava em lote deve chamar _reindexar_busca se alterar nome ou
+    descrição e _registrar_saldos se alterar quantidades.
+    """
+    conn.execute('UPDATE sequencia_versao SET valor = valor + 1 WHERE id = 1')
+    return conn.execute('SELECT valor FROM sequencia_versao WHERE id = 1').fetchone()[0]
+
+def versao_produtos():
+    """Retorna o contador de alterações do catálogo (muda a cada inclusão, edição ou remoção)"""
+    return conectar().execute('SELECT valor FROM sequencia_versao WHERE id = 1').fetchone()[0]
+
+def obter_alteracoes_produtos(desde_versao):
+    """Obtém o que mudou no catálogo depois da versão informada
+
+    Retorna (versao_atual, produtos_alterados, ids_removidos); os produtos têm o
+    formato de obter_produtos(). Todas as leituras vêm do mesmo instante do banco.
+    """
+    conn = conectar()
+    conn.execute('BEGIN')
+    try:
+        versao = conn.execute('SELECT valor FROM sequencia_versao WHERE id = 1').fetchone()[0]
+        alterados = conn.execute('''
             SELECT id, nome, descricao, quantidade, estoque_minimo 
             FROM produtos 
-            WHERE nome LIKE ?
-        ''', (f'%{filtro}%',))
-    else:
+            WHERE versao > ?
+            ORDER BY id
+        ''', (desde_versao,)).fetchall()
+        removidos = [linha[0] for linha in conn.execute(
+            'SELECT id FROM produtos_removidos WHERE versao > ?', (desde_versao,)
+        )]
+    finally:
+        conn.commit()
+    return versao, alterados, removidos
+
+def obter_produto(produto_id):
+    """Obtém um produto pelo id, ou None"""
+    return _consulta_em_cache(('id', produto_id), lambda conn: conn.execute('''
+        SELECT id, nome, descricao, quantidade, estoque_minimo 
+        FROM produtos 
+        WHERE id = ?
+    ''', (produto_id,)).fetchone())
+
+SQL_PRODUTO_POR_NOME = '''
+    SELECT id, nome, descricao, quantidade, estoque_minimo 
+    FROM produtos 
+    WHERE nome = ?
+'''
+
+def obter_produto_por_nome(nome):
+    """Obtém um produto pelo nome exato (busca pelo índice único), ou None"""
+    return _consulta_em_cache(
+        ('nome', nome), lambda conn: conn.execute(SQL_PRODUTO_POR_NOME, (nome,)).fetchone())
+
+def registrar_movimentacao(produto_id, tipo, quantidade, responsavel, motivo=None):
+    """Registra uma movimentação (entrada ou saída)
+
+    A saída só é gravada se houver estoque livre (quantidade menos reservas)
+    suficiente: a conferência e o desconto são o mesmo UPDATE, então saídas
+    simultâneas não deixam o estoque negativo. Retorna False se o produto não
+    existir ou o estoque for insuficiente.
+    """
+    conn = conectar()
+    # IMMEDIATE: o lock de escrita é obtido (ou esperado) já no início
+    conn.execute('BEGIN IMMEDIATE')
+    with conn:
+        cursor = conn.cursor()
+        
+        # Atualiza o estoque
+        if tipo == 'entrada':
+            cursor.execute('UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?', 
+                          (quantidade, produto_id))
+        else:  # saída
+            cursor.execute('''
+                UPDATE produtos SET quantidade = quantidade - ?
+                WHERE id = ? AND quantidade - reservado >= ?
+            ''', (quantidade, produto_id, quantidade))
+        if cursor.rowcount == 0:
+            return False
+        
+        # Registra a movimentação
         cursor.execute('''
-            SELECT id, nome, descricao, quantidade, estoque_minimo 
-            FROM produtos
-        ''')
+            INSERT INTO movimentacoes 
+            (produto_id, tipo, quantidade, data, responsavel, motivo) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (produto_id, TIPOS_MOVIMENTACAO['entrada' if tipo == 'entrada' else 'saida'], quantidade,
+              _segundos(datetime.now()), _ids_responsaveis(conn, [responsavel])[responsavel], motivo))
+    _invalidar_cache_produtos()
+    return True
+
+def registrar_movimentacoes_lote(movimentacoes, parcial=False):
+    """Registra várias movimentações em uma única transação (tudo ou nada)
+
+    Recebe um iterável de tuplas (produto_id, tipo, quantidade, responsavel[, motivo]).
+    Retorna {'sucesso': bool, 'registradas': int, 'erros': [(linha, mensagem)]}, com
+    as linhas numeradas a partir de 1. As saídas são conferidas na ordem das linhas
+    contra o estoque livre. Se qualquer linha tiver erro, nada é gravado;
+    com parcial=True as linhas válidas são gravadas mesmo assim (movimentações
+    independentes, de origens diferentes, agrupadas só para dividir o commit).
+    """
+    data = _segundos(datetime.now())
+    linhas = []
+    erros = []
     
-    produtos = cursor.fetchall()
-    conn.close()
-    return produtos
+    for numero, mov in enumerate(movimentacoes, start=1):
+        try:
+            produto_id, tipo, quantidade, responsavel, *resto = mov
+            produto_id = int(produto_id)
+            quantidade = int(quantidade)
+        except (TypeError, ValueError):
+            erros.append((numero, "Formato inválido"))
+            continue
+        
+        if tipo not in ('entrada', 'saida'):
+            erros.append((numero, f"Tipo inválido: {tipo}"))
+        elif quantidade <= 0:
+            erros.append((numero, "Quantidade deve ser positiva"))
+        elif not responsavel:
+            erros.append((numero, "Responsável não informado"))
+        else:
+            motivo = resto[0] if resto else None
+            linhas.append((numero, produto_id, tipo, quantidade, responsavel, motivo))
+    
+    if erros and not parcial:
+        return {'sucesso': False, 'registradas': 0, 'erros': erros}
+    
+    conn = conectar()
+    # IMMEDIATE: o estoque lido para conferir as saídas não muda até o commit
+    conn.execute('BEGIN IMMEDIATE')
+    with conn:
+        # Lê de uma vez o estoque livre de todos os produtos citados
+        ids = list({linha[1] for linha in linhas})
+        livre = {}
+        for i in range(0, len(ids), 500):
+            bloco = ids[i:i + 500]
+            marcadores = ','.join('?' * len(bloco))
+            livre.update(conn.execute(
+                f'SELECT id, quantidade - reservado FROM produtos WHERE id IN ({marcadores})', bloco))
+        
+        # Agrega a variação de estoque por produto: um UPDATE por produto, não por linha
+        deltas = {}
+        validas = []
+        for linha in linhas:
+            numero, produto_id, tipo, quantidade, _, _ = linha
+            if produto_id not in livre:
+                erros.append((numero, f"Produto {produto_id} não encontrado"))
+                continue
+            if tipo == 'saida' and quantidade > livre[produto_id]:
+                erros.append((numero, f"Estoque insuficiente do produto {produto_id} "
+                                      f"(disponível: {livre[produto_id]})"))
+                continue
+            delta = quantidade if tipo == 'entrada' else -quantidade
+            livre[produto_id] += delta
+            deltas[produto_id] = deltas.get(produto_id, 0) + delta
+            validas.append(linha)
+        linhas = validas
+        
+        erros.sort()
+        if (erros and not parcial) or not linhas:
+            return {'sucesso': not erros, 'registradas': 0, 'erros': erros}
+        
+        versao = _proxima_versao_produtos(conn)
+        conn.executemany(
+            'UPDATE produtos SET quantidade = quantidade + ?, versao = ? WHERE id = ?',
+            [(delta, versao, produto_id) for produto_id, delta in deltas.items()]
+        )
+        _registrar_saldos(conn, versao)
+        responsaveis = _ids_responsaveis(conn, (linha[4] for linha in linhas))
+        conn.executemany('''
+            INSERT INTO movimentacoes 
+            (produto_id, tipo, quantidade, data, responsavel, motivo) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(produto_id, TIPOS_MOVIMENTACAO[tipo], quantidade, data, responsaveis[responsavel], motivo)
+              for _, produto_id, tipo, quantidade, responsavel, motivo in linhas])
+    _invalidar_cache_produtos()
+    
+    return {'sucesso': not erros, 'registradas': len(linhas), 'erros': erros}
 
-def registrar_movimentacao(produto_id, tipo, quantidade, responsavel, motivo=None):
-    """Registra uma movimentação (entrada ou saída)"""
+class GravadorMovimentacoes:
+    """Junta movimentações de várias threads em um único commit (group commit)
+
+    Cada registrar() entra em uma fila; uma thread de gravação grava o que
+    houver (até `maximo` movimentações) com registrar_movimentacoes_lote(parcial=True):
+    um lock de escrita e um fsync por grupo, não por movimentação. O que chega
+    durante uma gravação forma o grupo seguinte; `intervalo` > 0 ainda espera
+    esse tempo antes de cada grupo, para juntar mais quando o fsync é caro. Cada chamador recebe o resultado da sua
+    linha: None se gravada, ou a mensagem de erro; um Future cancelado antes de o
+    grupo começar a ser gravado fica de fora. O agrupamento vale dentro do
+    processo; terminais diferentes devem enviar pelo serviço HTTP (servidor.py),
+    que usa este mesmo gravador.
+    """
+    def __init__(self, intervalo=0, maximo=1000):
+        self.intervalo = intervalo
+        self.maximo = maximo
+        self._fila = []  # (movimentacao, futuro)
+        self._condicao = threading.Condition()
+        self._thread = None
+        self._encerrado = False
+    
+    def registrar(self, produto_id, tipo, quantidade, responsavel, motivo=None, esperar=True):
+        """Enfileira a movimentação; com esperar=False retorna o Future do resultado"""
+        from concurrent.futures import Future
+        futuro = Future()
+        with self._condicao:
+            if self._encerrado:
+                raise RuntimeError("Gravador de movimentações encerrado")
+            self._fila.append(((produto_id, tipo, quantidade, responsavel, motivo), futuro))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._executar, name='gravador-movimentacoes', daemon=True)
+                self._thread.start()
+            # Só acorda a thread quando ela tem o que fazer: fila que deixou de estar
+            # vazia ou grupo completo (não a cada chamada durante o intervalo)
+            if len(self._fila) == 1 or len(self._fila) >= self.maximo:
+                self._condicao.notify()
+        return futuro.result() if esperar else futuro
+    
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while not self._fila and not self._encerrado:
+                    self._condicao.wait()
+                if not self._fila:
+                    return
+                # Dá tempo para outras threads entrarem no mesmo grupo
+                if self.intervalo and not self._encerrado:
+                    self._condicao.wait_for(
+                        lambda: len(self._fila) >= self.maximo or self._encerrado, self.intervalo)
+                grupo, self._fila = self._fila[:self.maximo], self._fila[self.maximo:]
+            # Daqui em diante os Futures não podem mais ser cancelados
+            grupo = [(m, futuro) for m, futuro in grupo if futuro.set_running_or_notify_cancel()]
+            if not grupo:
+                continue
+            try:
+                resultado = registrar_movimentacoes_lote([m for m, _ in grupo], parcial=True)
+            except Exception as e:
+                for _, futuro in grupo:
+                    futuro.set_exception(e)
+                continue
+            erros = dict(resultado['erros'])
+            for numero, (_, futuro) in enumerate(grupo, start=1):
+                futuro.set_result(erros.get(numero))
+    
+    def encerrar(self):
+        """Grava o que ainda estiver na fila e para a thread de gravação"""
+        with self._condicao:
+            self._encerrado = True
+            self._condicao.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+def reservar_estoque(produto_id, quantidade, responsavel):
+    """Separa parte do estoque livre de um produto para uma saída em andamento
+
+    Retorna o id da reserva, ou None se o produto não existir ou não houver
+    estoque livre suficiente. A reserva não mantém nenhum lock: até ser
+    confirmada (confirmar_reserva) ou liberada (liberar_reserva), a quantidade
+    apenas deixa de estar disponível para outras saídas e reservas.
+    """
+    if quantidade <= 0:
+        return None
     conn = conectar()
-    cursor = conn.cursor()
+    conn.execute('BEGIN IMMEDIATE')
+    with conn:
+        cursor = conn.execute('''
+            UPDATE produtos SET reservado = reservado + ?
+            WHERE id = ? AND quantidade - reservado >= ?
+        ''', (quantidade, produto_id, quantidade))
+        if cursor.rowcount == 0:
+            return None
+        cursor = conn.execute('''
+            INSERT INTO reservas (produto_id, quantidade, responsavel, data)
+            VALUES (?, ?, ?, ?)
+        ''', (produto_id, quantidade, responsavel, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        return cursor.lastrowid
+
+def _encerrar_reserva(conn, reserva_id):
+    """Apaga a reserva e devolve (produto_id, quantidade, responsavel), ou None"""
+    reserva = conn.execute(
+        'SELECT produto_id, quantidade, responsavel FROM reservas WHERE id = ?', (reserva_id,)
+    ).fetchone()
+    if reserva is not None:
+        conn.execute('DELETE FROM reservas WHERE id = ?', (reserva_id,))
+    return reserva
+
+def confirmar_reserva(reserva_id, motivo=None):
+    """Transforma a reserva em saída
+
+    Retorna True, None se a reserva não existir mais ou False se o produto não
+    tiver estoque para ela (quantidade reduzida antes da migração 10); nesse
+    caso a reserva continua em aberto.
+    """
+    conn = conectar()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        with conn:
+            reserva = _encerrar_reserva(conn, reserva_id)
+            if reserva is None:
+                return None
+            produto_id, quantidade, responsavel = reserva
+            conn.execute('''
+                UPDATE produtos SET quantidade = quantidade - ?, reservado = reservado - ?
+                WHERE id = ?
+            ''', (quantidade, quantidade, produto_id))
+            conn.execute('''
+                INSERT INTO movimentacoes 
+                (produto_id, tipo, quantidade, data, responsavel, motivo) 
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (produto_id, TIPOS_MOVIMENTACAO['saida'], quantidade, _segundos(datetime.now()),
+                  _ids_responsaveis(conn, [responsavel])[responsavel], motivo))
+    except sqlite3.IntegrityError as e:
+        print(f"Erro ao confirmar reserva: {e}")
+        return False
+    _invalidar_cache_produtos()
+    return True
+
+def liberar_reserva(reserva_id):
+    """Desfaz a reserva, devolvendo a quantidade ao estoque livre"""
+    conn = conectar()
+    conn.execute('BEGIN IMMEDIATE')
+    with conn:
+        reserva = _encerrar_reserva(conn, reserva_id)
+        if reserva is None:
+            return False
+        conn.execute('UPDATE produtos SET reservado = reservado - ? WHERE id = ?',
+                     (reserva[1], reserva[0]))
+    return True
+
+def obter_reservas(produto_id=None):
+    """Reservas em aberto (id, produto_id, nome, quantidade, responsavel, data), as mais antigas primeiro"""
+    where = 'WHERE r.produto_id = ?' if produto_id is not None else ''
+    cursor = conectar().execute(f'''
+        SELECT r.id, r.produto_id, p.nome, r.quantidade, r.responsavel, r.data
+        FROM reservas r
+        JOIN produtos p ON r.produto_id = p.id
+        {where}
+        ORDER BY r.id
+    ''', () if produto_id is None else (produto_id,))
+    return cursor.fetchall()
+
+# Arquivo de movimentações antigas: arquivar_movimentacoes leva o que passou do
+# horizonte para um banco por ano ao lado do principal (estoque_arquivo_2024.db),
+# e as consultas anexam (ATTACH) só os anos que o período pedido alcança
+HORIZONTE_ARQUIVO_DIAS = int(os.environ.get('ESTOQUE_ARQUIVO_DIAS', '730'))
+TAMANHO_LOTE_ARQUIVO = 5000
+INTERVALO_LOTES_ARQUIVO = 0.02  # s
+# O SQLite aceita até 10 bancos anexados por conexão
+MAXIMO_ARQUIVOS_ANEXADOS = 8
+COLUNAS_MOVIMENTACOES = 'id, produto_id, tipo, quantidade, data, responsavel, motivo'
+
+class ArquivoMovimentacoesAusente(FileNotFoundError):
+    """O arquivo de um ano registrado em arquivos_movimentacoes não está ao lado do banco
+
+    As consultas que alcançam esse ano falham em vez de devolver um histórico
+    (e saldos) sem as movimentações dele.
+    """
+
+def caminho_arquivo_movimentacoes(ano):
+    """Caminho do arquivo com as movimentações arquivadas do ano"""
+    base, _ = os.path.splitext(CAMINHO_BANCO)
+    return f'{base}_arquivo_{ano}.db'
+
+def _anexar_arquivo(conn, ano, criar=False):
+    """Anexa o arquivo do ano à conexão, se ainda não estiver, e retorna o esquema
+
+    Sem criar, levanta ArquivoMovimentacoesAusente se o arquivo não existir.
+    """
+    esquema = f'arquivo_{int(ano)}'
+    anexados = [linha[1] for linha in conn.execute('PRAGMA database_list')]
+    if esquema in anexados:
+        return esquema
+    caminho = caminho_arquivo_movimentacoes(ano)
+    if not criar and not os.path.exists(caminho):
+        raise ArquivoMovimentacoesAusente(f"Arquivo de movimentações de {ano} não encontrado: {caminho}")
+    outros = [nome for nome in anexados if nome.startswith('arquivo_')]
+    if len(outros) >= MAXIMO_ARQUIVOS_ANEXADOS:
+        conn.execute(f'DETACH DATABASE {outros[0]}')
+    conn.execute(f'ATTACH DATABASE ? AS {esquema}', (caminho,))
+    if _movimentacoes_em_texto(conn, esquema):
+        # Arquivo gravado antes do formato compacto (migração 9)
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            _compactar_movimentacoes(conn, esquema)
+    if criar:
+        conn.execute(f'PRAGMA {esquema}.journal_mode = WAL')
+        _criar_tabela_movimentacoes(conn, esquema)
+    return esquema
+
+def _fontes_movimentacoes(conn, data_inicio=None, data_fim=None, produto_id=None, crescente=False):
+    """Tabelas de movimentações que o período alcança, das mais recentes às mais antigas
+
+    A tabela principal vem sempre; os arquivos anuais só entram se o período
+    ('AAAA-MM-DD', inclusivas) e o produto tiverem movimentações arquivadas,
+    e cada um só é anexado quando chega a sua vez. crescente inverte a ordem.
+    Um arquivo ausente levanta ArquivoMovimentacoesAusente ao chegar a vez dele.
+    """
+    anos = []
+    if produto_id is None or conn.execute(
+            'SELECT 1 FROM saldos_arquivados WHERE produto_id = ?', (produto_id,)).fetchone():
+        condicoes, parametros = [], []
+        if data_inicio:
+            condicoes.append('ultima_data >= ?')
+            parametros.append(data_inicio)
+        if data_fim:
+            condicoes.append('primeira_data <= ?')
+            parametros.append(f'{data_fim} 23:59:59')
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        anos = [linha[0] for linha in conn.execute(
+            f'SELECT ano FROM arquivos_movimentacoes {where} ORDER BY ano DESC', parametros)]
+    if not crescente:
+        yield 'movimentacoes'
+    for ano in reversed(anos) if crescente else anos:
+        yield f'{_anexar_arquivo(conn, ano)}.movimentacoes'
+    if crescente:
+        yield 'movimentacoes'
+
+class _CursorEncadeado:
+    """Lê várias consultas em sequência como se fossem um só cursor (fetchmany/close)
+
+    Cada consulta só é executada quando a anterior termina.
+    """
+    def __init__(self, conn, consultas):
+        self.conn = conn
+        self.consultas = iter(consultas)
+        self.cursor = None
     
-    # Atualiza o estoque
-    if tipo == 'entrada':
-        cursor.execute('UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?', 
-                      (quantidade, produto_id))
-    else:  # saída
-        cursor.execute('UPDATE produtos SET quantidade = quantidade - ? WHERE id = ?', 
-                      (quantidade, produto_id))
-    
-    # Registra a movimentação
-    data = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute('''
-        INSERT INTO movimentacoes 
-        (produto_id, tipo, quantidade, data, responsavel, motivo) 
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (produto_id, tipo, quantidade, data, responsavel, motivo))
-    
-    conn.commit()
-    conn.close()
+    def fetchmany(self, tamanho):
+        while True:
+            if self.cursor is None:
+                consulta = next(self.consultas, None)
+                if consulta is None:
+                    return []
+                self.cursor = self.conn.execute(*consulta)
+            bloco = self.cursor.fetchmany(tamanho)
+            if bloco:
+                return bloco
+            self.cursor.close()
+            self.cursor = None
+    
+    def close(self):
+        if self.cursor is not None:
+            self.cursor.close()
 
-def obter_movimentacoes():
-    """Obtém todas as movimentações"""
+def arquivar_movimentacoes(horizonte_dias=HORIZONTE_ARQUIVO_DIAS, tamanho_lote=TAMANHO_LOTE_ARQUIVO,
+                           progresso=None, cancelar=None):
+    """Leva as movimentações com mais de horizonte_dias dias para os arquivos anuais
+
+    Trabalha em lotes de tamanho_lote, cada um em duas transações curtas. A
+    primeira copia as linhas para o arquivo do ano (sem duplicar, se uma execução
+    interrompida for repetida) e só grava no arquivo: os terminais continuam
+    gravando enquanto ela roda. A segunda, já com a cópia confirmada em disco,
+    soma as linhas ao saldo transportado de cada produto e as apaga da tabela
+    principal; as outras gravações esperam no máximo por ela. Em WAL, uma
+    transação que grava em dois bancos não é atômica entre eles: assim, uma queda
+    no meio nunca perde linhas. Entre as duas (ou se o processo parar ali), o lote
+    aparece também no arquivo, e a próxima execução o completa. Antes, o
+    resumo de consumo é atualizado, e só movimentações já resumidas são arquivadas.
+    progresso(arquivadas) é chamado a cada lote; cancelar.is_set() para entre lotes.
+    Retorna {'arquivadas', 'anos', 'corte', 'cancelado'}.
+    """
+    import time
+    from datetime import timedelta
+    from analise import atualizar_consumo
+    
+    atualizar_consumo(cancelar=cancelar)
+    corte = (datetime.now() - timedelta(days=horizonte_dias)).strftime('%Y-%m-%d')
+    segundos_corte = _segundos(corte)
     conn = conectar()
-    cursor = conn.cursor()
+    resultado = {'arquivadas': 0, 'anos': [], 'corte': corte, 'cancelado': False}
     
-    cursor.execute('''
-        SELECT m.id, m.data, m.tipo, p.nome, m.quantidade, m.responsavel, m.motivo
-        FROM movimentacoes m
-        JOIN produtos p ON m.produto_id = p.id
-        ORDER BY m.data DESC
-    ''')
+    while True:
+        if cancelar is not None and cancelar.is_set():
+            resultado['cancelado'] = True
+            break
+        resumidas = conn.execute(
+            'SELECT ultima_movimentacao FROM analise_controle WHERE id = 1').fetchone()[0]
+        primeira = conn.execute(
+            "SELECT strftime('%Y', MIN(data), 'unixepoch') FROM movimentacoes WHERE data < ?",
+            (segundos_corte,)).fetchone()[0]
+        if primeira is None:
+            break
+        # Cada lote fica dentro de um ano, e portanto de um só arquivo
+        ano = int(primeira)
+        limite = min(segundos_corte, _segundos(f'{ano + 1}-01-01'))
+        ultima = conn.execute('''
+            SELECT data, id FROM movimentacoes
+            WHERE data < ? AND id <= ?
+            ORDER BY data, id LIMIT 1 OFFSET ?
+        ''', (limite, resumidas, tamanho_lote - 1)).fetchone()
+        # +id: o índice de data deve guiar a busca, não a chave primária
+        filtro = 'data < ? AND +id <= ?'
+        parametros = [limite, resumidas]
+        if ultima is not None:
+            filtro += ' AND (data, id) <= (?, ?)'
+            parametros.extend(ultima)
+        
+        # ATTACH e PRAGMA synchronous não podem ser feitos dentro de uma transação
+        esquema = _anexar_arquivo(conn, ano, criar=True)
+        # O commit da cópia chega ao disco antes de a tabela principal ser apagada
+        conn.execute(f'PRAGMA {esquema}.synchronous = FULL')
+        
+        # 1ª transação: só o arquivo recebe gravações. BEGIN simples, pois
+        # IMMEDIATE travaria também o banco principal
+        conn.execute('BEGIN')
+        with conn:
+            # O lote é lido uma vez da tabela principal e as demais etapas usam a cópia
+            conn.execute(f'''
+                CREATE TEMP TABLE lote_arquivo AS
+                SELECT {COLUNAS_MOVIMENTACOES} FROM main.movimentacoes WHERE {filtro}
+            ''', parametros)
+            copiadas = conn.execute('SELECT COUNT(*) FROM temp.lote_arquivo').fetchone()[0]
+            if copiadas:
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO {esquema}.movimentacoes ({COLUNAS_MOVIMENTACOES})
+                    SELECT {COLUNAS_MOVIMENTACOES} FROM temp.lote_arquivo
+                ''')
+        
+        # 2ª transação: saldo transportado e remoção da tabela principal
+        apagadas = 0
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            if copiadas:
+                # Só conta o que ainda está na tabela principal (outra execução do
+                # arquivamento ou uma remoção de produto pode ter apagado linhas)
+                conn.execute('''
+                    DELETE FROM temp.lote_arquivo
+                    WHERE NOT EXISTS (SELECT 1 FROM main.movimentacoes m WHERE m.id = lote_arquivo.id)
+                ''')
+                apagadas = conn.execute('SELECT COUNT(*) FROM temp.lote_arquivo').fetchone()[0]
+            if apagadas:
+                conn.execute(f'''
+                    INSERT INTO saldos_arquivados (produto_id, quantidade, movimentacoes)
+                    SELECT produto_id, SUM({_DELTA_MOVIMENTACAO.format('')}), COUNT(*)
+                    FROM temp.lote_arquivo WHERE true
+                    GROUP BY produto_id
+                    ON CONFLICT (produto_id) DO UPDATE SET
+                        quantidade = quantidade + excluded.quantidade,
+                        movimentacoes = movimentacoes + excluded.movimentacoes
+                ''')
+                conn.execute('''
+                    INSERT INTO arquivos_movimentacoes (ano, movimentacoes, primeira_data, ultima_data)
+                    SELECT ?, COUNT(*), datetime(MIN(data), 'unixepoch'), datetime(MAX(data), 'unixepoch')
+                    FROM temp.lote_arquivo WHERE true
+                    ON CONFLICT (ano) DO UPDATE SET
+                        movimentacoes = movimentacoes + excluded.movimentacoes,
+                        primeira_data = MIN(primeira_data, excluded.primeira_data),
+                        ultima_data = MAX(ultima_data, excluded.ultima_data)
+                ''', (ano,))
+                conn.execute('DELETE FROM main.movimentacoes WHERE id IN (SELECT id FROM temp.lote_arquivo)')
+            conn.execute('DROP TABLE temp.lote_arquivo')
+        if not copiadas:
+            # O que falta antes do corte ainda não entrou no resumo de consumo
+            break
+        resultado['arquivadas'] += apagadas
+        if ano not in resultado['anos']:
+            resultado['anos'].append(ano)
+        if progresso:
+            progresso(resultado['arquivadas'])
+        # Folga entre os lotes para as gravações dos terminais pegarem o lock
+        time.sleep(INTERVALO_LOTES_ARQUIVO)
     
-    movimentacoes = cursor.fetchall()
-    conn.close()
+    return resultado
+
+def sql_historico(fonte='movimentacoes'):
+    """SQL de obter_movimentacoes() sobre uma tabela de movimentações (também para EXPLAIN)"""
+    return f'''
+        SELECT {_COLUNAS_HISTORICO}
+        FROM {fonte} m
+        {_JUNCOES_HISTORICO}
+        ORDER BY m.data DESC
+    '''
+
+def obter_movimentacoes():
+    """Obtém todas as movimentações, inclusive as arquivadas"""
+    conn = conectar()
+    movimentacoes = []
+    for fonte in _fontes_movimentacoes(conn):
+        movimentacoes.extend(conn.execute(sql_historico(fonte)))
     return movimentacoes
 
+def sql_pagina_movimentacoes(fonte='movimentacoes', limite=200, apos=None, data_inicio=None,
+                             data_fim=None, tipo=None, produto_id=None, responsavel=None):
+    """Retorna (sql, parametros) de obter_movimentacoes_pagina() sobre uma tabela de movimentações
+
+    Os filtros são os de obter_movimentacoes_pagina(); serve também para conferir
+    os planos das combinações de filtros (benchmarks/planos.py).
+    """
+    condicoes, parametros = _filtros_movimentacoes(data_inicio, data_fim, produto_id, tipo, responsavel)
+    if apos is not None:
+        condicoes.append('(m.data, m.id) < (?, ?)')
+        parametros.extend((_segundos(apos[0]), apos[1]))
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    return f'''
+        SELECT {_COLUNAS_HISTORICO}
+        FROM {fonte} m
+        {_JUNCOES_HISTORICO}
+        {where}
+        ORDER BY m.data DESC, m.id DESC
+        LIMIT ?
+    ''', parametros + [limite]
+
+def obter_movimentacoes_pagina(limite=200, apos=None, data_inicio=None, data_fim=None,
+                               tipo=None, produto_id=None, responsavel=None):
+    """Obtém uma página do histórico, das mais recentes para as mais antigas
+
+    Usa paginação por chave: apos é o par (data, id) da última linha da página
+    anterior (None para a primeira), então o custo de cada página não depende
+    de quantas já foram lidas. As linhas têm o formato de obter_movimentacoes().
+    Os arquivos anuais só são lidos quando a página não se completa com a
+    tabela principal e o período chega até eles.
+    """
+    conn = conectar()
+    pagina = []
+    for fonte in _fontes_movimentacoes(conn, data_inicio, data_fim, produto_id):
+        pagina.extend(conn.execute(*sql_pagina_movimentacoes(
+            fonte, limite - len(pagina), apos, data_inicio, data_fim, tipo, produto_id, responsavel)))
+        if len(pagina) >= limite:
+            break
+    return pagina
+
+# Consultas usadas tal como estão pelas funções abaixo e por benchmarks/planos.py
+SQL_PRODUTOS_ESTOQUE_BAIXO = '''
+    SELECT id, nome, descricao, quantidade, estoque_minimo 
+    FROM produtos 
+    WHERE quantidade < estoque_minimo
+'''
+SQL_ALERTAS_ESTOQUE = '''
+    SELECT p.id, p.nome, p.quantidade, p.estoque_minimo
+    FROM alertas_estoque a JOIN produtos p ON p.id = a.produto_id
+    WHERE a.id > ? AND a.id <= ? AND p.quantidade < p.estoque_minimo
+    GROUP BY p.id
+    ORDER BY MIN(a.id)
+'''
+
 def produtos_estoque_baixo():
     """Obtém produtos com estoque abaixo do mínimo (ATUALIZADA para usar estoque_minimo)"""
     conn = conectar()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT id, nome, descricao, quantidade, estoque_minimo 
-        FROM produtos 
-        WHERE quantidade < estoque_minimo
-    ''')
+    cursor.execute(SQL_PRODUTOS_ESTOQUE_BAIXO)
     
-    produtos = cursor.fetchall()
-    conn.close()
-    return produtos
+    return cursor.fetchall()
+
+def estoque_em(data, produto_id=None):
+    """Estoque ao final do dia 'AAAA-MM-DD' ou no instante 'AAAA-MM-DD HH:MM:SS'
 
-def exportar_estoque_csv(caminho_arquivo):
-    """Exporta todos os produtos para um arquivo CSV (ATUALIZADA com estoque_minimo)"""
+    Parte do saldo de fechamento mais recente (saldos_diarios) e, para um instante,
+    desconta as movimentações do próprio dia feitas depois da hora; não percorre
+    o histórico.
+    Retorna [(id, nome, quantidade)] dos produtos já existentes na data, ou apenas
+    a quantidade do produto informado (None se ele ainda não existia).
+    """
+    dia = data[:10]
+    saldo = '''(
+        SELECT s.quantidade FROM saldos_diarios s
+        WHERE s.produto_id = p.id AND s.dia <= ?
+        ORDER BY s.dia DESC LIMIT 1
+    )'''
+    parametros = [dia]
     conn = conectar()
-    cursor = conn.cursor()
+    if len(data) > 10:
+        # Fechamento do dia menos o que foi movimentado depois do instante
+        # (no arquivo do ano, se o dia já foi arquivado)
+        fontes = list(_fontes_movimentacoes(conn, dia, dia, produto_id))
+        delta = ' + '.join(f'''COALESCE((
+            SELECT -SUM({_DELTA_MOVIMENTACAO.format('m.')}) FROM {fonte} m
+            WHERE m.produto_id = p.id AND m.data > ? AND m.data <= ?
+        ), 0)''' for fonte in fontes)
+        parametros += [_segundos(data), _segundos(dia) + 86399] * len(fontes)
+    else:
+        delta = 'NULL'
+    filtro = ''
+    if produto_id is not None:
+        filtro = 'WHERE p.id = ?'
+        parametros.append(produto_id)
+    
+    cursor = conn.execute(f'''
+        SELECT id, nome, saldo + COALESCE(delta, 0)
+        FROM (SELECT p.id, p.nome, {saldo} AS saldo, {delta} AS delta FROM produtos p {filtro})
+        WHERE saldo IS NOT NULL
+        ORDER BY id
+    ''', parametros)
+    if produto_id is None:
+        return cursor.fetchall()
+    linha = cursor.fetchone()
+    return linha[2] if linha else None
+
+def reconstruir_saldos_diarios():
+    """Recalcula todos os saldos diários a partir do histórico (manutenção)"""
+    conn = conectar()
+    with conn:
+        _preencher_saldos(conn)
+
+def ultimo_alerta_estoque():
+    """Retorna o id do alerta de estoque baixo mais recente (0 se não houver)"""
+    return conectar().execute('SELECT COALESCE(MAX(id), 0) FROM alertas_estoque').fetchone()[0]
+
+def obter_alertas_estoque(apos_id):
+    """Obtém os produtos que ficaram abaixo do mínimo depois do alerta apos_id
+
+    Retorna (ultimo_id, produtos); cada produto aparece uma vez, no formato
+    (id, nome, quantidade, estoque_minimo) atual, e só se continuar abaixo do mínimo.
+    """
+    conn = conectar()
+    conn.execute('BEGIN')
+    try:
+        ultimo = conn.execute('SELECT COALESCE(MAX(id), 0) FROM alertas_estoque').fetchone()[0]
+        produtos = conn.execute(SQL_ALERTAS_ESTOQUE, (apos_id, ultimo)).fetchall()
+    finally:
+        conn.commit()
+    return ultimo, produtos
+
+# Linhas lidas do cursor por vez nas exportações (memória constante)
+TAMANHO_BLOCO_EXPORTACAO = 5000
+
+def _escrever_csv(cursor, caminho_arquivo, cabecalho, compactar=None, progresso=None, cancelar=None):
+    """Escreve o resultado do cursor em CSV bloco a bloco, sem carregar tudo na memória
+
+    compactar: grava em gzip; por padrão, quando o caminho termina em '.gz'.
+    Retorna False (e remove o arquivo parcial) se a exportação for cancelada; se a
+    leitura falhar (ex.: ArquivoMovimentacoesAusente), remove o arquivo e repassa o erro.
+    """
+    import csv
+    import gzip
     
-    cursor.execute('SELECT nome, descricao, quantidade, estoque_minimo FROM produtos')
-    produtos = cursor.fetchall()
+    if compactar is None:
+        compactar = caminho_arquivo.endswith('.gz')
+    if compactar:
+        arquivo = gzip.open(caminho_arquivo, 'wt', newline='', encoding='utf-8')
+    else:
+        arquivo = open(caminho_arquivo, 'w', newline='', encoding='utf-8')
     
-    with open(caminho_arquivo, 'w', newline='', encoding='utf-8') as arquivo:
-        writer = csv.writer(arquivo)
-        writer.writerow(['Nome', 'Descrição', 'Quantidade', 'Estoque_Mínimo'])
-        writer.writerows(produtos)
+    cancelada = False
+    try:
+        with arquivo:
+            writer = csv.writer(arquivo)
+            writer.writerow(cabecalho)
+            linhas = 0
+            while True:
+                bloco = cursor.fetchmany(TAMANHO_BLOCO_EXPORTACAO)
+                if not bloco:
+                    break
+                writer.writerows(bloco)
+                linhas += len(bloco)
+                if cancelar is not None and cancelar.is_set():
+                    cancelada = True
+                    break
+                if progresso:
+                    progresso(linhas)
+    except Exception:
+        cursor.close()
+        os.remove(caminho_arquivo)
+        raise
     
-    conn.close()
+    cursor.close()
+    if cancelada:
+        os.remove(caminho_arquivo)
+        return False
     return True
 
-def importar_produtos_csv(caminho_arquivo):
-    """Importa produtos de um arquivo CSV (ATUALIZADA com estoque_minimo)"""
+def exportar_estoque_csv(caminho_arquivo, compactar=None, progresso=None, cancelar=None):
+    """Exporta todos os produtos para um arquivo CSV (ATUALIZADA com estoque_minimo)
+
+    progresso(linhas) é chamado a cada bloco gravado; cancelar é um threading.Event opcional.
+    """
+    cursor = conectar().execute(
+        'SELECT nome, descricao, quantidade, estoque_minimo FROM produtos ORDER BY id'
+    )
+    return _escrever_csv(
+        cursor, caminho_arquivo, ['Nome', 'Descrição', 'Quantidade', 'Estoque_Mínimo'],
+        compactar, progresso, cancelar
+    )
+
+def _filtros_movimentacoes(data_inicio=None, data_fim=None, produto_id=None, tipo=None, responsavel=None):
+    """Monta as condições SQL (sobre o alias m) e parâmetros dos filtros de movimentações
+
+    As datas são 'AAAA-MM-DD' (data_fim inclui o dia todo); tipo e responsavel são nomes.
+    """
+    condicoes = []
+    parametros = []
+    if data_inicio:
+        condicoes.append('m.data >= ?')
+        parametros.append(_segundos(data_inicio))
+    if data_fim:
+        condicoes.append('m.data <= ?')
+        parametros.append(_segundos(data_fim[:10]) + 86399)
+    if produto_id is not None:
+        condicoes.append('m.produto_id = ?')
+        parametros.append(produto_id)
+    if tipo:
+        condicoes.append('m.tipo = ?')
+        parametros.append(TIPOS_MOVIMENTACAO.get(tipo, 0))
+    if responsavel:
+        condicoes.append('m.responsavel IN (SELECT id FROM usuarios WHERE nome = ?)')
+        parametros.append(responsavel)
+    return condicoes, parametros
+
+def exportar_movimentacoes_csv(caminho_arquivo, data_inicio=None, data_fim=None, produto_id=None,
+                               compactar=None, progresso=None, cancelar=None):
+    """Exporta o histórico de movimentações para CSV em ordem cronológica
+
+    data_inicio e data_fim são datas 'AAAA-MM-DD' (inclusivas); produto_id filtra um produto.
+    Os arquivos anuais que o período alcança são lidos antes da tabela principal.
+    """
+    condicoes, parametros = _filtros_movimentacoes(data_inicio, data_fim, produto_id)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+    
+    conn = conectar()
+    cursor = _CursorEncadeado(conn, ((f'''
+        SELECT {_COLUNAS_HISTORICO}
+        FROM {fonte} m
+        {_JUNCOES_HISTORICO}
+        {where}
+        ORDER BY m.data, m.id
+    ''', parametros) for fonte in _fontes_movimentacoes(conn, data_inicio, data_fim, produto_id, crescente=True)))
+    return _escrever_csv(
+        cursor, caminho_arquivo,
+        ['ID', 'Data', 'Tipo', 'Produto', 'Quantidade', 'Responsável', 'Motivo'],
+        compactar, progresso, cancelar
+    )
+
+# Cabeçalhos aceitos para cada coluna do CSV de produtos, em ordem de preferência
+COLUNAS_CSV_PRODUTOS = {
+    'nome': ('Nome', 'nome'),
+    'descricao': ('Descrição', 'descricao'),
+    'quantidade': ('Quantidade', 'quantidade'),
+    'estoque_minimo': ('Estoque_Mínimo', 'estoque_minimo'),
+}
+
+# Linhas processadas por bloco na importação e máximo de ocorrências detalhadas no relatório
+TAMANHO_BLOCO_IMPORTACAO = 5000
+LIMITE_OCORRENCIAS_IMPORTACAO = 1000
+
+def _mapear_cabecalho(cabecalho):
+    """Resolve uma única vez a posição de cada coluna conhecida no cabeçalho"""
+    posicoes = {}
+    for campo, nomes in COLUNAS_CSV_PRODUTOS.items():
+        for nome in nomes:
+            if nome in cabecalho:
+                posicoes[campo] = cabecalho.index(nome)
+                break
+    return posicoes
+
+# Modos de importação: 'inserir' só cadastra nomes novos; 'atualizar' também sobrescreve
+# descrição, quantidade e mínimo dos existentes; 'diferencas' atualiza apenas o que mudou
+MODOS_IMPORTACAO = ('inserir', 'atualizar', 'diferencas')
+
+def _produtos_por_nome(conn, nomes):
+    """Retorna {nome: (id, descricao, quantidade, estoque_minimo, reservado)} dos nomes já cadastrados"""
+    nomes = list(nomes)
+    atuais = {}
+    for i in range(0, len(nomes), 500):
+        bloco = nomes[i:i + 500]
+        marcadores = ','.join('?' * len(bloco))
+        cursor = conn.execute(f'''
+            SELECT nome, id, descricao, quantidade, estoque_minimo, reservado
+            FROM produtos WHERE nome IN ({marcadores})
+        ''', bloco)
+        atuais.update((linha[0], linha[1:]) for linha in cursor)
+    return atuais
+
+def _gravar_bloco_importacao(conn, bloco, relatorio, modo, responsavel):
+    """Grava um bloco de linhas válidas com executemany conforme o modo de importação
+
+    Quantidades alteradas de produtos existentes geram movimentações de 'ajuste'.
+    Linhas que reduziriam a quantidade abaixo do estoque reservado são ignoradas.
+    Um nome repetido no bloco vale pela última linha; as anteriores são ignoradas.
+    """
+    # A segunda gravação do mesmo nome com a mesma versão dispararia os triggers
+    # linha a linha e contaria o produto duas vezes no relatório
+    ultimas = {}
+    for linha in bloco:
+        anterior = ultimas.pop(linha[1], None)
+        if anterior is not None:
+            _registrar_ocorrencia(relatorio, 'ignorados', anterior[0],
+                                  f"Nome repetido na linha {linha[0]} do arquivo")
+        ultimas[linha[1]] = linha
+    
+    atuais = _produtos_por_nome(conn, ultimas)
+    gravar = []
+    indexados = {}  # id -> (nome, descricao) no índice de busca, antes deste bloco
+    diferencas = []  # (id, quantidade nova - anterior) dos produtos alterados
+    for numero, nome, descricao, quantidade, estoque_minimo in ultimas.values():
+        valores = (descricao, quantidade, estoque_minimo)
+        atual = atuais.get(nome)
+        if atual is None:
+            relatorio['inseridos'] += 1
+        elif modo == 'inserir':
+            _registrar_ocorrencia(relatorio, 'ignorados', numero, "Produto já cadastrado")
+            continue
+        elif modo == 'diferencas' and atual[1:4] == valores:
+            relatorio['inalterados'] += 1
+            continue
+        elif quantidade - atual[4] < 0 and quantidade < atual[2]:
+            # Mesma regra do trigger trg_produtos_estoque_reservado
+            _registrar_ocorrencia(relatorio, 'ignorados', numero,
+                                  f"Quantidade abaixo do estoque reservado ({atual[4]})")
+            continue
+        else:
+            relatorio['atualizados'] += 1
+            indexados[atual[0]] = (nome, atual[1])
+            if quantidade != atual[2]:
+                diferencas.append((atual[0], quantidade - atual[2]))
+        gravar.append((nome,) + valores)
+    
+    if not gravar:
+        return
+    
+    # Todo o bloco recebe a mesma versão do catálogo (evita triggers linha a linha)
+    versao = _proxima_versao_produtos(conn)
+    gravar = [linha + (versao,) for linha in gravar]
+    if modo == 'inserir':
+        conn.executemany('''
+            INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo, versao) 
+            VALUES (?, ?, ?, ?, ?)
+        ''', gravar)
+    else:
+        conn.executemany('''
+            INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo, versao) 
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (nome) DO UPDATE SET
+                descricao = excluded.descricao,
+                quantidade = excluded.quantidade,
+                estoque_minimo = excluded.estoque_minimo,
+                versao = excluded.versao
+        ''', gravar)
+    _reindexar_busca(
+        conn, versao, [(produto_id,) + antigo for produto_id, antigo in indexados.items()]
+    )
+    _registrar_saldos(conn, versao)
+    
+    if diferencas:
+        data = _segundos(datetime.now())
+        responsavel_id = _ids_responsaveis(conn, [responsavel])[responsavel]
+        conn.executemany('''
+            INSERT INTO movimentacoes 
+            (produto_id, tipo, quantidade, data, responsavel, motivo) 
+            VALUES (?, ?, ?, ?, ?, 'Importação CSV')
+        ''', [(produto_id, TIPOS_MOVIMENTACAO['ajuste'], diferenca, data, responsavel_id)
+              for produto_id, diferenca in diferencas])
+
+def _registrar_ocorrencia(relatorio, tipo, numero, motivo):
+    """Conta uma linha ignorada/inválida e guarda o detalhe até o limite do relatório"""
+    relatorio[tipo] += 1
+    if len(relatorio['ocorrencias']) < LIMITE_OCORRENCIAS_IMPORTACAO:
+        relatorio['ocorrencias'].append((numero, motivo))
+
+class _ImportacaoCancelada(Exception):
+    """Interrompe a importação e desfaz a transação"""
+
+def _campo(campos, posicao):
+    """Retorna o valor da coluna na linha, ou '' quando a coluna não existe"""
+    if posicao is None or posicao >= len(campos):
+        return ''
+    return campos[posicao].strip()
+
+def importar_produtos_csv(caminho_arquivo, progresso=None, cancelar=None,
+                          tamanho_bloco=TAMANHO_BLOCO_IMPORTACAO, modo='inserir',
+                          responsavel='importacao'):
+    """Importa produtos de um arquivo CSV em blocos, em uma única transação
+
+    modo: 'inserir', 'atualizar' ou 'diferencas' (ver MODOS_IMPORTACAO).
+    progresso: função opcional chamada a cada bloco com (linhas_lidas, fracao_do_arquivo).
+    cancelar: objeto opcional com is_set() (ex.: threading.Event); se sinalizado,
+    a importação é desfeita por completo.
+    responsavel: nome gravado nas movimentações de ajuste das quantidades alteradas.
+    
+    Retorna um relatório: {'sucesso', 'cancelado', 'erro', 'linhas', 'inseridos',
+    'atualizados', 'inalterados', 'ignorados', 'invalidos',
+    'ocorrencias': [(linha, motivo), ...]}.
+    """
+    import csv
+    
+    if modo not in MODOS_IMPORTACAO:
+        raise ValueError(f"Modo de importação desconhecido: {modo}")
+    
+    relatorio = {
+        'sucesso': False, 'cancelado': False, 'erro': None, 'linhas': 0,
+        'inseridos': 0, 'atualizados': 0, 'inalterados': 0,
+        'ignorados': 0, 'invalidos': 0, 'ocorrencias': [],
+    }
     conn = conectar()
-    cursor = conn.cursor()
     
     try:
-        with open(caminho_arquivo, 'r', newline='', encoding='utf-8') as arquivo:
-            reader = csv.DictReader(arquivo)
-            for linha in reader:
-                nome = linha.get('Nome') or linha.get('nome')
-                descricao = linha.get('Descrição') or linha.get('descricao') or ''
-                quantidade = linha.get('Quantidade') or linha.get('quantidade') or '0'
-                estoque_minimo = linha.get('Estoque_Mínimo') or linha.get('estoque_minimo') or '0'
+        tamanho_arquivo = os.path.getsize(caminho_arquivo) or 1
+        with open(caminho_arquivo, 'rb') as bruto, conn:
+            # utf-8-sig aceita arquivos salvos pelo Excel (com BOM)
+            arquivo = io.TextIOWrapper(bruto, encoding='utf-8-sig', newline='')
+            reader = csv.reader(arquivo)
+            posicoes = _mapear_cabecalho(next(reader, []))
+            if 'nome' not in posicoes:
+                relatorio['erro'] = "Coluna 'Nome' não encontrada no cabeçalho"
+                return relatorio
+            
+            col_nome = posicoes['nome']
+            col_desc = posicoes.get('descricao')
+            col_quant = posicoes.get('quantidade')
+            col_min = posicoes.get('estoque_minimo')
+            
+            bloco = []
+            for campos in reader:
+                relatorio['linhas'] += 1
+                numero = reader.line_num
+                nome = _campo(campos, col_nome)
+                descricao = _campo(campos, col_desc)
+                quantidade = _campo(campos, col_quant) or '0'
+                estoque_minimo = _campo(campos, col_min) or '0'
                 
-                if nome and quantidade.isdigit() and estoque_minimo.isdigit():
-                    try:
-                        cursor.execute('''
-                            INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo) 
-                            VALUES (?, ?, ?, ?)
-                        ''', (nome, descricao, int(quantidade), int(estoque_minimo)))
-                    except sqlite3.IntegrityError:
-                        continue
+                if not nome:
+                    _registrar_ocorrencia(relatorio, 'invalidos', numero, "Nome vazio")
+                elif not quantidade.isdigit():
+                    _registrar_ocorrencia(relatorio, 'invalidos', numero, f"Quantidade inválida: {quantidade}")
+                elif not estoque_minimo.isdigit():
+                    _registrar_ocorrencia(relatorio, 'invalidos', numero, f"Estoque mínimo inválido: {estoque_minimo}")
+                else:
+                    bloco.append((numero, nome, descricao, int(quantidade), int(estoque_minimo)))
+                
+                if len(bloco) >= tamanho_bloco:
+                    _gravar_bloco_importacao(conn, bloco, relatorio, modo, responsavel)
+                    bloco = []
+                    if cancelar is not None and cancelar.is_set():
+                        raise _ImportacaoCancelada()
+                    if progresso:
+                        progresso(relatorio['linhas'], bruto.tell() / tamanho_arquivo)
+            
+            if bloco:
+                _gravar_bloco_importacao(conn, bloco, relatorio, modo, responsavel)
+            if cancelar is not None and cancelar.is_set():
+                raise _ImportacaoCancelada()
         
-        conn.commit()
-        return True
+        if progresso:
+            progresso(relatorio['linhas'], 1.0)
+        relatorio['sucesso'] = True
+    except _ImportacaoCancelada:
+        relatorio['cancelado'] = True
+        relatorio['inseridos'] = relatorio['atualizados'] = 0
     except Exception as e:
         print(f"Erro ao importar CSV: {e}")
-        return False
-    finally:
-        conn.close()
+        relatorio['erro'] = str(e)
+        relatorio['inseridos'] = relatorio['atualizados'] = 0
+    _invalidar_cache_produtos()
+    
+    relatorio['ocorrencias'].sort()
+    return relatorio
+
+def definir_estoques_minimos(valores):
+    """Atualiza o estoque mínimo de vários produtos em uma única transação
+
+    valores: [(produto_id, estoque_minimo), ...]. Retorna quantos produtos mudaram.
+    """
+    conn = conectar()
+    with conn:
+        versao = _proxima_versao_produtos(conn)
+        cursor = conn.executemany('''
+            UPDATE produtos SET estoque_minimo = ?, versao = ?
+            WHERE id = ? AND estoque_minimo IS NOT ?
+        ''', [(minimo, versao, produto_id, minimo) for produto_id, minimo in valores])
+    _invalidar_cache_produtos()
+    return cursor.rowcount
+
+# Entradas, saídas ou histórico arquivado impedem a remoção; parâmetros:
+# (produto_id, código de 'ajuste', produto_id)
+SQL_PRODUTO_COM_HISTORICO = '''
+    SELECT EXISTS (SELECT 1 FROM movimentacoes WHERE produto_id = ? AND tipo <> ?)
+        OR EXISTS (SELECT 1 FROM saldos_arquivados WHERE produto_id = ?)
+'''
 
 def remover_produto(produto_id):
-    """Remove um produto do banco de dados"""
+    """Remove um produto do banco de dados
+
+    Produtos com entradas, saídas ou histórico arquivado não são removidos. Os
+    ajustes de quantidade sozinhos não impedem a remoção e são apagados junto.
+    """
     conn = conectar()
     cursor = conn.cursor()
     
     try:
-        # Verifica se há movimentações para este produto
-        cursor.execute('SELECT COUNT(*) FROM movimentacoes WHERE produto_id = ?', (produto_id,))
-        if cursor.fetchone()[0] > 0:
-            return False  # Não permite remover produtos com histórico
-        
-        cursor.execute('DELETE FROM produtos WHERE id = ?', (produto_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            # Verifica se há movimentações para este produto (também entre as arquivadas)
+            cursor.execute(SQL_PRODUTO_COM_HISTORICO,
+                           (produto_id, TIPOS_MOVIMENTACAO['ajuste'], produto_id))
+            if cursor.fetchone()[0]:
+                return False  # Não permite remover produtos com histórico
+            
+            # Produtos com reservas em aberto também não são removidos
+            cursor.execute('DELETE FROM produtos WHERE id = ? AND reservado = 0', (produto_id,))
+            removido = cursor.rowcount > 0
+            if removido:
+                cursor.execute('DELETE FROM movimentacoes WHERE produto_id = ?', (produto_id,))
+        _invalidar_cache_produtos()
+        return removido
     except Exception as e:
         print(f"Erro ao remover produto: {e}")
         return False
-    finally:
-        conn.close()
 
-def atualizar_quantidade_produto(produto_id, nova_quantidade):
-    """Atualiza a quantidade de um produto no estoque (NOVA FUNÇÃO)"""
+def atualizar_quantidade_produto(produto_id, nova_quantidade, responsavel='sistema', motivo=None):
+    """Atualiza a quantidade de um produto no estoque (NOVA FUNÇÃO)
+
+    A diferença é registrada como movimentação do tipo 'ajuste', mantendo o
+    histórico coerente com o estoque.
+    """
     try:
         conn = conectar()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE produtos SET quantidade = ? WHERE id = ?",
-            (nova_quantidade, produto_id)
-        )
-        conn.commit()
-        return cursor.rowcount > 0
+        # IMMEDIATE: ninguém altera a quantidade entre a leitura e a gravação
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            atual = conn.execute(
+                'SELECT quantidade FROM produtos WHERE id = ?', (produto_id,)
+            ).fetchone()
+            if atual is None:
+                return False
+            diferenca = nova_quantidade - atual[0]
+            if diferenca:
+                conn.execute(
+                    "UPDATE produtos SET quantidade = ? WHERE id = ?",
+                    (nova_quantidade, produto_id)
+                )
+                conn.execute('''
+                    INSERT INTO movimentacoes 
+                    (produto_id, tipo, quantidade, data, responsavel, motivo) 
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (produto_id, TIPOS_MOVIMENTACAO['ajuste'], diferenca, _segundos(datetime.now()),
+                      _ids_responsaveis(conn, [responsavel])[responsavel], motivo))
+        _invalidar_cache_produtos()
+        return True
     except sqlite3.Error as e:
         print(f"Erro ao atualizar quantidade: {e}")
         return False
-    finally:
-        conn.close()
-
-# Cria as tabelas ao importar o módulo
-criar_tabelas()
 
+if METRICAS:
+    metricas.instrumentar(globals())
@@ -0,0 +1,30 @@
+"""Benchmarks do sistema de estoque
+
+Cada módulo pode ser executado a partir da raiz do projeto, por exemplo:
+    python -m benchmarks.conexoes
+"""
+import os
+import tempfile
+import time
+
+def preparar_banco_temporario(nome='benchmark.db'):
+    """Aponta o módulo banco para um arquivo isolado e o retorna já importado"""
+    pasta = tempfile.mkdtemp(prefix='estoque_bench_')
+    caminho = os.path.join(pasta, nome)
+    # Precisa ser definido antes do primeiro import de banco
+    os.environ['ESTOQUE_DB'] = caminho
+    import banco
+    banco.definir_caminho_banco(caminho)
+    return banco
+
+def medir(funcao, repeticoes):
+    """Executa a função N vezes e retorna operações por segundo"""
+    inicio = time.perf_counter()
+    for i in range(repeticoes):
+        funcao(i)
+    duracao = time.perf_counter() - inicio
+    return repeticoes / duracao if duracao else float('inf')
+
+def imprimir_resultado(descricao, antes, depois):
+    """Imprime uma linha de comparação antes/depois"""
+    print(f"{descricao:<35} {antes:>12,.0f} ops/s {depois:>12,.0f} ops/s   {depois / antes:>6.1f}x")
@@ -0,0 +1,65 @@
+"""Benchmark: registrar_movimentacao direto x GravadorMovimentacoes (group commit)
+
+Várias threads registram movimentações ao mesmo tempo; com o gravador, as que
+chegam juntas dividem a mesma transação e o mesmo fsync.
+
+Uso: python -m benchmarks.agrupamento [movimentacoes_por_thread]
+"""
+import sqlite3
+import sys
+import threading
+import time
+
+from benchmarks import preparar_banco_temporario
+
+PRODUTOS = 500
+
+def executar(threads, por_thread, registrar):
+    """Roda `threads` threads chamando registrar(i); retorna (movimentações/s, erros)"""
+    erros = []
+    barreira = threading.Barrier(threads + 1)
+
+    def trabalhar(t):
+        barreira.wait()
+        for i in range(por_thread):
+            try:
+                erro = registrar(t * por_thread + i)
+            except sqlite3.OperationalError as e:  # database is locked
+                erro = str(e)
+            if erro:
+                erros.append(erro)
+
+    grupo = [threading.Thread(target=trabalhar, args=(t,)) for t in range(threads)]
+    for thread in grupo:
+        thread.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for thread in grupo:
+        thread.join()
+    return threads * por_thread / (time.perf_counter() - inicio), len(erros)
+
+def main():
+    por_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    banco = preparar_banco_temporario()
+    for i in range(PRODUTOS):
+        banco.adicionar_produto(f'Produto {i}', 'benchmark', 100, 10)
+
+    def direto(i):
+        banco.registrar_movimentacao(i % PRODUTOS + 1, 'entrada', 1, 'benchmark', 'Direto')
+
+    gravador = banco.GravadorMovimentacoes()
+
+    def agrupado(i):
+        return gravador.registrar(i % PRODUTOS + 1, 'entrada', 1, 'benchmark', 'Agrupado')
+
+    print(f"{por_thread} movimentações por thread; synchronous={banco.configuracoes_ativas()['synchronous']}")
+    print(f"{'threads':<8} {'direto':>14} {'agrupado':>14} {'ganho':>7} {'erros (direto/agrupado)':>25}")
+    for threads in (1, 8, 32):
+        antes, erros_antes = executar(threads, por_thread, direto)
+        depois, erros_depois = executar(threads, por_thread, agrupado)
+        print(f"{threads:<8} {antes:>10,.0f} /s {depois:>10,.0f} /s {depois / antes:>6.1f}x "
+              f"{erros_antes:>12} / {erros_depois}")
+    gravador.encerrar()
+
+if __name__ == '__main__':
+    main()
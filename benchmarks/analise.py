@@ -0,0 +1,59 @@
+"""Benchmark: análise de consumo em 100 mil produtos com dois anos de histórico
+
+Uso: python -m benchmarks.analise [produtos] [movimentacoes]
+"""
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+
+def popular_historico(banco, produtos, movimentacoes, deslocamento=0):
+    """Insere produtos e movimentações espalhadas pelos últimos 730 dias direto no banco"""
+    conn = banco.conectar()
+    responsavel = banco.obter_id_responsavel('benchmark')
+    with conn:
+        if not deslocamento:
+            conn.execute('''
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo)
+                SELECT 'Produto ' || i, 'benchmark', i % 500, 10 FROM n
+            ''', (produtos,))
+        conn.execute('''
+            WITH RECURSIVE n(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, responsavel)
+            SELECT (i * 7919) % ? + 1,
+                   CASE WHEN i % 4 = 0 THEN 1 ELSE 2 END,
+                   i % 10 + 1,
+                   CAST(strftime('%s', 'now', 'localtime', '-' || ((i * 104729) % 730) || ' days') AS INTEGER),
+                   ?
+            FROM n
+        ''', (deslocamento + 1, deslocamento + movimentacoes, produtos, responsavel))
+
+def cronometrar(descricao, funcao):
+    """Executa e imprime a duração; retorna o resultado"""
+    inicio = time.perf_counter()
+    resultado = funcao()
+    print(f"{descricao:<45} {time.perf_counter() - inicio:8.2f} s")
+    return resultado
+
+def main():
+    produtos = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    movimentacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000_000
+    banco = preparar_banco_temporario()
+    import analise
+    
+    cronometrar(f"Gerar {produtos:,} produtos e {movimentacoes:,} mov.",
+                lambda: popular_historico(banco, produtos, movimentacoes))
+    cronometrar("Primeira agregação (todo o histórico)", analise.atualizar_consumo)
+    relatorio = cronometrar("Relatório de reposição", analise.relatorio_reposicao)
+    
+    cronometrar("Registrar mais 50.000 movimentações",
+                lambda: popular_historico(banco, produtos, 50_000, movimentacoes))
+    cronometrar("Agregação incremental", analise.atualizar_consumo)
+    cronometrar("Relatório de reposição", analise.relatorio_reposicao)
+    cronometrar("Aplicar pontos como estoque mínimo", analise.aplicar_pontos_reposicao)
+    
+    print(f"\n{len(relatorio):,} produtos; mais urgente: {relatorio[0]}")
+
+if __name__ == '__main__':
+    main()
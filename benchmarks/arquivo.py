@@ -0,0 +1,101 @@
+"""Benchmark: arquivamento das movimentações antigas
+
+Gera três anos de histórico, mede as consultas, arquiva tudo o que tem mais de
+um ano enquanto outra thread registra movimentações (a maior espera dela mostra
+quanto tempo cada lote segura o lock de escrita) e mede as mesmas consultas
+depois, conferindo que os resultados não mudaram.
+
+Uso: python -m benchmarks.arquivo [movimentacoes] [tamanho_lote]
+"""
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+from analise import atualizar_consumo
+from benchmarks import preparar_banco_temporario
+from benchmarks.dados import gerar_dados
+
+def consultas(banco, quente):
+    """Consultas medidas: (descrição, função)"""
+    return [
+        ("primeira página do histórico", lambda: banco.obter_movimentacoes_pagina(200)),
+        ("página do último mês", lambda: banco.obter_movimentacoes_pagina(
+            200, data_inicio='2025-12-01', data_fim='2025-12-31')),
+        ("página de um mês arquivado", lambda: banco.obter_movimentacoes_pagina(
+            200, data_inicio='2023-06-01', data_fim='2023-06-30')),
+        ("histórico de um produto quente", lambda: banco.obter_movimentacoes_pagina(
+            200, produto_id=quente)),
+        ("estoque em uma data arquivada", lambda: banco.estoque_em('2023-06-30 12:00:00', quente)),
+        ("remover_produto (com histórico)", lambda: banco.remover_produto(quente)),
+    ]
+
+def cronometrar(funcao, repeticoes=50):
+    """Retorna (resultado, mediana em ms)"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, sorted(tempos)[len(tempos) // 2] * 1000
+
+def main():
+    movimentacoes = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    tamanho_lote = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    banco = preparar_banco_temporario()
+    populares = gerar_dados(banco, max(movimentacoes // 10, 100), movimentacoes, dias=3 * 365)
+    quente = populares[0]
+    # Em uso normal o resumo de consumo já está em dia e o arquivamento só o confere
+    atualizar_consumo()
+    tamanho = os.path.getsize(banco.CAMINHO_BANCO)
+
+    antes = {}
+    for descricao, funcao in consultas(banco, quente):
+        antes[descricao] = cronometrar(funcao)
+
+    # Uma thread faz o papel dos terminais, gravando ~500 movimentações/s durante o arquivamento
+    parar = threading.Event()
+    esperas = []
+
+    def gravar():
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            banco.registrar_movimentacao(quente, 'entrada', 1, 'benchmark', 'Durante o arquivamento')
+            esperas.append(time.perf_counter() - inicio)
+            time.sleep(0.002)
+        banco.fechar_conexao()
+
+    gravador = threading.Thread(target=gravar)
+    gravador.start()
+    lotes = []
+    inicio = time.perf_counter()
+    resultado = banco.arquivar_movimentacoes((date.today() - date(2025, 1, 1)).days, tamanho_lote,
+                                             progresso=lambda _: lotes.append(time.perf_counter()))
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    gravador.join()
+    banco.conectar().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    print(f"{resultado['arquivadas']:,} movimentações arquivadas em {duracao:.2f}s "
+          f"({resultado['arquivadas'] / duracao:,.0f}/s, lotes de {tamanho_lote})")
+    intervalos = [depois - antes for antes, depois in zip([inicio] + lotes, lotes)]
+    print(f"{len(lotes)} lotes; o mais demorado levou {max(intervalos) * 1000:.0f} ms "
+          f"(incluindo a folga entre lotes)")
+    print(f"gravações concorrentes: {len(esperas):,}, maior espera {max(esperas) * 1000:.1f} ms, "
+          f"mediana {sorted(esperas)[len(esperas) // 2] * 1000:.2f} ms")
+    arquivos = sum(os.path.getsize(banco.caminho_arquivo_movimentacoes(ano)) for ano in resultado['anos'])
+    print(f"banco principal: {tamanho / 2**20:.0f} MB antes; arquivos anuais: {arquivos / 2**20:.0f} MB\n")
+
+    print(f"{'consulta':<35} {'antes':>10} {'depois':>10}")
+    # As gravações concorrentes mudam o histórico do produto quente: só compara o que elas não alcançam
+    comparaveis = {"página de um mês arquivado", "remover_produto (com histórico)"}
+    for descricao, funcao in consultas(banco, quente):
+        resultado_antes, ms_antes = antes[descricao]
+        resultado_depois, ms_depois = cronometrar(funcao)
+        if descricao in comparaveis:
+            assert resultado_antes == resultado_depois, descricao
+        print(f"{descricao:<35} {ms_antes:>7.2f} ms {ms_depois:>7.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark: latência da busca de produtos (FTS5) em um catálogo grande
+
+Uso: python -m benchmarks.busca [produtos]
+"""
+import csv
+import os
+import random
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+
+PRODUTOS = ["Açúcar", "Café", "Feijão", "Arroz", "Óleo", "Sabão", "Macarrão", "Leite", "Farinha",
+            "Biscoito", "Chocolate", "Detergente", "Água", "Suco", "Pão", "Manteiga", "Queijo"]
+VARIANTES = ["Cristal", "Refinado", "Integral", "Tradicional", "Premium", "Light", "Zero", "Extra"]
+MARCAS = ["União", "Pilão", "Camil", "Liza", "Ypê", "Nestlé", "Italac", "Dona Benta", "Piraquê"]
+EMBALAGENS = ["1kg", "500g", "2L", "1L", "5kg", "200g", "300ml", "12un"]
+
+# Termos como digitados no balcão: sem acento, parciais e combinados
+TERMOS = ["acucar", "caf", "feijao 1k", "uniao cristal", "uniao crist", "12345", "detergente ype", "xyz"]
+
+def gerar_catalogo(banco, quantidade):
+    """Cadastra produtos com nomes em português pela importação de CSV (caminho em lote)"""
+    aleatorio = random.Random(42)
+    caminho = os.path.join(os.path.dirname(banco.CAMINHO_BANCO), 'catalogo_busca.csv')
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        writer = csv.writer(arquivo)
+        writer.writerow(['Nome', 'Descrição', 'Quantidade', 'Estoque_Mínimo'])
+        for i in range(quantidade):
+            writer.writerow([
+                f"{aleatorio.choice(PRODUTOS)} {aleatorio.choice(VARIANTES)} "
+                f"{aleatorio.choice(MARCAS)} {aleatorio.choice(EMBALAGENS)} {i}",
+                f"Linha {aleatorio.choice(VARIANTES)} {aleatorio.choice(MARCAS)}", 10, 5
+            ])
+    relatorio = banco.importar_produtos_csv(caminho)
+    assert relatorio['sucesso'], relatorio
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    banco = preparar_banco_temporario()
+    inicio = time.perf_counter()
+    gerar_catalogo(banco, quantidade)
+    print(f"{quantidade:,} produtos cadastrados em {time.perf_counter() - inicio:.1f}s")
+    # Mede a consulta ao banco, não o cache de resultados
+    banco.definir_cache_produtos(False)
+    
+    for termo in TERMOS:
+        banco.obter_produtos(termo)  # aquece o cache de páginas
+        tempos = []
+        for _ in range(20):
+            inicio = time.perf_counter()
+            resultado = banco.obter_produtos(termo)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        print(f"{termo!r:<18} {len(resultado):>4} resultados   mediana {tempos[10]:6.2f} ms   "
+              f"pior {tempos[-1]:6.2f} ms")
+
+if __name__ == '__main__':
+    main()
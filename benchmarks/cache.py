@@ -0,0 +1,59 @@
+"""Benchmark: fluxos típicos da interface com e sem o cache do catálogo
+
+Uso: python -m benchmarks.cache [produtos]
+"""
+import sys
+
+from benchmarks import preparar_banco_temporario, medir, imprimir_resultado
+from benchmarks.busca import gerar_catalogo
+
+# Digitação no seletor de produto, com correções (o que o debounce deixa passar)
+DIGITACAO = ["ac", "acu", "acuc", "acucar", "acuca", "acucar", "acucar u", "acucar un", "acucar uniao"]
+
+def fluxos(banco, quantidade):
+    """Operações executadas pela interface, cada uma parametrizada pela repetição"""
+    nomes = [prod[1] for prod in banco.obter_produtos()[:200]]
+    
+    def abrir_consulta(i):
+        banco.obter_produtos()
+    
+    def digitar_no_seletor(i):
+        for texto in DIGITACAO:
+            banco.obter_produtos(texto, 20)
+    
+    def confirmar_produto(i):
+        produto = banco.obter_produto_por_nome(nomes[i % len(nomes)])
+        banco.obter_produto(produto[0])
+    
+    def registrar_entrada(i):
+        # Seleção no seletor, confirmação e gravação; a consulta aberta recarrega
+        produto = banco.obter_produto_por_nome(nomes[i % len(nomes)])
+        banco.registrar_movimentacao(produto[0], 'entrada', 1, 'benchmark')
+        banco.obter_produtos()
+    
+    return [
+        ("Abrir consulta de estoque", abrir_consulta, 20),
+        ("Digitar no seletor (9 buscas)", digitar_no_seletor, 200),
+        ("Confirmar produto escolhido", confirmar_produto, 5000),
+        ("Registrar entrada + recarregar", registrar_entrada, 50),
+    ]
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    banco = preparar_banco_temporario()
+    gerar_catalogo(banco, quantidade)
+    print(f"{quantidade:,} produtos\n")
+    print(f"{'Fluxo':<35} {'sem cache':>18} {'com cache':>18}")
+    
+    for descricao, fluxo, repeticoes in fluxos(banco, quantidade):
+        banco.definir_cache_produtos(False)
+        sem_cache = medir(fluxo, repeticoes)
+        banco.definir_cache_produtos(True)
+        fluxo(0)  # primeira leitura preenche o cache
+        com_cache = medir(fluxo, repeticoes)
+        imprimir_resultado(descricao, sem_cache, com_cache)
+    
+    print(f"\nContadores: {banco.estatisticas_cache_produtos()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Benchmark: movimentações em texto x formato compacto (migração 9)
+
+Parte do banco sintético da escala pedida (já compacto), refaz nele a tabela
+movimentacoes no formato anterior (datas 'AAAA-MM-DD HH:MM:SS', tipo e
+responsável em texto) e aplica a migração sobre essa cópia, medindo o tempo.
+Compara o tamanho dos dois arquivos depois de VACUUM, o espaço da tabela e de
+cada índice (se o SQLite tiver dbstat) e as mesmas consultas escritas para
+cada formato, em conexões simples com as configurações padrão do SQLite.
+
+Uso: python -m benchmarks.compactacao [escala]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks import preparar_banco_temporario
+from benchmarks.dados import ESCALAS, banco_sintetico, copiar_banco
+from benchmarks.suite import medir_operacao
+
+# (descrição, SQL no formato texto, SQL no formato compacto); os parâmetros são
+# as datas de PERIODOS e o produto mais movimentado, já convertidos para cada formato
+CONSULTAS = [
+    ("contagem de um mês",
+     'SELECT COUNT(*), SUM(quantidade) FROM movimentacoes WHERE data >= :inicio AND data <= :fim',
+     'SELECT COUNT(*), SUM(quantidade) FROM movimentacoes WHERE data >= :inicio AND data <= :fim'),
+    ("página de um mês (200)",
+     '''SELECT m.id, m.data, m.tipo, p.nome, m.quantidade, m.responsavel, m.motivo
+        FROM movimentacoes m JOIN produtos p ON m.produto_id = p.id
+        WHERE m.data >= :inicio AND m.data <= :fim
+        ORDER BY m.data DESC, m.id DESC LIMIT 200''',
+     '''SELECT m.id, datetime(m.data, 'unixepoch'),
+               CASE m.tipo WHEN 1 THEN 'entrada' WHEN 2 THEN 'saida' WHEN 3 THEN 'ajuste' END,
+               p.nome, m.quantidade, u.nome, m.motivo
+        FROM movimentacoes m JOIN produtos p ON m.produto_id = p.id
+        LEFT JOIN usuarios u ON u.id = m.responsavel
+        WHERE m.data >= :inicio AND m.data <= :fim
+        ORDER BY m.data DESC, m.id DESC LIMIT 200'''),
+    ("saídas por dia de um mês",
+     '''SELECT substr(data, 1, 10), SUM(quantidade) FROM movimentacoes
+        WHERE data >= :inicio AND data <= :fim AND tipo = 'saida' GROUP BY 1''',
+     '''SELECT date(data, 'unixepoch'), SUM(quantidade) FROM movimentacoes
+        WHERE data >= :inicio AND data <= :fim AND tipo = 2 GROUP BY 1'''),
+    ("produto mais movimentado no ano",
+     '''SELECT id, data, quantidade FROM movimentacoes
+        WHERE produto_id = :produto AND data >= :inicio_ano AND data <= :fim
+        ORDER BY data''',
+     '''SELECT id, data, quantidade FROM movimentacoes
+        WHERE produto_id = :produto AND data >= :inicio_ano AND data <= :fim
+        ORDER BY data'''),
+    ("percorrer o índice de datas",
+     'SELECT COUNT(*) FROM (SELECT data FROM movimentacoes ORDER BY data)',
+     'SELECT COUNT(*) FROM (SELECT data FROM movimentacoes ORDER BY data)'),
+    ("histórico completo (formato da tela)",
+     '''SELECT m.id, m.data, m.tipo, p.nome, m.quantidade, m.responsavel, m.motivo
+        FROM movimentacoes m JOIN produtos p ON m.produto_id = p.id
+        ORDER BY m.data DESC''',
+     '''SELECT m.id, datetime(m.data, 'unixepoch'),
+               CASE m.tipo WHEN 1 THEN 'entrada' WHEN 2 THEN 'saida' WHEN 3 THEN 'ajuste' END,
+               p.nome, m.quantidade, u.nome, m.motivo
+        FROM movimentacoes m JOIN produtos p ON m.produto_id = p.id
+        LEFT JOIN usuarios u ON u.id = m.responsavel
+        ORDER BY m.data DESC'''),
+]
+PERIODOS = {'inicio': '2025-06-01 00:00:00', 'fim': '2025-06-30 23:59:59', 'inicio_ano': '2025-01-01 00:00:00'}
+
+def voltar_formato_texto(caminho, versao):
+    """Reescreve movimentacoes como era antes da migração 9 e volta o esquema para versao
+
+    versao é a posição da migração 9 em banco.MIGRACOES; as migrações seguintes
+    também são desfeitas, para serem reaplicadas junto com ela.
+    """
+    conn = sqlite3.connect(caminho)
+    conn.executescript(f'''
+        BEGIN;
+        DROP TRIGGER IF EXISTS trg_produtos_estoque_reservado;
+        DROP VIEW historico_movimentacoes;
+        DROP INDEX idx_usuarios_nome;
+        DROP INDEX idx_movimentacoes_produto_data;
+        DROP INDEX idx_movimentacoes_data;
+        ALTER TABLE movimentacoes RENAME TO movimentacoes_compactas;
+        CREATE TABLE movimentacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            responsavel TEXT NOT NULL,
+            motivo TEXT,
+            FOREIGN KEY (produto_id) REFERENCES produtos (id)
+        );
+        INSERT INTO movimentacoes
+        SELECT m.id, m.produto_id,
+               CASE m.tipo WHEN 1 THEN 'entrada' WHEN 2 THEN 'saida' ELSE 'ajuste' END,
+               m.quantidade, datetime(m.data, 'unixepoch'), u.nome, m.motivo
+        FROM movimentacoes_compactas m JOIN usuarios u ON u.id = m.responsavel
+        ORDER BY m.id;
+        DROP TABLE movimentacoes_compactas;
+        CREATE INDEX idx_movimentacoes_produto_data ON movimentacoes (produto_id, data);
+        CREATE INDEX idx_movimentacoes_data ON movimentacoes (data);
+        PRAGMA user_version = {versao};
+        COMMIT;
+    ''')
+    conn.close()
+
+def compactar_arquivo(caminho):
+    """VACUUM sem WAL, para comparar só o espaço ocupado pelos dados"""
+    conn = sqlite3.connect(caminho)
+    conn.execute('PRAGMA journal_mode = DELETE')
+    conn.execute('VACUUM')
+    conn.close()
+    return os.path.getsize(caminho)
+
+def espaco_movimentacoes(conn):
+    """{tabela ou índice: bytes} das estruturas de movimentacoes, ou {} sem dbstat"""
+    try:
+        return dict(conn.execute('''
+            SELECT name, SUM(pgsize) FROM dbstat
+            WHERE name IN ('movimentacoes', 'idx_movimentacoes_produto_data', 'idx_movimentacoes_data')
+            GROUP BY name
+        '''))
+    except sqlite3.OperationalError:
+        return {}
+
+def medir_consultas(caminho, indice, parametros):
+    """Mediana (ms) de cada consulta de CONSULTAS na coluna indice (1 texto, 2 compacto)"""
+    conn = sqlite3.connect(caminho)
+    medianas = {}
+    resultados = {}
+    for consulta in CONSULTAS:
+        sql = consulta[indice]
+        resultados[consulta[0]] = conn.execute(sql, parametros).fetchall()
+        medianas[consulta[0]] = medir_operacao(lambda i: conn.execute(sql, parametros).fetchall())['mediana_ms']
+    conn.close()
+    return medianas, resultados
+
+def main():
+    escala = sys.argv[1] if len(sys.argv) > 1 else '1m'
+    produtos, movimentacoes = ESCALAS[escala]
+    banco = preparar_banco_temporario()
+    pasta = tempfile.mkdtemp(prefix='estoque_compactacao_')
+    compacto = os.path.join(pasta, 'compacto.db')
+    texto = os.path.join(pasta, 'texto.db')
+    populares = banco_sintetico(banco, escala, compacto)['populares']
+    banco_sintetico(banco, escala, texto)
+    banco.definir_caminho_banco(os.path.join(pasta, 'vazio.db'))
+    voltar_formato_texto(texto, banco.MIGRACOES.index(banco._migracao_movimentacoes_compactas))
+    tamanho_texto = compactar_arquivo(texto)
+    tamanho_compacto = compactar_arquivo(compacto)
+
+    # A migração de verdade, sobre o banco no formato antigo
+    migrado = os.path.join(pasta, 'migrado.db')
+    copiar_banco(texto, migrado)
+    banco.definir_caminho_banco(migrado)
+    inicio = time.perf_counter()
+    banco.conectar()
+    duracao_migracao = time.perf_counter() - inicio
+    banco.definir_caminho_banco(os.path.join(pasta, 'vazio.db'))
+    tamanho_migrado = compactar_arquivo(migrado)
+
+    print(f"{movimentacoes:,} movimentações, {produtos:,} produtos; "
+          f"migração 9 aplicada em {duracao_migracao:.1f}s\n")
+    print(f"{'tamanho':<40} {'texto':>10} {'compacto':>10}")
+    print(f"{'arquivo (após VACUUM)':<40} {tamanho_texto / 2**20:>7.1f} MB {tamanho_compacto / 2**20:>7.1f} MB"
+          f"   ({1 - tamanho_compacto / tamanho_texto:.0%} menor; migrado: {tamanho_migrado / 2**20:.1f} MB)")
+    espaco_texto = espaco_movimentacoes(sqlite3.connect(texto))
+    espaco_compacto = espaco_movimentacoes(sqlite3.connect(compacto))
+    for nome in espaco_texto:
+        print(f"{nome:<40} {espaco_texto[nome] / 2**20:>7.1f} MB {espaco_compacto[nome] / 2**20:>7.1f} MB"
+              f"   ({1 - espaco_compacto[nome] / espaco_texto[nome]:.0%} menor)")
+
+    parametros_texto = dict(PERIODOS, produto=populares[0])
+    parametros_compactos = {nome: int((datetime.fromisoformat(data) - datetime(1970, 1, 1)).total_seconds())
+                            for nome, data in PERIODOS.items()}
+    parametros_compactos['produto'] = populares[0]
+    antes, resultados_texto = medir_consultas(texto, 1, parametros_texto)
+    depois, resultados_compactos = medir_consultas(compacto, 2, parametros_compactos)
+
+    print(f"\n{'consulta':<40} {'texto':>10} {'compacto':>10}")
+    for descricao, *_ in CONSULTAS:
+        # As mesmas linhas nos dois formatos
+        assert ([linha[0] for linha in resultados_texto[descricao]]
+                == [linha[0] for linha in resultados_compactos[descricao]]), descricao
+        print(f"{descricao:<40} {antes[descricao]:>7.2f} ms {depois[descricao]:>7.2f} ms"
+              f"   {antes[descricao] / depois[descricao]:5.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Teste de estresse: muitas threads disputando poucos produtos
+
+Cada thread registra saídas diretas, reservas (confirmadas ou liberadas) e
+algumas entradas. Ao final confere, para cada produto, que o estoque nunca
+ficou negativo, que não sobrou reserva e que nenhuma atualização se perdeu:
+quantidade = inicial + entradas - saídas, tanto pelo histórico gravado quanto
+pelo que as threads registraram com sucesso.
+
+Uso: python -m benchmarks.concorrencia [threads] [operacoes_por_thread]
+"""
+import random
+import sys
+import threading
+import time
+
+from benchmarks import preparar_banco_temporario
+
+ESTOQUE_INICIAL = 1000
+
+def estressar(banco, produtos, threads, por_thread):
+    """Executa a carga sobre os ids em `produtos`; retorna (duração, saldos por produto, recusas)"""
+    # Variação confirmada de cada produto e recusas, somadas por thread e juntadas no fim
+    variacoes = [{} for _ in range(threads)]
+    recusas = [0] * threads
+    barreira = threading.Barrier(threads + 1)
+
+    def trabalhar(t):
+        aleatorio = random.Random(t)
+        variacao = variacoes[t]
+        barreira.wait()
+        for _ in range(por_thread):
+            produto_id = aleatorio.choice(produtos)
+            quantidade = aleatorio.randint(1, 5)
+            sorteio = aleatorio.random()
+            if sorteio < 0.15:
+                banco.registrar_movimentacao(produto_id, 'entrada', quantidade, f'thread {t}', 'Estresse')
+                variacao[produto_id] = variacao.get(produto_id, 0) + quantidade
+            elif sorteio < 0.6:
+                if banco.registrar_movimentacao(produto_id, 'saida', quantidade, f'thread {t}', 'Estresse'):
+                    variacao[produto_id] = variacao.get(produto_id, 0) - quantidade
+                else:
+                    recusas[t] += 1
+            else:
+                # Separação em duas etapas: reserva e, depois, confirmação ou desistência
+                reserva_id = banco.reservar_estoque(produto_id, quantidade, f'thread {t}')
+                if reserva_id is None:
+                    recusas[t] += 1
+                elif aleatorio.random() < 0.7:
+                    assert banco.confirmar_reserva(reserva_id, 'Separação')
+                    variacao[produto_id] = variacao.get(produto_id, 0) - quantidade
+                else:
+                    assert banco.liberar_reserva(reserva_id)
+
+    grupo = [threading.Thread(target=trabalhar, args=(t,)) for t in range(threads)]
+    for thread in grupo:
+        thread.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for thread in grupo:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    esperado = {produto_id: ESTOQUE_INICIAL for produto_id in produtos}
+    for variacao in variacoes:
+        for produto_id, delta in variacao.items():
+            esperado[produto_id] += delta
+    return duracao, esperado, sum(recusas)
+
+def conferir(banco, esperado):
+    """Falha se algum produto divergir do esperado, do histórico ou ficar negativo"""
+    conn = banco.conectar()
+    for produto_id, quantidade_esperada in esperado.items():
+        quantidade, reservado = conn.execute(
+            'SELECT quantidade, reservado FROM produtos WHERE id = ?', (produto_id,)).fetchone()
+        historico = conn.execute('''
+            SELECT COALESCE(SUM(CASE tipo WHEN 2 THEN -quantidade ELSE quantidade END), 0)
+            FROM movimentacoes WHERE produto_id = ?
+        ''', (produto_id,)).fetchone()[0]
+        assert quantidade >= 0, (produto_id, quantidade)
+        assert reservado == 0, (produto_id, reservado)
+        assert quantidade == quantidade_esperada, (produto_id, quantidade, quantidade_esperada)
+        assert quantidade == ESTOQUE_INICIAL + historico, (produto_id, quantidade, historico)
+    assert conn.execute('SELECT COUNT(*) FROM reservas').fetchone()[0] == 0
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    por_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    banco = preparar_banco_temporario()
+    with banco.conectar() as conn:
+        conn.executemany(
+            'INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo) VALUES (?, ?, ?, ?)',
+            ((f'Produto {i}', 'estresse', ESTOQUE_INICIAL, 10) for i in range(1, 1001))
+        )
+    # A quantidade inicial não passa pelo histórico: começa a contar daqui
+    banco.conectar().execute('DELETE FROM movimentacoes')
+    banco.conectar().commit()
+
+    print(f"{threads} threads x {por_thread} operações")
+    for descricao, produtos in (("3 produtos disputados", [1, 2, 3]),
+                                ("1.000 produtos", list(range(1, 1001)))):
+        duracao, esperado, recusas = estressar(banco, produtos, threads, por_thread)
+        conferir(banco, esperado)
+        minimo = min(esperado.values())
+        print(f"{descricao:<24} {threads * por_thread / duracao:>8,.0f} op/s   "
+              f"recusadas por falta de estoque: {recusas:>6,}   menor saldo: {minimo}")
+        # Próxima rodada parte do estoque inicial
+        with banco.conectar() as conn:
+            conn.execute('UPDATE produtos SET quantidade = ?', (ESTOQUE_INICIAL,))
+            conn.execute('DELETE FROM movimentacoes')
+    print("Nenhum saldo negativo, nenhuma reserva pendente, nenhuma atualização perdida")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Benchmark: conexão aberta a cada chamada x conexão persistente por thread
+
+Uso: python -m benchmarks.conexoes [repeticoes]
+"""
+import sqlite3
+import sys
+from datetime import datetime
+
+from benchmarks import preparar_banco_temporario, medir, imprimir_resultado
+
+def registrar_movimentacao_por_chamada(caminho, produto_id, quantidade, responsavel):
+    """Reproduz o caminho antigo: abre, executa, confirma e fecha a cada chamada"""
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?',
+                   (quantidade, produto_id))
+    data = int((datetime.now() - datetime(1970, 1, 1)).total_seconds())
+    cursor.execute('''
+        INSERT INTO movimentacoes
+        (produto_id, tipo, quantidade, data, responsavel, motivo)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (produto_id, 1, quantidade, data, responsavel, None))
+    conn.commit()
+    conn.close()
+
+def obter_produtos_por_chamada(caminho):
+    """Reproduz o caminho antigo de obter_produtos()"""
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, nome, descricao, quantidade, estoque_minimo FROM produtos')
+    produtos = cursor.fetchall()
+    conn.close()
+    return produtos
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    banco = preparar_banco_temporario()
+    caminho = banco.CAMINHO_BANCO
+    
+    for i in range(100):
+        banco.adicionar_produto(f'Produto {i}', 'benchmark', 100, 10)
+    
+    print(f"{'Operação':<35} {'por chamada':>18} {'persistente':>18}")
+    responsavel = banco.obter_id_responsavel('benchmark')
+    antes = medir(lambda i: registrar_movimentacao_por_chamada(caminho, i % 100 + 1, 1, responsavel),
+                  repeticoes)
+    depois = medir(lambda i: banco.registrar_movimentacao(i % 100 + 1, 'entrada', 1, 'benchmark'), repeticoes)
+    imprimir_resultado('registrar_movimentacao', antes, depois)
+    
+    antes = medir(lambda i: obter_produtos_por_chamada(caminho), repeticoes)
+    depois = medir(lambda i: banco.obter_produtos(), repeticoes)
+    imprimir_resultado('obter_produtos', antes, depois)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Gerador determinístico de dados sintéticos para os benchmarks
+
+Mesma semente, mesmos dados: N produtos com nomes em português e M movimentações
+espalhadas por um intervalo de datas, concentradas nos produtos mais movimentados
+(lei de Zipf: o produto de posição r no ranking tem peso 1/r^s, e o ranking é
+embaralhado para os mais vendidos não serem os primeiros ids). As movimentações
+saem em ordem cronológica acompanhando o saldo de cada produto, então nenhum
+saldo fica negativo e a quantidade final de cada produto bate com o histórico.
+
+Os bancos gerados ficam guardados na pasta temporária do sistema; cada
+benchmark trabalha sobre uma cópia, já que várias operações gravam.
+"""
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.busca import PRODUTOS, VARIANTES, MARCAS, EMBALAGENS
+
+SEMENTE = 20250101
+# Mudou a forma de gerar? Incremente para descartar os bancos guardados
+VERSAO_GERADOR = 1
+
+# Escala: (produtos, movimentações)
+ESCALAS = {
+    '10k': (1_000, 10_000),
+    '100k': (10_000, 100_000),
+    '1m': (100_000, 1_000_000),
+}
+
+FIM_PADRAO = '2025-12-31'
+DIAS_PADRAO = 365
+ASSIMETRIA_PADRAO = 1.1
+
+RESPONSAVEIS = ['admin', 'joao', 'maria', 'expedicao', 'recebimento', 'coletor 1', 'coletor 2']
+MOTIVOS = {
+    'entrada': ['Compra', 'Devolução de cliente', None],
+    'saida': ['Venda', 'Requisição interna', 'Perda', None],
+    'ajuste': ['Inventário', 'Correção de lançamento'],
+}
+TAMANHO_BLOCO = 50_000
+
+def gerar_dados(banco, produtos, movimentacoes, fim=FIM_PADRAO, dias=DIAS_PADRAO,
+                semente=SEMENTE, assimetria=ASSIMETRIA_PADRAO):
+    """Insere os produtos e movimentações sintéticos no banco atual de `banco`
+
+    Retorna a lista de ids dos produtos, do mais movimentado ao menos movimentado.
+    """
+    aleatorio = random.Random(semente)
+    conn = banco.conectar()
+    primeiro_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM produtos').fetchone()[0]
+
+    pesos = [1 / posicao ** assimetria for posicao in range(1, produtos + 1)]
+    aleatorio.shuffle(pesos)
+    acumulados = list(itertools.accumulate(pesos))
+    indices = range(produtos)
+    saldos = [0] * produtos
+
+    inicio = datetime.fromisoformat(fim) + timedelta(days=1) - timedelta(days=dias)
+    # movimentacoes.data é a hora local em segundos desde 1970 (formato compacto)
+    inicio = int((inicio - datetime(1970, 1, 1)).total_seconds())
+    passo = dias * 86400 / max(movimentacoes, 1)
+    tipos = banco.TIPOS_MOVIMENTACAO
+    responsaveis = [banco.obter_id_responsavel(nome) for nome in RESPONSAVEIS]
+
+    with conn:
+        for bloco in range(0, movimentacoes, TAMANHO_BLOCO):
+            quantidade_bloco = min(TAMANHO_BLOCO, movimentacoes - bloco)
+            sorteados = aleatorio.choices(indices, cum_weights=acumulados, k=quantidade_bloco)
+            linhas = []
+            for deslocamento, indice in enumerate(sorteados):
+                i = bloco + deslocamento
+                data = inicio + int(i * passo + aleatorio.random() * passo)
+                saldo = saldos[indice]
+                sorteio = aleatorio.random()
+                if saldo and sorteio < 0.01:
+                    tipo = 'ajuste'
+                    quantidade = max(-saldo, aleatorio.choice((-3, -2, -1, 1, 2)))
+                elif saldo and sorteio < 0.76:
+                    tipo = 'saida'
+                    quantidade = min(saldo, aleatorio.randint(1, 20))
+                else:
+                    tipo = 'entrada'
+                    quantidade = aleatorio.randint(5, 40)
+                saldos[indice] = saldo + (-quantidade if tipo == 'saida' else quantidade)
+                linhas.append((
+                    primeiro_id + indice, tipos[tipo], quantidade, data,
+                    aleatorio.choice(responsaveis), aleatorio.choice(MOTIVOS[tipo])
+                ))
+            conn.executemany('''
+                INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, responsavel, motivo)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', linhas)
+
+        # Produtos por último, já com o saldo final do histórico
+        conn.executemany(
+            'INSERT INTO produtos (id, nome, descricao, quantidade, estoque_minimo) VALUES (?, ?, ?, ?, ?)',
+            ((primeiro_id + indice,
+              f"{aleatorio.choice(PRODUTOS)} {aleatorio.choice(VARIANTES)} "
+              f"{aleatorio.choice(MARCAS)} {aleatorio.choice(EMBALAGENS)} {primeiro_id + indice}",
+              f"Linha {aleatorio.choice(VARIANTES)} {aleatorio.choice(MARCAS)}",
+              saldos[indice], aleatorio.randint(0, 10))
+             for indice in indices)
+        )
+    banco.reconstruir_saldos_diarios()
+    banco.limpar_cache_produtos()
+    return [primeiro_id + indice for indice in sorted(indices, key=lambda indice: -pesos[indice])]
+
+def copiar_banco(origem, destino):
+    """Copia um banco SQLite (inclusive o que estiver no WAL) pela API de backup"""
+    fonte = sqlite3.connect(origem)
+    alvo = sqlite3.connect(destino)
+    try:
+        fonte.backup(alvo)
+    finally:
+        alvo.close()
+        fonte.close()
+
+def banco_sintetico(banco, escala, destino, semente=SEMENTE, origem=None):
+    """Aponta `banco` para `destino`, uma cópia do banco sintético da escala
+
+    O banco de cada (escala, semente, versão do esquema) é gerado uma vez e
+    guardado; com `origem` (ex.: uma cópia do estoque.db de produção), os dados
+    sintéticos são somados aos dela e nada é guardado. Retorna um dicionário com
+    os ids mais movimentados (até 1000) e o tempo de geração (0 se já estava guardado).
+    """
+    produtos, movimentacoes = ESCALAS[escala]
+    pasta = os.path.join(tempfile.gettempdir(), 'estoque_bench_dados')
+    os.makedirs(pasta, exist_ok=True)
+    guardado = os.path.join(
+        pasta, f'{escala}-s{semente}-g{VERSAO_GERADOR}-e{len(banco.MIGRACOES)}.db')
+    populares = guardado + '.ids'
+
+    geracao = 0.0
+    if origem is not None or not os.path.exists(guardado):
+        base = destino if origem is not None else guardado + '.tmp'
+        for caminho in (base, base + '-wal', base + '-shm'):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        if origem is not None:
+            copiar_banco(origem, base)
+        banco.definir_caminho_banco(base)
+        inicio = time.perf_counter()
+        ids = gerar_dados(banco, produtos, movimentacoes, semente=semente)[:1000]
+        geracao = time.perf_counter() - inicio
+        banco.fechar_conexoes()
+        if origem is not None:
+            banco.definir_caminho_banco(destino)
+            return {'populares': ids, 'geracao_s': geracao}
+        with open(populares, 'w') as arquivo:
+            arquivo.write(' '.join(map(str, ids)))
+        copiar_banco(base, guardado)
+        for caminho in (base, base + '-wal', base + '-shm'):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    with open(populares) as arquivo:
+        ids = [int(valor) for valor in arquivo.read().split()]
+    copiar_banco(guardado, destino)
+    banco.definir_caminho_banco(destino)
+    return {'populares': ids, 'geracao_s': geracao}
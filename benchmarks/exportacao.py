@@ -0,0 +1,65 @@
+"""Benchmark: exportação de histórico grande de movimentações
+
+Uso: python -m benchmarks.exportacao [movimentacoes]
+Mostra a taxa de exportação e o pico de memória do processo, que deve ficar
+estável independentemente do tamanho do histórico.
+"""
+import os
+import resource
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+
+def popular_movimentacoes(banco, quantidade, produtos=1000):
+    """Insere produtos e movimentações sintéticas diretamente, em blocos"""
+    conn = banco.conectar()
+    with conn:
+        conn.executemany(
+            'INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo) VALUES (?, ?, ?, ?)',
+            [(f'Produto {i}', 'benchmark', 1000, 10) for i in range(produtos)]
+        )
+    responsavel = banco.obter_id_responsavel('benchmark')
+    for inicio in range(0, quantidade, 100_000):
+        linhas = [
+            (i % produtos + 1, 1 if i % 3 else 2, i % 20 + 1,
+             f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:{i % 60:02d}:00',
+             responsavel, None)
+            for i in range(inicio, min(inicio + 100_000, quantidade))
+        ]
+        with conn:
+            conn.executemany('''
+                INSERT INTO movimentacoes (produto_id, tipo, quantidade, data, responsavel, motivo)
+                VALUES (?, ?, ?, CAST(strftime('%s', ?) AS INTEGER), ?, ?)
+            ''', linhas)
+
+def pico_memoria_mb():
+    """Pico de memória residente do processo (Linux: ru_maxrss em KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    banco = preparar_banco_temporario()
+    pasta = os.path.dirname(banco.CAMINHO_BANCO)
+    popular_movimentacoes(banco, quantidade)
+    memoria_inicial = pico_memoria_mb()
+    
+    for nome, filtros in [
+        ('movimentacoes.csv', {}),
+        ('movimentacoes.csv.gz', {}),
+        ('primeiro_trimestre.csv', {'data_inicio': '2025-01-01', 'data_fim': '2025-03-31'}),
+        ('um_produto.csv', {'produto_id': 1}),
+    ]:
+        caminho = os.path.join(pasta, nome)
+        linhas = []
+        inicio = time.perf_counter()
+        banco.exportar_movimentacoes_csv(caminho, progresso=linhas.append, **filtros)
+        duracao = time.perf_counter() - inicio
+        total = linhas[-1] if linhas else 0
+        print(f"{nome:<25} {total:>10,} linhas em {duracao:6.2f}s "
+              f"({total / duracao:>10,.0f} linhas/s)  pico de memória {pico_memoria_mb():.0f} MB")
+    
+    print(f"pico de memória antes das exportações: {memoria_inicial:.0f} MB")
+
+if __name__ == '__main__':
+    main()
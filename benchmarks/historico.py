@@ -0,0 +1,41 @@
+"""Benchmark: abertura do histórico (primeira página) x carregar o histórico inteiro
+
+Uso: python -m benchmarks.historico [movimentacoes]
+"""
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+from benchmarks.exportacao import popular_movimentacoes
+
+def cronometrar(funcao):
+    """Retorna (resultado, milissegundos)"""
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    banco = preparar_banco_temporario()
+    popular_movimentacoes(banco, quantidade)
+    
+    pagina, ms = cronometrar(lambda: banco.obter_movimentacoes_pagina(200))
+    print(f"primeira página (200)              {ms:8.2f} ms")
+    
+    # Página profunda: o custo não cresce com a posição
+    apos = (pagina[-1][1], pagina[-1][0])
+    for _ in range(100):
+        pagina = banco.obter_movimentacoes_pagina(200, apos)
+        apos = (pagina[-1][1], pagina[-1][0])
+    _, ms = cronometrar(lambda: banco.obter_movimentacoes_pagina(200, apos))
+    print(f"página 102 (200)                   {ms:8.2f} ms")
+    
+    _, ms = cronometrar(lambda: banco.obter_movimentacoes_pagina(
+        200, data_inicio='2025-06-01', data_fim='2025-06-30', tipo='entrada'))
+    print(f"primeira página filtrada           {ms:8.2f} ms")
+    
+    historico, ms = cronometrar(banco.obter_movimentacoes)
+    print(f"obter_movimentacoes ({len(historico):,} linhas) {ms:8.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Benchmark: importação de catálogo CSV grande
+
+Uso: python -m benchmarks.importacao [linhas]
+"""
+import csv
+import os
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+
+def gerar_catalogo(caminho, linhas, alterados=0):
+    """Gera um CSV de produtos no formato exportado pelo sistema
+
+    alterados: a cada quantas linhas a quantidade difere da geração original (0 = nenhuma).
+    """
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        writer = csv.writer(arquivo)
+        writer.writerow(['Nome', 'Descrição', 'Quantidade', 'Estoque_Mínimo'])
+        for i in range(linhas):
+            quantidade = i % 500
+            if alterados and i % alterados == 0:
+                quantidade += 1
+            writer.writerow([f'Produto {i:07d}', f'Descrição do produto {i}', quantidade, i % 50])
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    banco = preparar_banco_temporario()
+    caminho = os.path.join(os.path.dirname(banco.CAMINHO_BANCO), 'catalogo.csv')
+    gerar_catalogo(caminho, linhas)
+    
+    inicio = time.perf_counter()
+    relatorio = banco.importar_produtos_csv(caminho)
+    duracao = time.perf_counter() - inicio
+    assert relatorio['sucesso'], relatorio
+    print(f"{relatorio['inseridos']:,} produtos importados em {duracao:.2f}s "
+          f"({relatorio['inseridos'] / duracao:,.0f} linhas/s)")
+    
+    # Reimportar o mesmo arquivo: todas as linhas são ignoradas
+    inicio = time.perf_counter()
+    relatorio = banco.importar_produtos_csv(caminho)
+    duracao = time.perf_counter() - inicio
+    print(f"reimportação: {relatorio['ignorados']:,} ignorados em {duracao:.2f}s")
+    
+    # Catálogo noturno com 1% das linhas alteradas, nos modos de atualização
+    gerar_catalogo(caminho, linhas, alterados=100)
+    for modo in ('diferencas', 'atualizar'):
+        inicio = time.perf_counter()
+        relatorio = banco.importar_produtos_csv(caminho, modo=modo)
+        duracao = time.perf_counter() - inicio
+        print(f"modo {modo}: {relatorio['atualizados']:,} atualizados, "
+              f"{relatorio['inalterados']:,} inalterados em {duracao:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark de inicialização: importação de banco e tempo até a tela de login
+
+Cada medição roda em um processo novo (partida a frio do interpretador, com os
+.pyc já gerados). Mostra os módulos mais caros segundo `-X importtime` e falha
+(código de saída 1) se algum orçamento for ultrapassado, para uso em CI. A tela
+de login só é medida onde customtkinter e um display estiverem disponíveis.
+
+Uso: python -m benchmarks.inicializacao [repeticoes]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Orçamentos (s), medidos do início do processo
+ORCAMENTO_IMPORTACAO_BANCO = 0.15
+ORCAMENTO_TELA_LOGIN = 2.0
+
+TELA_LOGIN = '''
+import time
+inicio = time.perf_counter()
+import customtkinter as ctk
+import sistema_estoque
+root = ctk.CTk()
+app = sistema_estoque.EstoqueApp(root)
+root.update()
+print(time.perf_counter() - inicio)
+root.destroy()
+'''
+
+IMPORTACAO_BANCO = '''
+import time
+inicio = time.perf_counter()
+import banco
+importacao = time.perf_counter() - inicio
+inicio = time.perf_counter()
+banco.conectar()
+print(importacao, time.perf_counter() - inicio)
+'''
+
+def executar(codigo, caminho_banco, *opcoes):
+    """Roda o código em um interpretador novo; retorna (stdout, stderr, código de saída)"""
+    ambiente = dict(os.environ, ESTOQUE_DB=caminho_banco,
+                    PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])))
+    processo = subprocess.run([sys.executable, *opcoes, '-c', codigo], cwd=RAIZ, env=ambiente,
+                              capture_output=True, text=True)
+    return processo.stdout, processo.stderr, processo.returncode
+
+def mais_caros(saida_importtime, quantidade=8):
+    """Módulos de maior tempo acumulado em uma saída de -X importtime"""
+    linhas = []
+    for linha in saida_importtime.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, modulo = linha.split('|')
+        linhas.append((int(acumulado), modulo.rstrip()))
+    return sorted(linhas, reverse=True)[:quantidade]
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pasta = tempfile.mkdtemp(prefix='estoque_bench_')
+    caminho = os.path.join(pasta, 'inicializacao.db')
+    falhas = []
+
+    # Importar banco não pode tocar no arquivo: o esquema fica para a primeira conexão
+    _, erro, codigo = executar('import banco', caminho)
+    assert codigo == 0, erro
+    assert not os.path.exists(caminho), "import banco criou o arquivo do banco"
+
+    # Primeira conexão em banco novo (cria o esquema) e nas seguintes (só confere a versão)
+    saida, erro, codigo = executar(IMPORTACAO_BANCO, caminho)
+    assert codigo == 0, erro
+    criacao = float(saida.split()[1])
+    medidas = []
+    for _ in range(repeticoes):
+        saida, erro, codigo = executar(IMPORTACAO_BANCO, caminho)
+        assert codigo == 0, erro
+        medidas.append(tuple(float(valor) for valor in saida.split()))
+    importacao = min(m[0] for m in medidas)
+    conexao = min(m[1] for m in medidas)
+    print(f"import banco                        {importacao * 1000:>8.1f} ms")
+    print(f"primeira conexão (esquema em dia)   {conexao * 1000:>8.1f} ms")
+    print(f"primeira conexão (banco novo)       {criacao * 1000:>8.1f} ms")
+    if importacao > ORCAMENTO_IMPORTACAO_BANCO:
+        falhas.append(f"import banco: {importacao:.3f} s > {ORCAMENTO_IMPORTACAO_BANCO} s")
+
+    _, erro, _ = executar('import banco', caminho, '-X', 'importtime')
+    print("\nMódulos mais caros ao importar banco (acumulado):")
+    for microssegundos, modulo in mais_caros(erro):
+        print(f"  {microssegundos / 1000:>8.1f} ms  {modulo}")
+
+    # Tela de login: do início do processo até o primeiro desenho
+    saida, erro, codigo = executar(TELA_LOGIN, caminho)
+    if codigo != 0:
+        motivo = erro.strip().splitlines()[-1] if erro.strip() else f"código {codigo}"
+        print(f"\nTela de login não medida ({motivo})")
+    else:
+        tempos = [float(saida)]
+        for _ in range(repeticoes - 1):
+            saida, _, _ = executar(TELA_LOGIN, caminho)
+            tempos.append(float(saida))
+        tela = min(tempos)
+        print(f"\nTela de login desenhada             {tela * 1000:>8.1f} ms")
+        _, erro, _ = executar(TELA_LOGIN, caminho, '-X', 'importtime')
+        print("Módulos mais caros até a tela de login (acumulado):")
+        for microssegundos, modulo in mais_caros(erro):
+            print(f"  {microssegundos / 1000:>8.1f} ms  {modulo}")
+        if tela > ORCAMENTO_TELA_LOGIN:
+            falhas.append(f"tela de login: {tela:.3f} s > {ORCAMENTO_TELA_LOGIN} s")
+
+    if falhas:
+        print("\nOrçamento ultrapassado:\n  " + "\n  ".join(falhas))
+        sys.exit(1)
+    print("\nDentro do orçamento")
+
+if __name__ == '__main__':
+    main()
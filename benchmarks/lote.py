@@ -0,0 +1,33 @@
+"""Benchmark: registrar_movimentacao linha a linha x registrar_movimentacoes_lote
+
+Uso: python -m benchmarks.lote [linhas]
+"""
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    banco = preparar_banco_temporario()
+    
+    for i in range(500):
+        banco.adicionar_produto(f'Produto {i}', 'benchmark', 100, 10)
+    pedido = [(i % 500 + 1, 'entrada', 1, 'benchmark', 'Pedido de compra') for i in range(linhas)]
+    
+    inicio = time.perf_counter()
+    for mov in pedido:
+        banco.registrar_movimentacao(*mov)
+    por_linha = linhas / (time.perf_counter() - inicio)
+    
+    inicio = time.perf_counter()
+    resultado = banco.registrar_movimentacoes_lote(pedido)
+    em_lote = linhas / (time.perf_counter() - inicio)
+    assert resultado['sucesso'], resultado['erros'][:5]
+    
+    print(f"{linhas} linhas")
+    print(f"registrar_movimentacao (por linha) {por_linha:>12,.0f} linhas/s")
+    print(f"registrar_movimentacoes_lote       {em_lote:>12,.0f} linhas/s   {em_lote / por_linha:.1f}x")
+
+if __name__ == '__main__':
+    main()
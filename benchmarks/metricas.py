@@ -0,0 +1,52 @@
+"""Benchmark: custo da instrumentação de banco.py (ESTOQUE_METRICAS desligado x ligado)
+
+Cada modo roda em um processo novo, já que a variável é lida na importação de
+banco. Mede leituras curtas, onde o custo fixo por chamada mais aparece, e
+movimentações gravadas.
+
+Uso: python -m benchmarks.metricas [repeticoes]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import imprimir_resultado
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CARGA = '''
+import sys
+from benchmarks import preparar_banco_temporario, medir
+banco = preparar_banco_temporario()
+for i in range(200):
+    banco.adicionar_produto(f'Produto {i}', 'benchmark', 1000, 10)
+repeticoes = int(sys.argv[1])
+print(medir(lambda i: banco.obter_produto(i % 200 + 1), repeticoes))
+print(medir(lambda i: banco.obter_produtos('Produto 1', 20), repeticoes // 10))
+print(medir(lambda i: banco.registrar_movimentacao(i % 200 + 1, 'entrada', 1, 'benchmark', 'Metricas'),
+            repeticoes // 20))
+'''
+
+def executar(ligado, repeticoes):
+    """Roda a carga em um processo novo; retorna as operações por segundo de cada etapa"""
+    ambiente = dict(os.environ, ESTOQUE_METRICAS='1' if ligado else '0',
+                    ESTOQUE_DB=os.path.join(tempfile.mkdtemp(prefix='estoque_bench_'), 'x.db'),
+                    PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])))
+    ambiente.pop('ESTOQUE_METRICAS_ARQUIVO', None)
+    processo = subprocess.run([sys.executable, '-c', CARGA, str(repeticoes)], cwd=RAIZ,
+                              env=ambiente, capture_output=True, text=True)
+    assert processo.returncode == 0, processo.stderr
+    return [float(valor) for valor in processo.stdout.split()]
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    desligado = executar(False, repeticoes)
+    ligado = executar(True, repeticoes)
+    print(f"{'':<35} {'desligado':>18} {'ligado':>18}")
+    for descricao, antes, depois in zip(("obter_produto", "obter_produtos (busca)",
+                                         "registrar_movimentacao"), desligado, ligado):
+        imprimir_resultado(descricao, antes, depois)
+
+if __name__ == '__main__':
+    main()
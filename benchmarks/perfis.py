@@ -0,0 +1,24 @@
+"""Benchmark: vazão de escrita em cada perfil de armazenamento
+
+Uso: python -m benchmarks.perfis [repeticoes]
+"""
+import sys
+
+from benchmarks import preparar_banco_temporario, medir
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    banco = preparar_banco_temporario()
+    
+    for i in range(100):
+        banco.adicionar_produto(f'Produto {i}', 'benchmark', 100, 10)
+    
+    for perfil in banco.PERFIS_ARMAZENAMENTO:
+        banco.definir_perfil_armazenamento(perfil)
+        divergencias = banco.verificar_perfil_armazenamento()
+        ops = medir(lambda i: banco.registrar_movimentacao(i % 100 + 1, 'entrada', 1, 'benchmark'), repeticoes)
+        aviso = f"  (divergências: {divergencias})" if divergencias else ""
+        print(f"registrar_movimentacao [{perfil:<10}] {ops:>12,.0f} ops/s{aviso}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Verifica que as consultas principais continuam usando índices (EXPLAIN QUERY PLAN)
+
+As consultas vêm de banco.py (constantes SQL_* e funções sql_*), então o plano
+conferido é o do SQL que o programa executa, inclusive nas combinações de
+filtros da paginação do histórico.
+
+Uso: python -m benchmarks.planos
+Termina com código 1 se algum plano fizer varredura completa de tabela.
+"""
+import sys
+
+from benchmarks import preparar_banco_temporario
+
+# Filtros de obter_movimentacoes_pagina() conferidos: (descrição, argumentos, índice esperado)
+FILTROS_PAGINA = [
+    ('sem filtros', {}, 'idx_movimentacoes_data'),
+    ('período', {'data_inicio': '2025-06-01', 'data_fim': '2025-06-30'}, 'idx_movimentacoes_data'),
+    ('produto', {'produto_id': 1}, 'idx_movimentacoes_produto_data'),
+    ('produto e período', {'produto_id': 1, 'data_inicio': '2025-06-01', 'data_fim': '2025-06-30'},
+     'idx_movimentacoes_produto_data'),
+    ('tipo', {'tipo': 'saida'}, 'idx_movimentacoes_data'),
+    ('responsável', {'responsavel': 'admin'}, 'idx_movimentacoes_data'),
+    ('página seguinte', {'apos': ('2025-06-30 12:00:00', 100)}, 'idx_movimentacoes_data'),
+    ('todos os filtros', {'data_inicio': '2025-06-01', 'data_fim': '2025-06-30', 'tipo': 'saida',
+                          'responsavel': 'admin', 'apos': ('2025-06-30 12:00:00', 100)},
+     'idx_movimentacoes_data'),
+    ('todos os filtros com produto', {'produto_id': 1, 'data_inicio': '2025-06-01', 'data_fim': '2025-06-30',
+                                      'tipo': 'saida', 'responsavel': 'admin',
+                                      'apos': ('2025-06-30 12:00:00', 100)},
+     'idx_movimentacoes_produto_data'),
+]
+
+def consultas(banco):
+    """(descrição, SQL, parâmetros, trecho esperado no plano) de cada consulta conferida"""
+    lista = [
+        ('obter_movimentacoes', banco.sql_historico(), (), 'idx_movimentacoes_data'),
+        ('remover_produto (histórico)', banco.SQL_PRODUTO_COM_HISTORICO,
+         (1, banco.TIPOS_MOVIMENTACAO['ajuste'], 1), 'idx_movimentacoes_produto_data'),
+        ('obter_produto_por_nome', banco.SQL_PRODUTO_POR_NOME, ('Produto',), 'idx_produtos_nome'),
+        ('produtos_estoque_baixo', banco.SQL_PRODUTOS_ESTOQUE_BAIXO, (), 'idx_produtos_estoque_baixo'),
+        ('obter_alertas_estoque', banco.SQL_ALERTAS_ESTOQUE, (0, 10),
+         'INTEGER PRIMARY KEY (rowid>? AND rowid<?)'),
+    ]
+    for descricao, filtros, indice in FILTROS_PAGINA:
+        sql, parametros = banco.sql_pagina_movimentacoes(**filtros)
+        lista.append((f'obter_movimentacoes_pagina ({descricao})', sql, parametros, indice))
+    return lista
+
+def main():
+    banco = preparar_banco_temporario()
+    falhas = 0
+    for descricao, sql, parametros, indice in consultas(banco):
+        plano = banco.plano_consulta(sql, parametros)
+        # Uma varredura só é aceitável se percorrer o índice esperado (SCAN CONSTANT
+        # ROW é o SELECT sem FROM dos EXISTS, não uma tabela)
+        ok = any(indice in linha for linha in plano) and not any(
+            linha.startswith('SCAN') and 'INDEX' not in linha and linha != 'SCAN CONSTANT ROW'
+            for linha in plano)
+        falhas += not ok
+        print(f"[{'ok' if ok else 'FALHA'}] {descricao}: {' | '.join(plano)}")
+    return 1 if falhas else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""Benchmark: estoque em uma data passada pelos saldos diários x refazendo o histórico
+
+Uso: python -m benchmarks.saldos [movimentacoes]
+"""
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+from benchmarks.exportacao import popular_movimentacoes
+
+DATAS = ['2025-01-31', '2025-06-30', '2025-06-30 12:00:00', '2025-12-31']
+
+def estoque_refazendo_historico(banco, data):
+    """Como seria sem os saldos: quantidade atual menos tudo o que foi movimentado depois"""
+    cursor = banco.conectar().execute('''
+        SELECT p.id, p.nome, p.quantidade - COALESCE(SUM(
+            CASE m.tipo WHEN 2 THEN -m.quantidade ELSE m.quantidade END), 0)
+        FROM produtos p LEFT JOIN movimentacoes m
+            ON m.produto_id = p.id AND m.data > CAST(strftime('%s', ?) AS INTEGER)
+        GROUP BY p.id
+        ORDER BY p.id
+    ''', (data if len(data) > 10 else f'{data} 23:59:59',))
+    return cursor.fetchall()
+
+def cronometrar(funcao):
+    """Executa a função e retorna (resultado, milissegundos)"""
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    banco = preparar_banco_temporario()
+    popular_movimentacoes(banco, quantidade)
+    # As movimentações sintéticas foram gravadas direto na tabela
+    _, duracao = cronometrar(banco.reconstruir_saldos_diarios)
+    print(f"{quantidade:,} movimentações; saldos reconstruídos em {duracao / 1000:.1f}s\n")
+    
+    for data in DATAS:
+        esperado, lento = cronometrar(lambda: estoque_refazendo_historico(banco, data))
+        resultado, rapido = cronometrar(lambda: banco.estoque_em(data))
+        assert resultado == esperado, data
+        print(f"{data:<20} histórico {lento:9.1f} ms   saldos {rapido:7.1f} ms   {lento / rapido:6.0f}x")
+
+if __name__ == '__main__':
+    main()
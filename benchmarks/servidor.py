@@ -0,0 +1,107 @@
+"""Teste de carga do serviço HTTP: requisições por segundo com muitos clientes simultâneos
+
+Sobe servidor.py em outro processo, sobre um banco temporário, e abre N
+conexões keep-alive que repetem uma mistura de consultas de produto, buscas e
+registros de movimentação durante alguns segundos.
+
+Uso: python -m benchmarks.servidor [clientes] [segundos] [produtos]
+"""
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks import preparar_banco_temporario
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+async def requisitar(reader, writer, metodo, caminho, corpo=None):
+    """Envia uma requisição na conexão aberta e retorna (status, corpo)"""
+    dados = json.dumps(corpo).encode() if corpo is not None else b''
+    writer.write(
+        f'{metodo} {caminho} HTTP/1.1\r\nHost: localhost\r\n'
+        f'Content-Length: {len(dados)}\r\n\r\n'.encode() + dados
+    )
+    cabecalho = await reader.readuntil(b'\r\n\r\n')
+    linhas = cabecalho.decode('latin-1').split('\r\n')
+    status = int(linhas[0].split(' ')[1])
+    tamanho = next(int(l.split(':')[1]) for l in linhas if l.lower().startswith('content-length'))
+    return status, await reader.readexactly(tamanho)
+
+async def cliente(porta, produtos, fim, latencias, contagem, semente):
+    """Uma conexão keep-alive repetindo a mistura de operações até o fim do teste"""
+    aleatorio = random.Random(semente)
+    reader, writer = await asyncio.open_connection('127.0.0.1', porta)
+    try:
+        while time.perf_counter() < fim:
+            sorteio = aleatorio.random()
+            produto_id = aleatorio.randint(1, produtos)
+            inicio = time.perf_counter()
+            if sorteio < 0.5:
+                status, _ = await requisitar(reader, writer, 'GET', f'/produtos/{produto_id}')
+                tipo = 'consulta'
+            elif sorteio < 0.6:
+                status, _ = await requisitar(reader, writer, 'GET', f'/produtos?filtro=produto+{produto_id}&limite=10')
+                tipo = 'busca'
+            else:
+                status, _ = await requisitar(reader, writer, 'POST', '/movimentacoes', {
+                    'produto_id': produto_id, 'tipo': 'entrada', 'quantidade': 1,
+                    'responsavel': f'terminal {semente}', 'motivo': 'Leitor'
+                })
+                tipo = 'movimentacao'
+            latencias.append(time.perf_counter() - inicio)
+            assert status in (200, 201), status
+            contagem[tipo] = contagem.get(tipo, 0) + 1
+    finally:
+        writer.close()
+
+async def carga(porta, clientes, segundos, produtos):
+    latencias = []
+    contagem = {}
+    inicio = time.perf_counter()
+    fim = inicio + segundos
+    await asyncio.gather(*(cliente(porta, produtos, fim, latencias, contagem, i) for i in range(clientes)))
+    return time.perf_counter() - inicio, latencias, contagem
+
+def main():
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    produtos = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+    banco = preparar_banco_temporario()
+
+    with banco.conectar() as conn:
+        conn.executemany(
+            'INSERT INTO produtos (nome, descricao, quantidade, estoque_minimo) VALUES (?, ?, ?, ?)',
+            ((f'Produto {i}', 'benchmark', 1000, 10) for i in range(1, produtos + 1))
+        )
+    movimentacoes_antes = banco.conectar().execute('SELECT COUNT(*) FROM movimentacoes').fetchone()[0]
+
+    # O servidor roda em outro processo: o cliente não disputa o GIL com ele
+    processo = subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, 'servidor.py'), '--porta', '0'],
+        stdout=subprocess.PIPE, text=True, env=os.environ.copy()
+    )
+    try:
+        porta = int(processo.stdout.readline().rsplit(':', 1)[1])
+        duracao, latencias, contagem = asyncio.run(carga(porta, clientes, segundos, produtos))
+    finally:
+        processo.terminate()
+        processo.wait()
+
+    latencias.sort()
+    total = len(latencias)
+    registradas = banco.conectar().execute('SELECT COUNT(*) FROM movimentacoes').fetchone()[0]
+    print(f"{clientes} clientes, {duracao:.1f} s, {produtos:,} produtos")
+    print(f"Requisições                {total:>10,}   {total / duracao:>10,.0f} req/s")
+    for tipo, quantidade in sorted(contagem.items()):
+        print(f"  {tipo:<24} {quantidade:>10,}   {quantidade / duracao:>10,.0f} req/s")
+    print(f"Latência p50 / p99         {latencias[total // 2] * 1000:>7.1f} ms / "
+          f"{latencias[int(total * 0.99)] * 1000:.1f} ms")
+    print(f"Movimentações gravadas     {registradas - movimentacoes_antes:>10,}")
+    assert registradas - movimentacoes_antes == contagem.get('movimentacao', 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""Suíte de benchmarks das operações de banco.py em 10 mil, 100 mil e 1 milhão de movimentações
+
+Cada escala usa o banco sintético de benchmarks.dados (ver ESCALAS: 1 mil, 10 mil
+e 100 mil produtos), copiado para uma pasta isolada. O cache do catálogo fica
+desligado para medir o caminho até o banco (o cache tem seu próprio benchmark,
+benchmarks.cache). Cada operação é repetida até somar TEMPO_POR_OPERACAO ou
+MAXIMO_REPETICOES; o que vale para a comparação é a mediana.
+
+Os resultados podem ser gravados em JSON e comparados com uma referência
+guardada (benchmarks/referencia.json por padrão): operações cuja mediana passar
+da referência em mais que a tolerância são listadas e o código de saída é 1.
+Referências só são comparáveis na mesma máquina e configuração; o ambiente de
+cada medição vai junto no JSON.
+
+Uso:
+    python -m benchmarks.suite [--escalas 10k,100k,1m] [--saida resultados.json]
+                               [--referencia arquivo.json] [--salvar-referencia]
+                               [--tolerancia 0.25] [--origem estoque.db] [--semente N]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks import preparar_banco_temporario
+from benchmarks.busca import TERMOS
+from benchmarks.dados import ESCALAS, SEMENTE, banco_sintetico
+from benchmarks.importacao import gerar_catalogo
+
+REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'referencia.json')
+TEMPO_POR_OPERACAO = 1.0  # s
+MAXIMO_REPETICOES = 200
+TOLERANCIA = 0.25
+# Diferenças abaixo disto são ruído de medição, não regressão
+DIFERENCA_MINIMA_MS = 0.1
+
+def medir_operacao(funcao, preparar=None):
+    """Repete funcao(i) e retorna as estatísticas em ms
+
+    preparar(i), se houver, roda antes de cada repetição, fora da medição.
+    Sempre pelo menos 3 repetições, a não ser que a primeira já passe do tempo
+    reservado para a operação (históricos inteiros na escala de 1 milhão).
+    """
+    tempos = []
+    total = 0.0
+    while len(tempos) < MAXIMO_REPETICOES and (total < TEMPO_POR_OPERACAO or len(tempos) < 3):
+        if preparar is not None:
+            preparar(len(tempos))
+        inicio = time.perf_counter()
+        funcao(len(tempos))
+        duracao = time.perf_counter() - inicio
+        tempos.append(duracao)
+        total += duracao
+        if len(tempos) == 1 and duracao > TEMPO_POR_OPERACAO:
+            break
+    tempos.sort()
+    return {
+        'mediana_ms': round(statistics.median(tempos) * 1000, 4),
+        'minimo_ms': round(tempos[0] * 1000, 4),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))] * 1000, 4),
+        'repeticoes': len(tempos),
+    }
+
+def operacoes(banco, pasta, populares, produtos):
+    """Lista de (nome, funcao(i)[, preparar(i)]) na ordem de execução: leituras antes das gravações"""
+    quente = populares[0]
+    frios = populares[-50:]
+
+    def registrar(i):
+        # Entrada e saída em seguida no mesmo produto quente: o saldo não se esgota
+        produto_id = populares[i // 2 % 10]
+        assert banco.registrar_movimentacao(
+            produto_id, 'entrada' if i % 2 == 0 else 'saida', 1, 'benchmark', 'Suíte')
+
+    exportado = os.path.join(pasta, 'estoque.csv')
+    novos = os.path.join(pasta, 'novos.csv')
+    removivel = []
+
+    def preparar_importacao(i):
+        # Um arquivo por repetição, com nomes inéditos: cada uma insere produtos novos
+        gerar_catalogo(novos, max(produtos // 10, 100))
+        with open(novos, encoding='utf-8') as arquivo:
+            conteudo = arquivo.read().replace('Produto ', f'Importado {i}-')
+        with open(novos, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+
+    def importar_novos(i):
+        relatorio = banco.importar_produtos_csv(novos)
+        assert relatorio['sucesso'] and relatorio['inseridos'], relatorio
+
+    def preparar_remocao(i):
+        # Produto sem histórico, o único caso em que a remoção é aceita
+        banco.adicionar_produto(f'Removível {i}', 'benchmark', 0, 0)
+        removivel[:] = [banco.obter_produto_por_nome(f'Removível {i}')[0]]
+
+    return [
+        ('obter_produtos', lambda i: banco.obter_produtos()),
+        ('obter_produtos (filtro)', lambda i: banco.obter_produtos(TERMOS[i % len(TERMOS)])),
+        ('obter_produto', lambda i: banco.obter_produto(populares[i % len(populares)])),
+        ('produtos_estoque_baixo', lambda i: banco.produtos_estoque_baixo()),
+        ('obter_movimentacoes', lambda i: banco.obter_movimentacoes()),
+        ('obter_movimentacoes_pagina', lambda i: banco.obter_movimentacoes_pagina(200)),
+        ('obter_movimentacoes_pagina (produto quente)',
+         lambda i: banco.obter_movimentacoes_pagina(200, produto_id=quente)),
+        ('obter_movimentacoes_pagina (periodo e tipo)',
+         lambda i: banco.obter_movimentacoes_pagina(200, data_inicio='2025-06-01',
+                                                    data_fim='2025-06-30', tipo='saida')),
+        ('estoque_em', lambda i: banco.estoque_em('2025-06-30', frios[i % len(frios)])),
+        ('exportar_estoque_csv', lambda i: banco.exportar_estoque_csv(exportado)),
+        ('exportar_movimentacoes_csv',
+         lambda i: banco.exportar_movimentacoes_csv(os.path.join(pasta, 'movimentacoes.csv'))),
+        ('importar_produtos_csv (sem alteracoes)',
+         lambda i: banco.importar_produtos_csv(exportado, modo='diferencas')),
+        ('importar_produtos_csv (novos)', importar_novos, preparar_importacao),
+        ('registrar_movimentacao', registrar),
+        ('remover_produto', lambda i: banco.remover_produto(removivel[0]), preparar_remocao),
+        ('remover_produto (com historico)', lambda i: banco.remover_produto(frios[i % len(frios)])),
+    ]
+
+def executar_escala(banco, escala, semente, origem):
+    """Mede todas as operações em uma escala; retorna o bloco de resultados dela"""
+    pasta = tempfile.mkdtemp(prefix=f'estoque_suite_{escala}_')
+    dados = banco_sintetico(banco, escala, os.path.join(pasta, 'estoque.db'), semente, origem)
+    produtos, movimentacoes = ESCALAS[escala]
+    banco.definir_cache_produtos(False)
+    resultados = {}
+    for nome, *funcoes in operacoes(banco, pasta, dados['populares'], produtos):
+        resultados[nome] = medir_operacao(*funcoes)
+        print(f"  {nome:<45} {resultados[nome]['mediana_ms']:>11.3f} ms "
+              f"(mín. {resultados[nome]['minimo_ms']:.3f}, {resultados[nome]['repeticoes']} rep.)")
+    banco.definir_cache_produtos(True)
+    banco.definir_caminho_banco(os.path.join(pasta, 'vazio.db'))
+    return {
+        'produtos': produtos,
+        'movimentacoes': movimentacoes,
+        'geracao_s': round(dados['geracao_s'], 3),
+        'operacoes': resultados,
+    }
+
+def ambiente():
+    return {
+        'data': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+def comparar(resultados, referencia, tolerancia):
+    """Imprime a comparação com a referência; retorna a lista de regressões"""
+    regressoes = []
+    if referencia['ambiente'].get('plataforma') != resultados['ambiente']['plataforma']:
+        print("Aviso: referência medida em outro ambiente "
+              f"({referencia['ambiente'].get('plataforma')})")
+    print(f"\n{'escala':<6} {'operação':<45} {'referência':>12} {'atual':>12} {'razão':>7}")
+    for escala, bloco in resultados['escalas'].items():
+        anterior = referencia['escalas'].get(escala)
+        if anterior is None:
+            continue
+        for nome, medida in bloco['operacoes'].items():
+            if nome not in anterior['operacoes']:
+                continue
+            antes = anterior['operacoes'][nome]['mediana_ms']
+            depois = medida['mediana_ms']
+            razao = depois / antes if antes else float('inf')
+            regressao = (depois > antes * (1 + tolerancia)
+                         and depois - antes > DIFERENCA_MINIMA_MS)
+            marca = '  <-- regressão' if regressao else ''
+            print(f"{escala:<6} {nome:<45} {antes:>9.3f} ms {depois:>9.3f} ms {razao:>6.2f}x{marca}")
+            if regressao:
+                regressoes.append((escala, nome, antes, depois))
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de benchmarks de banco.py")
+    parser.add_argument('--escalas', default=','.join(ESCALAS),
+                        help=f"escalas separadas por vírgula ({', '.join(ESCALAS)})")
+    parser.add_argument('--saida', help="arquivo JSON para gravar os resultados")
+    parser.add_argument('--referencia', default=REFERENCIA, help="resultados de referência para comparar")
+    parser.add_argument('--salvar-referencia', action='store_true',
+                        help="grava os resultados como a nova referência em vez de comparar")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                        help="aumento relativo da mediana tolerado (padrão: 0.25)")
+    parser.add_argument('--origem', help="banco a copiar antes dos dados sintéticos (ex.: estoque.db)")
+    parser.add_argument('--semente', type=int, default=SEMENTE)
+    args = parser.parse_args()
+
+    escalas = [escala.strip().lower() for escala in args.escalas.split(',') if escala.strip()]
+    desconhecidas = [escala for escala in escalas if escala not in ESCALAS]
+    if desconhecidas:
+        parser.error(f"escala desconhecida: {', '.join(desconhecidas)}")
+
+    banco = preparar_banco_temporario()
+    resultados = {'ambiente': ambiente(), 'semente': args.semente, 'escalas': {}}
+    for escala in escalas:
+        produtos, movimentacoes = ESCALAS[escala]
+        print(f"Escala {escala}: {produtos:,} produtos, {movimentacoes:,} movimentações")
+        resultados['escalas'][escala] = executar_escala(banco, escala, args.semente, args.origem)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.saida}")
+
+    if args.salvar_referencia:
+        with open(args.referencia, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+        print(f"Referência gravada em {args.referencia}")
+        return
+    if not os.path.exists(args.referencia):
+        print("\nSem referência para comparar (use --salvar-referencia)")
+        return
+    with open(args.referencia, encoding='utf-8') as arquivo:
+        referencia = json.load(arquivo)
+    regressoes = comparar(resultados, referencia, args.tolerancia)
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}")
+        sys.exit(1)
+    print(f"\nNenhuma regressão acima de {args.tolerancia:.0%}")
+
+if __name__ == '__main__':
+    main()
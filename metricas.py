@@ -0,0 +1,251 @@
+"""Instrumentação de banco.py: chamadas e latência por função e log de consultas lentas
+
+Ativada por ESTOQUE_METRICAS=1; desligada, banco.py nem importa este módulo e
+suas funções ficam intactas. Ligada, cada função pública de banco registra
+chamadas, erros e tempo em um histograma logarítmico (de onde saem p50, p95 e
+p99). Chamadas mais lentas que ESTOQUE_CONSULTA_LENTA_MS (padrão 100) entram no
+log de consultas lentas com os comandos SQL executados, capturados pelo trace
+callback do sqlite3 (texto, parâmetros, execuções e tempo), as linhas retornadas
+e a espera pelo lock de escrita (tempo gasto em BEGIN IMMEDIATE).
+ESTOQUE_METRICAS_ARQUIVO grava o JSON das métricas ao encerrar o processo.
+"""
+import atexit
+import functools
+import inspect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+LIMITE_LENTA = float(os.environ.get('ESTOQUE_CONSULTA_LENTA_MS', '100')) / 1000  # s
+ARQUIVO_METRICAS = os.environ.get('ESTOQUE_METRICAS_ARQUIVO')
+TAMANHO_LOG_LENTAS = 500
+COMANDOS_POR_CHAMADA = 50  # comandos guardados por entrada do log (os demais só são contados)
+
+# Funções de infraestrutura chamadas por todas as outras: não são medidas
+NAO_INSTRUMENTADAS = {'conectar', 'fechar_conexao', 'fechar_conexoes'}
+
+# Histograma: 4 faixas por potência de 2 (~19% de largura cada), a partir de 1 µs
+FAIXAS_POR_OITAVA = 4
+
+_trava = threading.Lock()
+_funcoes = {}
+_lentas = deque(maxlen=TAMANHO_LOG_LENTAS)
+_inicio = datetime.now()
+# Chamada externa em andamento na thread (as internas só contam nas estatísticas)
+# e o execute em andamento (quantos parâmetros recebeu)
+_local = threading.local()
+
+def _faixa(segundos):
+    return max(0, int(math.log2(max(segundos, 1e-6) * 1e6) * FAIXAS_POR_OITAVA))
+
+def _limite_faixa(indice):
+    """Limite superior da faixa, em segundos"""
+    return 2 ** ((indice + 1) / FAIXAS_POR_OITAVA) / 1e6
+
+def _percentil(faixas, chamadas, fracao):
+    alvo = fracao * chamadas
+    acumulado = 0
+    for indice in sorted(faixas):
+        acumulado += faixas[indice]
+        if acumulado >= alvo:
+            return _limite_faixa(indice)
+    return 0.0
+
+def _registrar(nome, duracao, erro):
+    with _trava:
+        estatisticas = _funcoes.get(nome)
+        if estatisticas is None:
+            estatisticas = _funcoes[nome] = {
+                'chamadas': 0, 'erros': 0, 'total': 0.0, 'maximo': 0.0, 'faixas': {}
+            }
+        estatisticas['chamadas'] += 1
+        estatisticas['erros'] += erro
+        estatisticas['total'] += duracao
+        estatisticas['maximo'] = max(estatisticas['maximo'], duracao)
+        faixa = _faixa(duracao)
+        estatisticas['faixas'][faixa] = estatisticas['faixas'].get(faixa, 0) + 1
+
+def _linhas(resultado):
+    """Linhas devolvidas por uma função de banco, quando dá para saber"""
+    if resultado is None:
+        return 0
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, tuple):
+        return 1
+    if isinstance(resultado, dict) and 'registradas' in resultado:
+        return resultado['registradas']
+    return None
+
+def _fechar_comando(chamada, agora):
+    """Encerra a medição do comando em andamento na chamada
+
+    O trace callback só avisa o início de cada comando: a duração vai até o início
+    do seguinte (ou o fim da chamada) e inclui a leitura das linhas de um SELECT.
+    """
+    comando = chamada['atual']
+    if comando is None:
+        return
+    chamada['atual'] = None
+    duracao = agora - comando.pop('inicio')
+    execucao = comando.pop('execucao')
+    if execucao is not None and execucao['lote']:
+        comando['execucoes'] = execucao['linhas']
+    comando['duracao_ms'] = round(duracao * 1000, 3)
+    if comando['sql'].startswith(('BEGIN IMMEDIATE', 'BEGIN EXCLUSIVE')):
+        chamada['espera_lock'] += duracao
+
+def _ao_executar(sql):
+    """Trace callback: marca o início de cada comando executado durante uma chamada medida"""
+    chamada = getattr(_local, 'chamada', None)
+    if chamada is None:
+        return
+    agora = time.perf_counter()
+    execucao = getattr(_local, 'execucao', None)
+    controle = sql.lstrip()[:9].upper().startswith(('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE'))
+    atual = chamada['atual']
+    # O sqlite3 repete o comando a cada passo de trigger, e o executemany a cada
+    # linha (com outros valores): continuam o comando em andamento
+    if (execucao is not None and atual is not None and atual['execucao'] is execucao
+            and (sql == atual['sql'] or (execucao['lote'] and not controle))):
+        return
+    _fechar_comando(chamada, agora)
+    comando = {
+        'sql': sql,
+        'parametros': None if controle or execucao is None else execucao['parametros'],
+        'execucoes': 1,
+        'inicio': agora,
+        'execucao': execucao,
+    }
+    chamada['atual'] = comando
+    if len(chamada['comandos']) < COMANDOS_POR_CHAMADA:
+        chamada['comandos'].append(comando)
+    else:
+        chamada['omitidos'] += 1
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que informa ao trace callback quantos parâmetros cada comando recebeu"""
+    def execute(self, sql, parametros=()):
+        _local.execucao = {'parametros': len(parametros), 'lote': False}
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            _local.execucao = None
+
+    def executemany(self, sql, sequencia):
+        execucao = {'parametros': None, 'lote': True, 'linhas': 0}
+
+        def contar():
+            for linha in sequencia:
+                execucao['parametros'] = len(linha)
+                execucao['linhas'] += 1
+                yield linha
+
+        _local.execucao = execucao
+        try:
+            return super().executemany(sql, contar())
+        finally:
+            _local.execucao = None
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    """Conexão cujos atalhos execute/executemany passam pelo CursorInstrumentado"""
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+def rastrear_conexao(conn):
+    """Liga o trace callback em uma conexão recém-aberta por banco.conectar"""
+    conn.set_trace_callback(_ao_executar)
+
+def _instrumentar_funcao(nome, funcao):
+    @functools.wraps(funcao)
+    def instrumentada(*args, **kwargs):
+        externa = getattr(_local, 'chamada', None) is None
+        if externa:
+            _local.chamada = {'comandos': [], 'omitidos': 0, 'atual': None, 'espera_lock': 0.0}
+        resultado = None
+        erro = True
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(*args, **kwargs)
+            erro = False
+            return resultado
+        finally:
+            fim = time.perf_counter()
+            duracao = fim - inicio
+            _registrar(nome, duracao, erro)
+            if externa:
+                chamada = _local.chamada
+                _local.chamada = None
+                _fechar_comando(chamada, fim)
+                if duracao >= LIMITE_LENTA:
+                    for comando in chamada['comandos']:
+                        comando['sql'] = ' '.join(comando['sql'].split())[:500]
+                    _lentas.append({
+                        'data': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'funcao': nome,
+                        'duracao_ms': round(duracao * 1000, 3),
+                        'erro': erro,
+                        'linhas': None if erro else _linhas(resultado),
+                        'espera_lock_ms': round(chamada['espera_lock'] * 1000, 3),
+                        'comandos': chamada['comandos'],
+                        'comandos_omitidos': chamada['omitidos'],
+                    })
+    return instrumentada
+
+def instrumentar(modulo):
+    """Substitui as funções públicas do módulo (dicionário de globals) por versões medidas"""
+    nome_modulo = modulo['__name__']
+    for nome, valor in list(modulo.items()):
+        if (inspect.isfunction(valor) and valor.__module__ == nome_modulo
+                and not nome.startswith('_') and nome not in NAO_INSTRUMENTADAS):
+            modulo[nome] = _instrumentar_funcao(nome, valor)
+
+def obter_metricas():
+    """Estatísticas por função (ms) e log de consultas lentas, prontos para JSON"""
+    with _trava:
+        funcoes = {}
+        for nome, e in _funcoes.items():
+            funcoes[nome] = {
+                'chamadas': e['chamadas'],
+                'erros': e['erros'],
+                'total_ms': round(e['total'] * 1000, 3),
+                'media_ms': round(e['total'] / e['chamadas'] * 1000, 3),
+                'p50_ms': round(_percentil(e['faixas'], e['chamadas'], 0.50) * 1000, 3),
+                'p95_ms': round(_percentil(e['faixas'], e['chamadas'], 0.95) * 1000, 3),
+                'p99_ms': round(_percentil(e['faixas'], e['chamadas'], 0.99) * 1000, 3),
+                'maximo_ms': round(e['maximo'] * 1000, 3),
+            }
+        lentas = list(_lentas)
+    return {
+        'desde': _inicio.strftime('%Y-%m-%d %H:%M:%S'),
+        'limite_lenta_ms': LIMITE_LENTA * 1000,
+        'funcoes': dict(sorted(funcoes.items(), key=lambda item: -item[1]['total_ms'])),
+        'lentas': lentas,
+    }
+
+def salvar_metricas(caminho):
+    """Grava obter_metricas() em um arquivo JSON"""
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(obter_metricas(), arquivo, ensure_ascii=False, indent=2)
+
+def zerar_metricas():
+    """Descarta as estatísticas e o log acumulados"""
+    global _inicio
+    with _trava:
+        _funcoes.clear()
+        _lentas.clear()
+        _inicio = datetime.now()
+
+if ARQUIVO_METRICAS:
+    atexit.register(salvar_metricas, ARQUIVO_METRICAS)
@@ -0,0 +1,387 @@
+"""Serviço HTTP/JSON sobre banco.py, para terminais sem interface (leitores, ERP)
+
+Uso: python servidor.py [--host 127.0.0.1] [--porta 8080]
+
+Rotas:
+    GET  /produtos?filtro=&limite=      todos os produtos, ou os mais relevantes para o filtro
+    GET  /produtos/<id>                 um produto
+    POST /produtos                      {"nome", "descricao", "quantidade", "estoque_minimo"}
+    GET  /estoque-baixo                 produtos abaixo do estoque mínimo
+    GET  /movimentacoes                 uma página do histórico (limite, apos_data, apos_id,
+                                        data_inicio, data_fim, tipo, produto_id, responsavel)
+    POST /movimentacoes                 {"produto_id", "tipo", "quantidade", "responsavel", "motivo"}
+    POST /movimentacoes/lote            {"movimentacoes": [...]}, tudo ou nada
+    GET  /reservas?produto_id=          reservas em aberto
+    POST /reservas                      {"produto_id", "quantidade", "responsavel"}
+    POST /reservas/<id>/confirmar       {"motivo"} (opcional): a reserva vira saída
+    DELETE /reservas/<id>               libera a reserva
+    GET  /metricas                      métricas de banco.py (com ESTOQUE_METRICAS=1)
+
+As leituras rodam em um grupo de threads, cada uma com sua conexão; as demais
+gravações passam por uma única thread. Movimentações que chegam ao mesmo tempo
+de clientes diferentes são gravadas juntas, em um só commit, pelo
+banco.GravadorMovimentacoes, e cada requisição recebe o resultado da sua linha.
+As conexões são mantidas abertas (keep-alive).
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+import banco
+
+# Espera para juntar movimentações no mesmo commit e tamanho máximo de cada grupo
+INTERVALO_GRUPO = 0.002  # s
+TAMANHO_GRUPO = 1000
+
+LEITORES = 4
+TEMPO_OCIOSO = 30  # s até fechar uma conexão sem requisições
+TAMANHO_MAXIMO_CORPO = 16 * 1024 * 1024
+LIMITE_PAGINA = 1000
+
+MOTIVOS_STATUS = {
+    200: 'OK', 201: 'Created', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+    422: 'Unprocessable Entity', 431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error', 501: 'Not Implemented',
+}
+
+class ErroHTTP(Exception):
+    """Erro que vira uma resposta {"erro": mensagem} com o status informado"""
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+def _produto(linha):
+    """Linha de produto do banco como objeto JSON"""
+    produto_id, nome, descricao, quantidade, estoque_minimo = linha[:5]
+    return {'id': produto_id, 'nome': nome, 'descricao': descricao,
+            'quantidade': quantidade, 'estoque_minimo': estoque_minimo}
+
+def _movimentacao(linha):
+    """Linha de obter_movimentacoes_pagina como objeto JSON"""
+    movimentacao_id, data, tipo, produto, quantidade, responsavel, motivo = linha
+    return {'id': movimentacao_id, 'data': data, 'tipo': tipo, 'produto': produto,
+            'quantidade': quantidade, 'responsavel': responsavel, 'motivo': motivo}
+
+def _reserva(linha):
+    """Linha de obter_reservas como objeto JSON"""
+    reserva_id, produto_id, produto, quantidade, responsavel, data = linha
+    return {'id': reserva_id, 'produto_id': produto_id, 'produto': produto,
+            'quantidade': quantidade, 'responsavel': responsavel, 'data': data}
+
+def _para_tupla(movimentacao):
+    """Objeto JSON de movimentação no formato de registrar_movimentacoes_lote"""
+    if not isinstance(movimentacao, dict):
+        raise ErroHTTP(400, "Cada movimentação deve ser um objeto")
+    return (movimentacao.get('produto_id'), movimentacao.get('tipo'), movimentacao.get('quantidade'),
+            movimentacao.get('responsavel'), movimentacao.get('motivo'))
+
+def _inteiro(consulta, nome, padrao=None):
+    """Parâmetro inteiro da query string"""
+    valor = consulta.get(nome)
+    if valor is None or valor == '':
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        raise ErroHTTP(400, f"Parâmetro {nome} deve ser inteiro")
+
+def _data(consulta, nome, com_hora=False):
+    """Parâmetro de data da query string: 'AAAA-MM-DD' ou, com_hora, 'AAAA-MM-DD HH:MM:SS'"""
+    valor = consulta.get(nome)
+    if not valor:
+        return None
+    try:
+        datetime.strptime(valor, '%Y-%m-%d %H:%M:%S' if com_hora else '%Y-%m-%d')
+    except ValueError:
+        formato = 'AAAA-MM-DD HH:MM:SS' if com_hora else 'AAAA-MM-DD'
+        raise ErroHTTP(400, f"Parâmetro {nome} deve estar no formato {formato}")
+    return valor
+
+def _codificar(dados):
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class ServicoEstoque:
+    """Atende as conexões HTTP e encaminha cada rota para banco.py"""
+    def __init__(self, leitores=LEITORES):
+        self.leitura = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix='servico-leitura')
+        self.escrita = ThreadPoolExecutor(max_workers=1, thread_name_prefix='servico-escrita')
+        self.movimentacoes = banco.GravadorMovimentacoes(intervalo=INTERVALO_GRUPO, maximo=TAMANHO_GRUPO)
+
+    async def ler(self, funcao, *args, **kwargs):
+        """Executa uma consulta no grupo de leitura"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.leitura, partial(funcao, *args, **kwargs))
+
+    async def gravar(self, funcao, *args, **kwargs):
+        """Executa uma gravação na thread de escrita, depois das já enviadas"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.escrita, partial(funcao, *args, **kwargs))
+
+    async def registrar_no_grupo(self, movimentacao):
+        """Entrega a movimentação ao gravador em grupo e espera o resultado da linha"""
+        return await asyncio.wrap_future(self.movimentacoes.registrar(*movimentacao, esperar=False))
+
+    def encerrar(self):
+        self.leitura.shutdown(wait=False, cancel_futures=True)
+        self.escrita.shutdown(wait=True)
+        self.movimentacoes.encerrar()
+
+    async def atender(self, reader, writer):
+        """Processa as requisições de uma conexão, em ordem, até o cliente fechar"""
+        try:
+            while True:
+                try:
+                    requisicao = await self._ler_requisicao(reader)
+                except ErroHTTP as e:
+                    await self._responder(writer, e.status, {'erro': str(e)}, manter=False)
+                    break
+                if requisicao is None:
+                    break
+                metodo, caminho, consulta, corpo, manter = requisicao
+                try:
+                    status, dados = await self.rotear(metodo, caminho, consulta, corpo)
+                except ErroHTTP as e:
+                    status, dados = e.status, {'erro': str(e)}
+                except Exception as e:
+                    print(f"Erro ao atender {metodo} {caminho}: {e}")
+                    status, dados = 500, {'erro': "Erro interno"}
+                await self._responder(writer, status, dados, manter)
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _ler_requisicao(self, reader):
+        """Lê uma requisição HTTP/1.x; retorna None se o cliente fechou ou ficou ocioso"""
+        try:
+            cabecalho = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), TEMPO_OCIOSO)
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise ErroHTTP(400, "Requisição incompleta")
+            return None
+        except asyncio.LimitOverrunError:
+            raise ErroHTTP(431, "Cabeçalho muito grande")
+        except asyncio.TimeoutError:
+            return None
+
+        linhas = cabecalho.decode('latin-1').split('\r\n')
+        try:
+            metodo, alvo, versao = linhas[0].split(' ')
+        except ValueError:
+            raise ErroHTTP(400, "Linha de requisição inválida")
+        cabecalhos = {}
+        for linha in linhas[1:]:
+            nome, _, valor = linha.partition(':')
+            if nome:
+                cabecalhos[nome.strip().lower()] = valor.strip()
+
+        if 'transfer-encoding' in cabecalhos:
+            raise ErroHTTP(501, "Use Content-Length no lugar de Transfer-Encoding")
+        try:
+            tamanho = int(cabecalhos.get('content-length', 0))
+        except ValueError:
+            raise ErroHTTP(400, "Content-Length inválido")
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            raise ErroHTTP(413, "Corpo da requisição muito grande")
+        corpo = await reader.readexactly(tamanho) if tamanho else b''
+
+        # HTTP/1.1 mantém a conexão por padrão; HTTP/1.0 só se pedido
+        conexao = cabecalhos.get('connection', '').lower()
+        manter = conexao == 'keep-alive' or (versao == 'HTTP/1.1' and conexao != 'close')
+
+        partes = urlsplit(alvo)
+        consulta = dict(parse_qsl(partes.query))
+        return metodo.upper(), unquote(partes.path).rstrip('/') or '/', consulta, corpo, manter
+
+    async def _responder(self, writer, status, dados, manter):
+        corpo = dados if isinstance(dados, bytes) else _codificar(dados)
+        writer.write(
+            f'HTTP/1.1 {status} {MOTIVOS_STATUS[status]}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(corpo)}\r\n'
+            f'Connection: {"keep-alive" if manter else "close"}\r\n\r\n'.encode('latin-1') + corpo
+        )
+        await writer.drain()
+
+    async def rotear(self, metodo, caminho, consulta, corpo):
+        """Executa a rota pedida; retorna (status, dados)"""
+        partes = caminho.strip('/').split('/')
+        if partes[0] == 'produtos' and len(partes) <= 2:
+            if len(partes) == 2:
+                self._exigir_metodo(metodo, 'GET')
+                return await self.obter_produto(partes[1])
+            if metodo == 'POST':
+                return await self.adicionar_produto(self._json(corpo))
+            self._exigir_metodo(metodo, 'GET')
+            return await self.listar_produtos(consulta)
+        if caminho == '/estoque-baixo':
+            self._exigir_metodo(metodo, 'GET')
+            # Serializa na thread de leitura para não travar o laço de eventos
+            return 200, await self.ler(lambda: _codificar(
+                [_produto(p) for p in banco.produtos_estoque_baixo()]))
+        if caminho == '/movimentacoes':
+            if metodo == 'POST':
+                return await self.registrar_movimentacao(self._json(corpo))
+            self._exigir_metodo(metodo, 'GET')
+            return await self.listar_movimentacoes(consulta)
+        if caminho == '/movimentacoes/lote':
+            self._exigir_metodo(metodo, 'POST')
+            return await self.registrar_lote(self._json(corpo))
+        if partes[0] == 'reservas':
+            return await self.rotear_reservas(metodo, partes[1:], consulta, corpo)
+        if caminho == '/metricas':
+            self._exigir_metodo(metodo, 'GET')
+            if not banco.METRICAS:
+                raise ErroHTTP(404, "Métricas desligadas (defina ESTOQUE_METRICAS=1)")
+            return 200, _codificar(banco.metricas.obter_metricas())
+        raise ErroHTTP(404, "Rota não encontrada")
+
+    @staticmethod
+    def _exigir_metodo(metodo, esperado):
+        if metodo != esperado:
+            raise ErroHTTP(405, f"Use {esperado}")
+
+    @staticmethod
+    def _json(corpo):
+        try:
+            return json.loads(corpo)
+        except ValueError:
+            raise ErroHTTP(400, "Corpo deve ser JSON")
+
+    async def listar_produtos(self, consulta):
+        filtro = consulta.get('filtro') or None
+        limite = min(_inteiro(consulta, 'limite', banco.LIMITE_BUSCA), LIMITE_PAGINA)
+        return 200, await self.ler(lambda: _codificar(
+            [_produto(p) for p in banco.obter_produtos(filtro, limite)]))
+
+    async def obter_produto(self, texto_id):
+        if not texto_id.isdigit():
+            raise ErroHTTP(400, "Id do produto deve ser inteiro")
+        produto = await self.ler(banco.obter_produto, int(texto_id))
+        if produto is None:
+            raise ErroHTTP(404, "Produto não encontrado")
+        return 200, _produto(produto)
+
+    async def adicionar_produto(self, dados):
+        if not isinstance(dados, dict) or not dados.get('nome'):
+            raise ErroHTTP(400, "Informe o nome do produto")
+        try:
+            quantidade = int(dados.get('quantidade', 0))
+            estoque_minimo = int(dados.get('estoque_minimo', 0))
+        except (TypeError, ValueError):
+            raise ErroHTTP(400, "Quantidades devem ser inteiras")
+        if quantidade < 0 or estoque_minimo < 0:
+            raise ErroHTTP(422, "Quantidades não podem ser negativas")
+
+        def cadastrar():
+            if not banco.adicionar_produto(dados['nome'], dados.get('descricao', ''),
+                                           quantidade, estoque_minimo):
+                return None
+            return banco.obter_produto_por_nome(dados['nome'])
+
+        produto = await self.gravar(cadastrar)
+        if produto is None:
+            raise ErroHTTP(409, "Já existe um produto com este nome")
+        return 201, _produto(produto)
+
+    async def listar_movimentacoes(self, consulta):
+        limite = min(_inteiro(consulta, 'limite', 200), LIMITE_PAGINA)
+        apos = None
+        if consulta.get('apos_data'):
+            apos = (_data(consulta, 'apos_data', com_hora=True), _inteiro(consulta, 'apos_id', 0))
+        filtros = {
+            'data_inicio': _data(consulta, 'data_inicio'),
+            'data_fim': _data(consulta, 'data_fim'),
+            'tipo': consulta.get('tipo') or None,
+            'produto_id': _inteiro(consulta, 'produto_id'),
+            'responsavel': consulta.get('responsavel') or None,
+        }
+        return 200, await self.ler(lambda: _codificar(
+            [_movimentacao(m) for m in banco.obter_movimentacoes_pagina(limite, apos, **filtros)]))
+
+    async def registrar_movimentacao(self, dados):
+        erro = await self.registrar_no_grupo(_para_tupla(dados))
+        if erro is not None:
+            raise ErroHTTP(422, erro)
+        return 201, {'registrada': True}
+
+    async def registrar_lote(self, dados):
+        if not isinstance(dados, dict) or not isinstance(dados.get('movimentacoes'), list):
+            raise ErroHTTP(400, 'Informe {"movimentacoes": [...]}')
+        linhas = [_para_tupla(m) for m in dados['movimentacoes']]
+        resultado = await self.gravar(banco.registrar_movimentacoes_lote, linhas)
+        if not resultado['sucesso']:
+            return 422, {'registradas': 0,
+                         'erros': [{'linha': n, 'erro': msg} for n, msg in resultado['erros']]}
+        return 201, {'registradas': resultado['registradas']}
+
+    async def rotear_reservas(self, metodo, partes, consulta, corpo):
+        """Reservas para separação em etapas: reservar, depois confirmar ou liberar"""
+        if not partes:
+            if metodo == 'POST':
+                return await self.reservar(self._json(corpo))
+            self._exigir_metodo(metodo, 'GET')
+            produto_id = _inteiro(consulta, 'produto_id')
+            return 200, [_reserva(r) for r in await self.ler(banco.obter_reservas, produto_id)]
+        if not partes[0].isdigit() or len(partes) > 2:
+            raise ErroHTTP(404, "Rota não encontrada")
+        reserva_id = int(partes[0])
+        if len(partes) == 2 and partes[1] == 'confirmar':
+            self._exigir_metodo(metodo, 'POST')
+            dados = self._json(corpo) if corpo else {}
+            motivo = dados.get('motivo') if isinstance(dados, dict) else None
+            encontrada = await self.gravar(banco.confirmar_reserva, reserva_id, motivo)
+            if encontrada is False:
+                raise ErroHTTP(409, "Estoque insuficiente para confirmar a reserva")
+        elif len(partes) == 1:
+            self._exigir_metodo(metodo, 'DELETE')
+            encontrada = await self.gravar(banco.liberar_reserva, reserva_id)
+        else:
+            raise ErroHTTP(404, "Rota não encontrada")
+        if not encontrada:
+            raise ErroHTTP(404, "Reserva não encontrada")
+        return 204, b''
+
+    async def reservar(self, dados):
+        if not isinstance(dados, dict) or not dados.get('responsavel'):
+            raise ErroHTTP(400, "Informe produto_id, quantidade e responsavel")
+        try:
+            produto_id = int(dados.get('produto_id'))
+            quantidade = int(dados.get('quantidade'))
+        except (TypeError, ValueError):
+            raise ErroHTTP(400, "produto_id e quantidade devem ser inteiros")
+        if quantidade <= 0:
+            raise ErroHTTP(422, "Quantidade deve ser positiva")
+        reserva_id = await self.gravar(banco.reservar_estoque, produto_id, quantidade, dados['responsavel'])
+        if reserva_id is None:
+            raise ErroHTTP(409, "Produto não encontrado ou estoque livre insuficiente")
+        return 201, {'id': reserva_id}
+
+async def servir(host='127.0.0.1', porta=8080):
+    """Atende até ser interrompido; porta 0 escolhe uma porta livre"""
+    servico = ServicoEstoque()
+    servidor = await asyncio.start_server(servico.atender, host, porta, backlog=1024)
+    porta = servidor.sockets[0].getsockname()[1]
+    print(f"Servindo em http://{host}:{porta}", flush=True)
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servico.encerrar()
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argumentos.add_argument('--host', default='127.0.0.1')
+    argumentos.add_argument('--porta', type=int, default=8080)
+    opcoes = argumentos.parse_args()
+    try:
+        asyncio.run(servir(opcoes.host, opcoes.porta))
+    except KeyboardInterrupt:
+        pass
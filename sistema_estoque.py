@@ -1,17 +1,160 @@
 import customtkinter as ctk
-from tkinter import ttk, filedialog, messagebox, Event
+from tkinter import messagebox
 from datetime import datetime
+import threading
 from banco import (
-    validar_login, cadastrar_usuario, adicionar_produto, 
-    obter_produtos, registrar_movimentacao, obter_movimentacoes,
-    produtos_estoque_baixo, exportar_estoque_csv, 
-    importar_produtos_csv, remover_produto, atualizar_quantidade_produto
+    validar_login, adicionar_produto, 
+    obter_produtos, obter_produto, obter_produto_por_nome, registrar_movimentacao, registrar_movimentacoes_lote,
+    obter_movimentacoes_pagina,
+    produtos_estoque_baixo, ultimo_alerta_estoque, obter_alertas_estoque, exportar_estoque_csv, exportar_movimentacoes_csv,
+    importar_produtos_csv, remover_produto, atualizar_quantidade_produto,
+    versao_produtos, obter_alteracoes_produtos
 )
+from tarefas import ExecutorBanco
+
+# ttk, filedialog e analise são importados nas telas que os usam: a tela de
+# login não depende deles e aparece mais cedo nos terminais mais lentos
 
 # Configuração de tema
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("green")
 
+def data_para_banco(texto):
+    """Converte uma data dd/mm/aaaa digitada na tela para AAAA-MM-DD (None se vazia)
+
+    Levanta ValueError se o formato for inválido.
+    """
+    texto = texto.strip()
+    if not texto:
+        return None
+    return datetime.strptime(texto, "%d/%m/%Y").strftime("%Y-%m-%d")
+
+def rotulo_produto(prod):
+    """Texto exibido nas caixas de produto: "id - nome" (o id desfaz nomes parecidos)"""
+    return f"{prod[0]} - {prod[1]}"
+
+def resolver_produto(selecao):
+    """Confirma no banco o produto de SeletorProduto.selecao() (fora da thread do Tk)
+
+    Retorna o id, ou None se o texto não corresponder a um produto existente.
+    """
+    rotulo, produto_id = selecao
+    if produto_id is None:
+        # Digitado sem escolher da lista: aceita o nome exato
+        produto = obter_produto_por_nome(rotulo)
+        return produto[0] if produto else None
+    # Confirma que o produto ainda existe (pode ter sido removido em outro terminal)
+    return produto_id if obter_produto(produto_id) else None
+
+def gravar_no_produto(selecao, funcao, *args, **kwargs):
+    """Confirma o produto selecionado e grava nele, na mesma tarefa do executor
+
+    Retorna None se o produto não existir; senão, o resultado de funcao(id, *args).
+    """
+    produto_id = resolver_produto(selecao)
+    if produto_id is None:
+        return None
+    return funcao(produto_id, *args, **kwargs)
+
+def registrar_lote_por_nome(movimentacoes):
+    """registrar_movimentacoes_lote aceitando o nome do produto no lugar do id
+
+    Cada nome distinto é procurado uma vez; nomes não encontrados seguem como
+    estão e são apontados como erro pela validação do lote.
+    """
+    ids_por_nome = {}
+    convertidas = []
+    for produto, *resto in movimentacoes:
+        if isinstance(produto, str) and not produto.isdigit():
+            if produto not in ids_por_nome:
+                encontrado = obter_produto_por_nome(produto)
+                ids_por_nome[produto] = encontrado[0] if encontrado else produto
+            produto = ids_por_nome[produto]
+        elif isinstance(produto, str):
+            produto = int(produto)
+        convertidas.append((produto, *resto))
+    return registrar_movimentacoes_lote(convertidas)
+
+def ler_estoque(completo, desde_versao, filtro):
+    """Lê o que a consulta de estoque precisa: (versao, produtos, removidos)
+
+    completo: todos os produtos (ou os do filtro), sem removidos; senão, só o que
+    mudou desde desde_versao.
+    """
+    if completo:
+        # A versão é lida antes: o que mudar durante a leitura vem na próxima
+        versao = versao_produtos()
+        return versao, obter_produtos(filtro), None
+    return obter_alteracoes_produtos(desde_versao)
+
+class SeletorProduto(ctk.CTkComboBox):
+    """Caixa de produto com autocompletar: consulta o banco enquanto o usuário digita
+
+    A lista guarda só os `limite` produtos mais relevantes para o texto digitado,
+    então abrir a tela não depende do tamanho do catálogo; as buscas rodam no
+    executor. Seta para baixo abre a lista; selecao() devolve o que foi escolhido,
+    para ser confirmado com resolver_produto.
+    """
+    def __init__(self, master, executor, limite=20, opcoes_fixas=(), **kwargs):
+        self.opcoes_fixas = list(opcoes_fixas)
+        super().__init__(master, values=self.opcoes_fixas, **kwargs)
+        self.executor = executor
+        self.limite = limite
+        self.opcoes = {}  # rótulo -> id dos produtos listados
+        self.ultima_busca = None
+        self.busca_agendada = None
+        self.abrir_ao_buscar = False
+        self.bind('<KeyRelease>', self.agendar_busca)
+        self.bind('<Down>', self.abrir_lista)
+    
+    def agendar_busca(self, event=None):
+        """Refaz a busca 250 ms após a última tecla (debounce)"""
+        if self.busca_agendada:
+            self.after_cancel(self.busca_agendada)
+        self.busca_agendada = self.after(250, self.buscar)
+    
+    def buscar(self):
+        """Pede os produtos mais relevantes para o texto digitado; retorna False se não precisar"""
+        self.busca_agendada = None
+        if not self.winfo_exists():
+            return False
+        texto = self.get().strip()
+        # Texto igual ao da última busca ou item escolhido na lista: nada a fazer
+        if texto == self.ultima_busca or texto in self.opcoes or texto in self.opcoes_fixas:
+            return False
+        self.ultima_busca = texto
+        # Uma única letra casaria com boa parte do catálogo; espera a próxima
+        if len(texto) < 2:
+            self.mostrar_opcoes(texto, [])
+        else:
+            self.executor.ler(obter_produtos, texto, self.limite,
+                              ao_concluir=lambda produtos: self.mostrar_opcoes(texto, produtos))
+        return True
+    
+    def mostrar_opcoes(self, texto, produtos):
+        """Aplica o resultado de uma busca, se ainda corresponder ao texto digitado"""
+        if texto != self.ultima_busca or not self.winfo_exists():
+            return
+        self.opcoes = {rotulo_produto(p): p[0] for p in produtos}
+        self.configure(values=self.opcoes_fixas + list(self.opcoes))
+        if self.abrir_ao_buscar:
+            self.abrir_ao_buscar = False
+            self._open_dropdown_menu()
+    
+    def abrir_lista(self, event=None):
+        """Busca imediatamente e abre a lista de opções assim que ela chegar"""
+        if self.busca_agendada:
+            self.after_cancel(self.busca_agendada)
+        self.abrir_ao_buscar = True
+        if not self.buscar():
+            self.abrir_ao_buscar = False
+            self._open_dropdown_menu()
+    
+    def selecao(self):
+        """Texto escolhido e o id correspondente na lista (None se digitado à mão)"""
+        rotulo = self.get().strip()
+        return rotulo, self.opcoes.get(rotulo)
+
 class EstoqueApp:
     def __init__(self, root):
         self.root = root
@@ -34,27 +177,139 @@ class EstoqueApp:
         self.main_frame = ctk.CTkFrame(self.root, fg_color="transparent")
         self.main_frame.pack(fill="both", expand=True, padx=20, pady=20)
         
+        # Todo acesso ao banco passa pelo executor, fora da thread do Tk
+        self.executor = ExecutorBanco(
+            self.root, ao_falhar=self.mostrar_erro_banco, ao_mudar_ocupado=self.indicar_ocupado
+        )
+        
+        # Alertas de estoque baixo: último alerta já visto e produtos ainda não dispensados
+        self.ultimo_alerta = None
+        self.alertas_pendentes = {}
+        self.painel_alertas = None
+        self.verificacao_alertas = None
+        self.verificando_alertas = False
+        
         self.usuario_logado = None
         self.tela_login()
-        self.verificar_estoque_baixo_periodicamente()
-    
-    def verificar_estoque_baixo_periodicamente(self):
-        """Verifica estoque baixo a cada 5 minutos (300000ms)"""
-        if hasattr(self, 'usuario_logado') and self.usuario_logado:
-            self.mostrar_alerta_estoque_baixo()
-        self.root.after(300000, self.verificar_estoque_baixo_periodicamente)
-    
-    def mostrar_alerta_estoque_baixo(self):
-        """Mostra alerta de estoque baixo"""
-        produtos_baixos = produtos_estoque_baixo()
-        if produtos_baixos:
-            mensagem = "⚠️ ALERTA: Os seguintes produtos estão com estoque baixo:\n\n"
-            for produto in produtos_baixos:
-                mensagem += f"• {produto[1]} (Qtd: {produto[3]})\n"
-            
-            # Mostra alerta apenas se a janela principal estiver focada
-            if self.root.focus_displayof():
-                messagebox.showwarning("Estoque Baixo", mensagem)
+    
+    def mostrar_erro_banco(self, erro):
+        """Informa uma falha em uma tarefa do banco sem tratamento próprio"""
+        messagebox.showerror("Erro", f"Falha ao acessar o banco de dados:\n{erro}")
+    
+    def indicar_ocupado(self, ocupado):
+        """Cursor de espera enquanto houver tarefas do banco em andamento"""
+        self.root.configure(cursor="watch" if ocupado else "")
+    
+    def enviar_gravacao(self, popup, funcao, *args, ao_concluir):
+        """Envia uma gravação pedida em um popup, ignorando Enter repetido até ela terminar
+
+        ao_concluir(resultado) só é chamado se o popup ainda estiver aberto.
+        """
+        if getattr(popup, 'gravando', False):
+            return
+        popup.gravando = True
+        
+        def concluir(resultado):
+            popup.gravando = False
+            if popup.winfo_exists():
+                ao_concluir(resultado)
+        
+        def falhar(erro):
+            popup.gravando = False
+            self.mostrar_erro_banco(erro)
+        
+        self.executor.gravar(funcao, *args, ao_concluir=concluir, ao_falhar=falhar)
+    
+    def iniciar_alertas_estoque(self):
+        """Mostra o resumo do estoque baixo ao logar e passa a acompanhar novos alertas"""
+        self.ultimo_alerta = None
+        self.alertas_pendentes = {}
+        
+        def carregar():
+            # Percorre só o índice parcial dos produtos abaixo do mínimo
+            return ultimo_alerta_estoque(), produtos_estoque_baixo()
+        
+        def exibir(resultado):
+            if not self.usuario_logado:
+                return
+            self.ultimo_alerta, produtos = resultado
+            for produto in produtos:
+                self.alertas_pendentes[produto[0]] = (produto[1], produto[3], produto[4])
+            self.mostrar_alertas_estoque()
+        
+        self.executor.ler(carregar, ao_concluir=exibir)
+        if self.verificacao_alertas:
+            self.root.after_cancel(self.verificacao_alertas)
+        self.verificacao_alertas = self.root.after(3000, self.acompanhar_alertas_estoque)
+    
+    def acompanhar_alertas_estoque(self):
+        """Consulta periodicamente os alertas gravados (inclusive por outros terminais)"""
+        self.verificar_alertas_estoque()
+        self.verificacao_alertas = self.root.after(3000, self.acompanhar_alertas_estoque)
+    
+    def verificar_alertas_estoque(self):
+        """Exibe os produtos que ficaram abaixo do mínimo desde a última verificação"""
+        if not self.usuario_logado or self.ultimo_alerta is None or self.verificando_alertas:
+            return
+        self.verificando_alertas = True
+        
+        def exibir(resultado):
+            self.verificando_alertas = False
+            if not self.usuario_logado or self.ultimo_alerta is None:
+                return
+            self.ultimo_alerta, produtos = resultado
+            if produtos:
+                for produto_id, nome, quantidade, estoque_minimo in produtos:
+                    self.alertas_pendentes[produto_id] = (nome, quantidade, estoque_minimo)
+                self.mostrar_alertas_estoque()
+        
+        def falhar(erro):
+            # Verificação periódica: registra e tenta de novo no próximo ciclo
+            self.verificando_alertas = False
+            print(f"Erro ao verificar alertas de estoque: {erro}")
+        
+        self.executor.ler(obter_alertas_estoque, self.ultimo_alerta, ao_concluir=exibir, ao_falhar=falhar)
+    
+    def mostrar_alertas_estoque(self):
+        """Painel no canto da janela com os alertas pendentes (não bloqueia a tela)"""
+        if self.painel_alertas is not None and self.painel_alertas.winfo_exists():
+            self.painel_alertas.destroy()
+        self.painel_alertas = None
+        if not self.alertas_pendentes:
+            return
+        
+        painel = ctk.CTkFrame(self.root, corner_radius=10, border_width=2, border_color=self.cor_alerta)
+        painel.place(relx=1.0, rely=1.0, x=-20, y=-20, anchor="se")
+        ctk.CTkLabel(
+            painel,
+            text=f"⚠️ Estoque baixo: {len(self.alertas_pendentes)} produto(s)",
+            font=ctk.CTkFont(weight="bold"),
+            text_color=self.cor_alerta
+        ).pack(padx=15, pady=(10, 5), anchor="w")
+        
+        # Os mais recentes primeiro
+        pendentes = list(self.alertas_pendentes.values())
+        for nome, quantidade, estoque_minimo in pendentes[:-6:-1]:
+            ctk.CTkLabel(
+                painel, text=f"• {nome} (Qtd: {quantidade} / mín.: {estoque_minimo})"
+            ).pack(padx=15, anchor="w")
+        if len(pendentes) > 5:
+            ctk.CTkLabel(painel, text=f"... e mais {len(pendentes) - 5}").pack(padx=15, anchor="w")
+        
+        ctk.CTkButton(
+            painel,
+            text="Dispensar",
+            width=100,
+            command=self.dispensar_alertas_estoque,
+            fg_color=self.cor_alerta,
+            hover_color="#FF4500"
+        ).pack(pady=10)
+        self.painel_alertas = painel
+    
+    def dispensar_alertas_estoque(self):
+        """Fecha o painel; só novas passagens abaixo do mínimo voltam a aparecer"""
+        self.alertas_pendentes = {}
+        self.mostrar_alertas_estoque()
     
     def processar_enter(self, event):
         """Processa o pressionamento da tecla Enter"""
@@ -70,6 +325,11 @@ class EstoqueApp:
     def tela_login(self):
         self.limpar_tela()
         
+        # Ao sair, deixa de exibir os alertas da sessão anterior
+        self.usuario_logado = None
+        self.alertas_pendentes = {}
+        self.mostrar_alertas_estoque()
+        
         login_frame = ctk.CTkFrame(self.main_frame, corner_radius=15)
         login_frame.pack(expand=True, pady=50)
         
@@ -122,13 +382,25 @@ class EstoqueApp:
         senha = self.entry_senha.get()
         
         if usuario and senha:
-            usuario_validado = validar_login(usuario, senha)
-            if usuario_validado:
-                self.usuario_logado = usuario_validado
-                self.menu_principal()
-                self.mostrar_alerta_estoque_baixo()  # Verifica estoque ao logar
-            else:
-                messagebox.showerror("Erro", "Credenciais inválidas!")
+            # Enter repetido enquanto a validação roda não envia outra
+            if getattr(self, 'validando_login', False):
+                return
+            self.validando_login = True
+            
+            def concluir(usuario_validado):
+                self.validando_login = False
+                if usuario_validado:
+                    self.usuario_logado = usuario_validado
+                    self.menu_principal()
+                    self.iniciar_alertas_estoque()  # Resumo do estoque baixo ao logar
+                else:
+                    messagebox.showerror("Erro", "Credenciais inválidas!")
+            
+            def falhar(erro):
+                self.validando_login = False
+                self.mostrar_erro_banco(erro)
+            
+            self.executor.ler(validar_login, usuario, senha, ao_concluir=concluir, ao_falhar=falhar)
         else:
             messagebox.showerror("Erro", "Preencha todos os campos!")
     
@@ -173,12 +445,15 @@ class EstoqueApp:
             ("✖️ Remover Produto", self.tela_remover_produto),
             ("⬆️ Registrar Entrada", self.tela_registrar_entrada),
             ("⬇️ Registrar Saída", self.tela_registrar_saida),
+            ("🚚 Entrada em Lote", self.tela_entrada_lote),
             ("📊 Movimentações", self.tela_movimentacoes),
             ("📤 Exportar CSV", self.exportar_csv),
-            ("📥 Importar CSV", self.importar_csv)
+            ("📥 Importar CSV", self.importar_csv),
+            ("📈 Reposição", self.tela_reposicao),
+            ("🩺 Diagnóstico", self.tela_diagnostico)
         ]
         
-        # Organiza os botões em uma grade 3x3
+        # Organiza os botões em uma grade de 3 colunas
         for i, (texto, comando) in enumerate(botoes):
             row = i // 3
             col = i % 3
@@ -270,11 +545,21 @@ class EstoqueApp:
             self.quant_produto.focus()
             return
         
-        adicionar_produto(nome, desc, quantidade, estoque_minimo)
-        messagebox.showinfo("Sucesso", "Produto cadastrado com sucesso!")
-        popup.destroy()
+        def concluir(cadastrado):
+            if not cadastrado:
+                messagebox.showerror("Erro", "Já existe um produto com este nome!")
+                self.nome_produto.focus()
+                return
+            messagebox.showinfo("Sucesso", "Produto cadastrado com sucesso!")
+            popup.destroy()
+            self.verificar_alertas_estoque()
+        
+        self.enviar_gravacao(popup, adicionar_produto, nome, desc, quantidade, estoque_minimo,
+                             ao_concluir=concluir)
 
     def tela_consulta_estoque(self):
+        from tkinter import ttk
+        
         frame, popup = self.criar_janela_popup("Consulta de Estoque", 800, 600)
         
         # Frame de pesquisa
@@ -282,9 +567,14 @@ class EstoqueApp:
         pesquisa_frame.pack(fill="x", pady=5)
         
         ctk.CTkLabel(pesquisa_frame, text="Pesquisar:").pack(side="left", padx=5)
-        pesquisa_entry = ctk.CTkEntry(pesquisa_frame, width=300)
+        pesquisa_entry = ctk.CTkEntry(
+            pesquisa_frame, width=300, placeholder_text="Nome ou descrição (ex.: acucar cristal)"
+        )
         pesquisa_entry.pack(side="left", padx=5, fill="x", expand=True)
         pesquisa_entry.bind('<Return>', lambda e: self.filtrar_estoque(pesquisa_entry.get()))
+        # Busca enquanto digita, esperando uma pausa na digitação
+        self.busca_agendada = None
+        pesquisa_entry.bind('<KeyRelease>', lambda e: self.agendar_busca_estoque(pesquisa_entry.get()))
         
         pesquisar_btn = ctk.CTkButton(
             pesquisa_frame,
@@ -323,35 +613,130 @@ class EstoqueApp:
         # Configura cores para itens com estoque baixo
         self.tree_estoque.tag_configure('estoque_baixo', background='#FFCCCB')
         
-        # Carrega os dados
+        # Estado da sincronização incremental: id -> valores exibidos, versão do
+        # catálogo já aplicada e filtro em vigor (os itens usam o id como iid)
+        self.itens_estoque = {}
+        self.versao_estoque = None
+        self.filtro_estoque = None
+        # Leitura em andamento e, se pedida durante ela, o filtro da próxima
+        self.carregando_estoque = False
+        self.recarga_estoque = None
+        
+        # Carrega os dados e passa a acompanhar alterações (inclusive de outros terminais)
         self.carregar_dados_estoque()
+        if getattr(self, 'verificacao_estoque', None):
+            self.root.after_cancel(self.verificacao_estoque)
+        self.verificacao_estoque = self.root.after(2000, self.verificar_alteracoes_estoque)
     
     def carregar_dados_estoque(self, filtro=None):
-        """Carrega os dados na treeview com destaque para estoque baixo"""
-        for item in self.tree_estoque.get_children():
-            self.tree_estoque.delete(item)
-        
-        produtos = obter_produtos(filtro)
-        for prod in produtos:
-            # Verifica se o estoque está abaixo do mínimo
-            if prod[3] < prod[4]:  # quantidade < estoque_minimo
-                self.tree_estoque.insert("", "end", values=prod, tags=('estoque_baixo',))
-            else:
-                self.tree_estoque.insert("", "end", values=prod)
+        """Sincroniza a treeview com o banco aplicando só as diferenças (destaque para estoque baixo)"""
+        if not self.tree_estoque.winfo_exists():
+            return
+        filtro = filtro or None
+        if self.carregando_estoque:
+            # Uma leitura por vez; a última pedida roda quando a atual terminar
+            self.recarga_estoque = (filtro,)
+            return
+        self.carregando_estoque = True
+        tree = self.tree_estoque
+        # Com filtro (busca limitada aos mais relevantes) ou filtro novo: compara o
+        # resultado completo com o que já está na tela; senão, só o que mudou
+        completo = self.versao_estoque is None or filtro or filtro != self.filtro_estoque
+        
+        def aplicar(resultado):
+            self.carregando_estoque = False
+            # A consulta pode ter sido fechada (ou reaberta) durante a leitura
+            if tree is not self.tree_estoque or not tree.winfo_exists():
+                return
+            versao, produtos, removidos = resultado
+            if completo:
+                ids = {prod[0] for prod in produtos}
+                removidos = [i for i in self.itens_estoque if i not in ids]
+            for produto_id in removidos:
+                self.remover_item_estoque(produto_id)
+            for prod in produtos:
+                self.atualizar_item_estoque(prod)
+            if completo:
+                # Reordena com uma única chamada ao Tk
+                tree.set_children("", *(str(prod[0]) for prod in produtos))
+                self.filtro_estoque = filtro
+            self.versao_estoque = versao
+            self.recarregar_estoque_pendente()
+        
+        def falhar(erro):
+            self.carregando_estoque = False
+            self.mostrar_erro_banco(erro)
+            self.recarregar_estoque_pendente()
+        
+        self.executor.ler(ler_estoque, completo, self.versao_estoque, filtro,
+                          ao_concluir=aplicar, ao_falhar=falhar)
+    
+    def recarregar_estoque_pendente(self):
+        """Refaz a leitura pedida enquanto outra estava em andamento"""
+        if self.recarga_estoque is not None:
+            filtro, = self.recarga_estoque
+            self.recarga_estoque = None
+            self.carregar_dados_estoque(filtro)
+    
+    def atualizar_item_estoque(self, prod):
+        """Insere ou atualiza a linha de um produto, apenas se os valores mudaram"""
+        # Verifica se o estoque está abaixo do mínimo
+        tags = ('estoque_baixo',) if prod[3] < prod[4] else ()  # quantidade < estoque_minimo
+        atual = self.itens_estoque.get(prod[0])
+        if atual is None:
+            self.tree_estoque.insert("", "end", iid=str(prod[0]), values=prod, tags=tags)
+        elif atual != prod:
+            self.tree_estoque.item(str(prod[0]), values=prod, tags=tags)
+        self.itens_estoque[prod[0]] = prod
+    
+    def remover_item_estoque(self, produto_id):
+        """Remove a linha de um produto, se estiver na treeview"""
+        if self.itens_estoque.pop(produto_id, None) is not None:
+            self.tree_estoque.delete(str(produto_id))
+    
+    def verificar_alteracoes_estoque(self):
+        """Consulta periodicamente a versão do catálogo enquanto a consulta estiver aberta"""
+        if not self.tree_estoque.winfo_exists():
+            self.verificacao_estoque = None
+            return
+        if not self.carregando_estoque:
+            tree = self.tree_estoque
+            
+            def comparar(versao):
+                if tree is self.tree_estoque and tree.winfo_exists() and versao != self.versao_estoque:
+                    self.carregar_dados_estoque(self.filtro_estoque)
+            
+            def falhar(erro):
+                # Verificação periódica: registra e tenta de novo no próximo ciclo
+                print(f"Erro ao verificar alterações do estoque: {erro}")
+            
+            self.executor.ler(versao_produtos, ao_concluir=comparar, ao_falhar=falhar)
+        self.verificacao_estoque = self.root.after(2000, self.verificar_alteracoes_estoque)
+    
+    def agendar_busca_estoque(self, texto):
+        """Refaz a busca 250 ms após a última tecla (debounce)"""
+        if self.busca_agendada:
+            self.root.after_cancel(self.busca_agendada)
+        self.busca_agendada = self.root.after(250, self.filtrar_estoque, texto)
     
     def filtrar_estoque(self, filtro):
         """Filtra os produtos na treeview"""
+        self.busca_agendada = None
+        filtro = filtro.strip()
+        # Uma única letra casaria com boa parte do catálogo; espera a próxima
+        if len(filtro) == 1:
+            return
+        pendente = self.recarga_estoque[0] if self.recarga_estoque else self.filtro_estoque
+        if filtro == (pendente or ""):
+            return
         self.carregar_dados_estoque(filtro)
 
     def tela_editar_quantidade(self):
         """Tela para editar a quantidade de um produto"""
         frame, popup = self.criar_janela_popup("Editar Quantidade")
         
-        produtos = obter_produtos()
-        nomes_produtos = [f"{p[0]} - {p[1]}" for p in produtos]
-        
         ctk.CTkLabel(frame, text="Selecione o produto:").pack(pady=(10, 5))
-        self.combo_produto_editar = ctk.CTkComboBox(frame, values=nomes_produtos)
+        self.combo_produto_editar = SeletorProduto(frame, self.executor)
         self.combo_produto_editar.pack(pady=5)
         
         ctk.CTkLabel(frame, text="Nova quantidade:").pack(pady=(10, 5))
@@ -385,7 +770,6 @@ class EstoqueApp:
             return
         
         try:
-            produto_id = int(selecao.split(" - ")[0])
             nova_quantidade = int(nova_quant)
             if nova_quantidade < 0:
                 raise ValueError
@@ -394,25 +778,34 @@ class EstoqueApp:
             self.entry_nova_quantidade.focus()
             return
         
-        # Atualiza a quantidade no banco de dados
-        if atualizar_quantidade_produto(produto_id, nova_quantidade):
-            messagebox.showinfo("Sucesso", "Quantidade atualizada com sucesso!")
-            popup.destroy()
-            # Atualiza a tela de consulta se estiver aberta
-            if hasattr(self, 'tree_estoque'):
-                self.carregar_dados_estoque()
-        else:
-            messagebox.showerror("Erro", "Falha ao atualizar quantidade!")
+        def concluir(atualizado):
+            if atualizado is None:
+                messagebox.showerror("Erro", "Produto não encontrado! Selecione um item da lista.")
+                self.combo_produto_editar.focus()
+            elif atualizado:
+                messagebox.showinfo("Sucesso", "Quantidade atualizada com sucesso!")
+                popup.destroy()
+                self.verificar_alertas_estoque()
+                # Atualiza a tela de consulta se estiver aberta (só a linha alterada)
+                if hasattr(self, 'tree_estoque') and self.tree_estoque.winfo_exists():
+                    self.carregar_dados_estoque(self.filtro_estoque)
+            else:
+                messagebox.showerror("Erro", "Falha ao atualizar quantidade!\n"
+                                             "Verifique se ela não fica abaixo da quantidade reservada.")
+        
+        # Confirma o produto e atualiza a quantidade no banco de dados, na mesma tarefa
+        self.enviar_gravacao(
+            popup, gravar_no_produto, self.combo_produto_editar.selecao(),
+            atualizar_quantidade_produto, nova_quantidade, self.usuario_logado['nome'],
+            ao_concluir=concluir
+        )
 
     def tela_remover_produto(self):
         """Exibe a tela para remover produtos"""
         frame, popup = self.criar_janela_popup("Remover Produto")
         
-        produtos = obter_produtos()
-        nomes_produtos = [f"{p[0]} - {p[1]}" for p in produtos]
-        
         ctk.CTkLabel(frame, text="Selecione o produto:").pack(pady=(10, 5))
-        self.combo_produto = ctk.CTkComboBox(frame, values=nomes_produtos)
+        self.combo_produto = SeletorProduto(frame, self.executor)
         self.combo_produto.pack(pady=5)
         
         remover_btn = ctk.CTkButton(
@@ -435,62 +828,281 @@ class EstoqueApp:
             messagebox.showwarning("Aviso", "Selecione um produto!")
             return
         
-        produto_id = int(selecao.split(" - ")[0])
-        
-        confirmar = messagebox.askyesno(
-            "Confirmar",
-            f"Tem certeza que deseja remover este produto?",
-            icon='warning'
-        )
+        def confirmar(produto_id):
+            if not popup.winfo_exists():
+                return
+            if produto_id is None:
+                messagebox.showerror("Erro", "Produto não encontrado! Selecione um item da lista.")
+                self.combo_produto.focus()
+                return
+            
+            confirmado = messagebox.askyesno(
+                "Confirmar",
+                f"Tem certeza que deseja remover este produto?",
+                icon='warning'
+            )
+            if confirmado:
+                self.enviar_gravacao(popup, remover_produto, produto_id, ao_concluir=concluir)
         
-        if confirmar:
-            if remover_produto(produto_id):
+        def concluir(removido):
+            if removido:
                 messagebox.showinfo("Sucesso", "Produto removido com sucesso!")
                 popup.destroy()
             else:
                 messagebox.showerror("Erro", 
-                    "Não foi possível remover o produto. Verifique se há movimentações relacionadas.")
+                    "Não foi possível remover o produto. Verifique se há entradas, saídas "
+                    "(também arquivadas) ou reservas relacionadas.")
+        
+        self.executor.ler(resolver_produto, self.combo_produto.selecao(), ao_concluir=confirmar)
 
     def exportar_csv(self):
-        """Exporta dados para CSV"""
+        """Exporta estoque ou histórico de movimentações para CSV em segundo plano"""
+        frame, popup = self.criar_janela_popup("Exportar CSV", 450, 420)
+        
+        ctk.CTkLabel(frame, text="O que exportar:").pack(pady=(15, 5))
+        seletor = ctk.CTkSegmentedButton(frame, values=["Estoque", "Movimentações"])
+        seletor.set("Estoque")
+        seletor.pack(pady=5)
+        
+        # Filtros usados apenas na exportação de movimentações
+        ctk.CTkLabel(frame, text="Período das movimentações (dd/mm/aaaa, opcional):").pack(pady=(15, 5))
+        periodo_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        periodo_frame.pack(pady=5)
+        data_inicio = ctk.CTkEntry(periodo_frame, width=120, placeholder_text="De")
+        data_inicio.pack(side="left", padx=5)
+        data_fim = ctk.CTkEntry(periodo_frame, width=120, placeholder_text="Até")
+        data_fim.pack(side="left", padx=5)
+        
+        ctk.CTkLabel(frame, text="Produto (opcional):").pack(pady=(10, 5))
+        produto = SeletorProduto(frame, self.executor, opcoes_fixas=["Todos"])
+        produto.set("Todos")
+        produto.pack(pady=5)
+        
+        exportar_btn = ctk.CTkButton(
+            frame,
+            text="Exportar (Enter)",
+            command=lambda: self.iniciar_exportacao(
+                frame, popup, seletor.get(), data_inicio.get(), data_fim.get(), produto
+            ),
+            fg_color=self.cor_principal
+        )
+        exportar_btn.pack(pady=20)
+        
+        self.botao_ativo = exportar_btn
+        popup.bind('<Return>', lambda e: exportar_btn.invoke())
+    
+    def iniciar_exportacao(self, frame, popup, origem, data_inicio, data_fim, produto):
+        """Valida os filtros, pede o arquivo de destino e inicia a exportação"""
+        try:
+            inicio = data_para_banco(data_inicio)
+            fim = data_para_banco(data_fim)
+        except ValueError:
+            messagebox.showerror("Erro", "Datas devem estar no formato dd/mm/aaaa!")
+            return
+        if produto.get().strip() in ("", "Todos"):
+            self.escolher_destino_exportacao(frame, popup, origem, inicio, fim, None)
+            return
+        
+        def escolher(produto_id):
+            if not popup.winfo_exists():
+                return
+            if produto_id is None:
+                messagebox.showerror("Erro", "Produto não encontrado! Selecione um item da lista.")
+                return
+            self.escolher_destino_exportacao(frame, popup, origem, inicio, fim, produto_id)
+        
+        self.executor.ler(resolver_produto, produto.selecao(), ao_concluir=escolher)
+    
+    def escolher_destino_exportacao(self, frame, popup, origem, inicio, fim, produto_id):
+        """Pede o arquivo de destino e inicia a exportação com os filtros já validados"""
+        from tkinter import filedialog
+        
         caminho = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("Arquivos CSV", "*.csv")],
-            title="Exportar Estoque para CSV"
+            filetypes=[("Arquivos CSV", "*.csv"), ("CSV compactado", "*.csv.gz")],
+            title="Exportar Estoque para CSV" if origem == "Estoque" else "Exportar Movimentações para CSV"
         )
+        if not caminho:
+            return
         
-        if caminho:
-            try:
-                if exportar_estoque_csv(caminho):
-                    messagebox.showinfo("Sucesso", "Estoque exportado com sucesso!")
-                else:
-                    messagebox.showerror("Erro", "Falha ao exportar estoque")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Falha ao exportar:\n{e}")
+        if origem == "Estoque":
+            tarefa = lambda progresso, cancelar: exportar_estoque_csv(
+                caminho, progresso=progresso, cancelar=cancelar)
+        else:
+            tarefa = lambda progresso, cancelar: exportar_movimentacoes_csv(
+                caminho, inicio, fim, produto_id, progresso=progresso, cancelar=cancelar)
+        
+        def concluir(exportado):
+            if exportado:
+                messagebox.showinfo("Sucesso", "Exportação concluída com sucesso!")
+            else:
+                messagebox.showinfo("Exportação", "Exportação cancelada.")
+        
+        self.executar_com_progresso(frame, popup, "Exportando...", tarefa, concluir, determinado=False)
+    
+    def executar_com_progresso(self, frame, popup, texto, tarefa, ao_concluir, determinado=True,
+                               gravacao=False):
+        """Executa tarefa(progresso, cancelar) no executor, exibindo progresso e botão Cancelar
+
+        A tarefa informa o andamento chamando progresso(linhas[, fracao]); ao_concluir(resultado)
+        é chamado na thread do Tk quando ela termina. gravacao=True a coloca na fila de escrita.
+        """
+        for widget in frame.winfo_children():
+            widget.destroy()
+        popup.unbind('<Return>')
+        
+        rotulo = ctk.CTkLabel(frame, text=texto)
+        rotulo.pack(pady=(20, 10))
+        
+        barra = ctk.CTkProgressBar(
+            frame,
+            width=350,
+            progress_color=self.cor_principal,
+            mode="determinate" if determinado else "indeterminate"
+        )
+        barra.pack(pady=5)
+        if determinado:
+            barra.set(0)
+        else:
+            barra.start()
+        
+        # Estado compartilhado com a thread; só a thread do Tk mexe nos widgets
+        estado = {'linhas': 0, 'fracao': 0.0}
+        cancelar = threading.Event()
+        
+        def progresso(linhas, fracao=None):
+            estado['linhas'] = linhas
+            if fracao is not None:
+                estado['fracao'] = fracao
+        
+        def concluir(resultado):
+            popup.destroy()
+            ao_concluir(resultado)
+        
+        def falhar(erro):
+            popup.destroy()
+            messagebox.showerror("Erro", f"Falha na operação:\n{erro}")
+        
+        enviar = self.executor.gravar if gravacao else self.executor.ler
+        futuro = enviar(tarefa, progresso, cancelar, ao_concluir=concluir, ao_falhar=falhar)
+        
+        def cancelar_tarefa():
+            # Ainda na fila: nem chega a rodar; em andamento: para no próximo bloco
+            if futuro.cancel():
+                popup.destroy()
+            else:
+                cancelar.set()
+        
+        cancelar_btn = ctk.CTkButton(
+            frame,
+            text="Cancelar",
+            command=cancelar_tarefa,
+            fg_color="#FF6347",
+            hover_color="#FF4500"
+        )
+        cancelar_btn.pack(pady=20)
+        
+        # Fechar a janela ou pressionar Esc também cancela
+        popup.protocol("WM_DELETE_WINDOW", cancelar_tarefa)
+        popup.bind('<Escape>', lambda e: cancelar_tarefa())
+        
+        self.acompanhar_tarefa(futuro, barra, rotulo, cancelar, estado, determinado)
+    
+    def acompanhar_tarefa(self, futuro, barra, rotulo, cancelar, estado, determinado):
+        """Atualiza o progresso a cada 100 ms enquanto a tarefa estiver em andamento
+
+        O resultado é entregue pelo executor; aqui só se acompanha o andamento.
+        """
+        if futuro.done() or not rotulo.winfo_exists():
+            return
+        if determinado:
+            barra.set(estado['fracao'])
+        if cancelar.is_set():
+            texto = "Cancelando..."
+        elif futuro.running():
+            texto = f"{estado['linhas']:,} linhas processadas"
+        else:
+            texto = "Aguardando outras operações..."
+        rotulo.configure(text=texto)
+        self.root.after(100, self.acompanhar_tarefa, futuro, barra, rotulo, cancelar, estado, determinado)
 
     def importar_csv(self):
-        """Importa produtos de CSV"""
+        """Importa produtos de CSV em segundo plano, com progresso e cancelamento"""
+        from tkinter import filedialog
+        
         caminho = filedialog.askopenfilename(
             filetypes=[("Arquivos CSV", "*.csv")],
             title="Selecione o arquivo CSV para importar"
         )
         
-        if caminho:
-            try:
-                if importar_produtos_csv(caminho):
-                    messagebox.showinfo("Sucesso", "Produtos importados com sucesso!")
-                else:
-                    messagebox.showwarning("Aviso", "Alguns produtos não foram importados")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Falha ao importar:\n{e}")
+        if not caminho:
+            return
+        
+        frame, popup = self.criar_janela_popup("Importar CSV", 450, 260)
+        
+        # Rótulos exibidos para cada modo de importação do banco
+        modos = {
+            "Somente novos": 'inserir',
+            "Atualizar existentes": 'atualizar',
+            "Somente diferenças": 'diferencas',
+        }
+        ctk.CTkLabel(frame, text="Produtos já cadastrados (mesmo nome):").pack(pady=(20, 5))
+        seletor_modo = ctk.CTkSegmentedButton(frame, values=list(modos))
+        seletor_modo.set("Somente novos")
+        seletor_modo.pack(pady=5)
+        
+        importar_btn = ctk.CTkButton(
+            frame,
+            text="Importar (Enter)",
+            command=lambda: self.iniciar_importacao(frame, popup, caminho, modos[seletor_modo.get()]),
+            fg_color=self.cor_principal
+        )
+        importar_btn.pack(pady=20)
+        
+        self.botao_ativo = importar_btn
+        popup.bind('<Return>', lambda e: importar_btn.invoke())
+    
+    def iniciar_importacao(self, frame, popup, caminho, modo):
+        """Inicia a importação em segundo plano com o modo escolhido"""
+        responsavel = self.usuario_logado['nome']
+        self.executar_com_progresso(
+            frame, popup, "Importando...",
+            lambda progresso, cancelar: importar_produtos_csv(
+                caminho, progresso, cancelar, modo=modo, responsavel=responsavel),
+            self.mostrar_relatorio_importacao,
+            gravacao=True
+        )
+    
+    def mostrar_relatorio_importacao(self, relatorio):
+        """Exibe o resumo da importação com as primeiras linhas problemáticas"""
+        if relatorio['cancelado']:
+            messagebox.showinfo("Importação", "Importação cancelada. Nenhum produto foi importado.")
+            return
+        if relatorio['erro']:
+            messagebox.showerror("Erro", f"Falha ao importar:\n{relatorio['erro']}")
+            return
+        
+        mensagem = (
+            f"Linhas lidas: {relatorio['linhas']:,}\n"
+            f"Inseridos: {relatorio['inseridos']:,}\n"
+            f"Atualizados: {relatorio['atualizados']:,}\n"
+            f"Sem alteração: {relatorio['inalterados']:,}\n"
+            f"Ignorados: {relatorio['ignorados']:,}\n"
+            f"Inválidos: {relatorio['invalidos']:,}"
+        )
+        if relatorio['ocorrencias']:
+            detalhes = "\n".join(f"Linha {n}: {motivo}" for n, motivo in relatorio['ocorrencias'][:15])
+            mensagem += f"\n\n{detalhes}"
+            if relatorio['ignorados'] + relatorio['invalidos'] > 15:
+                mensagem += "\n..."
+            messagebox.showwarning("Importação concluída", mensagem)
+        else:
+            messagebox.showinfo("Sucesso", mensagem)
 
     def tela_registrar_entrada(self):
         frame, popup = self.criar_janela_popup("Registrar Entrada")
         
-        produtos = obter_produtos()
-        nomes_produtos = [p[1] for p in produtos]
-        
-        self.produto_entrada = ctk.CTkComboBox(frame, values=nomes_produtos)
+        self.produto_entrada = SeletorProduto(frame, self.executor)
         self.quant_entrada = ctk.CTkEntry(frame)
         self.data_entrada = ctk.CTkEntry(frame, placeholder_text=datetime.now().strftime("%d/%m/%Y"))
         
@@ -533,27 +1145,24 @@ class EstoqueApp:
             self.quant_entrada.focus()
             return
         
-        # Obtém o ID do produto
-        produtos = obter_produtos()
-        produto_id = next(p[0] for p in produtos if p[1] == produto_nome)
+        def concluir(registrada):
+            if not registrada:
+                messagebox.showerror("Erro", "Produto não encontrado! Selecione um item da lista.")
+                self.produto_entrada.focus()
+                return
+            messagebox.showinfo("Sucesso", "Entrada registrada com sucesso!")
+            popup.destroy()
         
-        registrar_movimentacao(
-            produto_id=produto_id,
-            tipo='entrada',
-            quantidade=quantidade,
-            responsavel=self.usuario_logado['nome']
+        self.enviar_gravacao(
+            popup, gravar_no_produto, self.produto_entrada.selecao(), self.gravar_movimentacao,
+            'entrada', quantidade, self.usuario_logado['nome'], None,
+            ao_concluir=concluir
         )
-        
-        messagebox.showinfo("Sucesso", "Entrada registrada com sucesso!")
-        popup.destroy()
 
     def tela_registrar_saida(self):
         frame, popup = self.criar_janela_popup("Registrar Saída")
         
-        produtos = obter_produtos()
-        nomes_produtos = [p[1] for p in produtos]
-        
-        self.produto_saida = ctk.CTkComboBox(frame, values=nomes_produtos)
+        self.produto_saida = SeletorProduto(frame, self.executor)
         self.quant_saida = ctk.CTkEntry(frame)
         self.motivo_saida = ctk.CTkEntry(frame, placeholder_text="Ex: Venda, Uso interno")
         
@@ -598,23 +1207,325 @@ class EstoqueApp:
             self.quant_saida.focus()
             return
         
-        # Obtém o ID do produto
-        produtos = obter_produtos()
-        produto_id = next(p[0] for p in produtos if p[1] == produto_nome)
+        def concluir(registrada):
+            if registrada is None:
+                messagebox.showerror("Erro", "Produto não encontrado! Selecione um item da lista.")
+                self.produto_saida.focus()
+                return
+            if not registrada:
+                messagebox.showerror("Erro", "Estoque insuficiente para esta saída!")
+                self.quant_saida.focus()
+                return
+            messagebox.showinfo("Sucesso", "Saída registrada com sucesso!")
+            popup.destroy()
+            self.verificar_alertas_estoque()
+        
+        self.enviar_gravacao(
+            popup, gravar_no_produto, self.produto_saida.selecao(), self.gravar_movimentacao,
+            'saida', quantidade, self.usuario_logado['nome'], motivo,
+            ao_concluir=concluir
+        )
+
+    def tela_entrada_lote(self):
+        """Tela para registrar o recebimento de vários itens de uma vez"""
+        frame, popup = self.criar_janela_popup("Entrada em Lote", 600, 550)
+        
+        ctk.CTkLabel(
+            frame,
+            text="Uma linha por item: produto (ID ou nome); quantidade; motivo (opcional)"
+        ).pack(pady=(10, 5))
+        
+        self.texto_lote = ctk.CTkTextbox(frame, width=520, height=320)
+        self.texto_lote.pack(pady=5, fill="both", expand=True)
+        
+        registrar_btn = ctk.CTkButton(
+            frame,
+            text="Registrar Lote",
+            command=lambda: self.registrar_entrada_lote(popup),
+            fg_color=self.cor_principal
+        )
+        registrar_btn.pack(pady=20)
+        
+        # Enter quebra linha na caixa de texto, então aqui não há atalho de confirmação
+        self.botao_ativo = registrar_btn
+        self.texto_lote.focus()
+    
+    def registrar_entrada_lote(self, popup):
+        """Converte o texto do lote e registra todas as entradas em uma transação"""
+        linhas = [l.strip() for l in self.texto_lote.get("1.0", "end").splitlines()]
+        linhas = [l for l in linhas if l]
+        
+        if not linhas:
+            messagebox.showwarning("Aviso", "Informe ao menos um item!")
+            return
         
-        registrar_movimentacao(
+        movimentacoes = []
+        for linha in linhas:
+            # Aceita ; ou tabulação (colado de planilhas) como separador
+            campos = [c.strip() for c in linha.replace("\t", ";").split(";")]
+            produto_id = campos[0]  # id ou nome, convertido na tarefa de gravação
+            quantidade = campos[1] if len(campos) > 1 else ""
+            motivo = campos[2] if len(campos) > 2 and campos[2] else "Recebimento em lote"
+            movimentacoes.append(
+                (produto_id, 'entrada', quantidade, self.usuario_logado['nome'], motivo)
+            )
+        
+        def concluir(resultado):
+            if resultado['sucesso']:
+                messagebox.showinfo(
+                    "Sucesso", f"{resultado['registradas']} entradas registradas com sucesso!"
+                )
+                popup.destroy()
+            else:
+                detalhes = "\n".join(f"Linha {n}: {msg}" for n, msg in resultado['erros'][:20])
+                if len(resultado['erros']) > 20:
+                    detalhes += f"\n... e mais {len(resultado['erros']) - 20} erros"
+                messagebox.showerror("Erro", f"Nenhuma entrada foi registrada:\n\n{detalhes}")
+        
+        self.enviar_gravacao(popup, registrar_lote_por_nome, movimentacoes, ao_concluir=concluir)
+    
+    @staticmethod
+    def gravar_movimentacao(produto_id, tipo, quantidade, responsavel, motivo):
+        """Registra a movimentação (roda no executor); False se faltar estoque para a saída"""
+        return registrar_movimentacao(
             produto_id=produto_id,
-            tipo='saida',
+            tipo=tipo,
             quantidade=quantidade,
-            responsavel=self.usuario_logado['nome'],
+            responsavel=responsavel,
             motivo=motivo
         )
+    
+    def tela_reposicao(self):
+        """Relatório de consumo, dias de cobertura e sugestão de compra por produto"""
+        from tkinter import ttk
+        from analise import atualizar_consumo, relatorio_reposicao, aplicar_pontos_reposicao
+        
+        frame, popup = self.criar_janela_popup("Reposição de Estoque", 1000, 650)
+        
+        parametros_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        parametros_frame.pack(fill="x", pady=(0, 10))
+        parametros = {}
+        for chave, rotulo, padrao in (("janela", "Histórico (dias):", "90"),
+                                      ("prazo", "Prazo de entrega:", "7"),
+                                      ("cobertura", "Cobertura do pedido:", "14")):
+            ctk.CTkLabel(parametros_frame, text=rotulo).pack(side="left", padx=(8, 2))
+            campo = ctk.CTkEntry(parametros_frame, width=50)
+            campo.insert(0, padrao)
+            campo.pack(side="left", padx=3)
+            parametros[chave] = campo
+        
+        calcular_btn = ctk.CTkButton(parametros_frame, text="Calcular (Enter)", width=110)
+        calcular_btn.pack(side="left", padx=8)
+        aplicar_btn = ctk.CTkButton(
+            parametros_frame, text="Usar como estoque mínimo", width=170, state="disabled"
+        )
+        aplicar_btn.pack(side="left", padx=3)
+        
+        status = ctk.CTkLabel(frame, text="")
+        status.pack(anchor="w")
+        
+        colunas = ("ID", "Produto", "Qtd.", "Mínimo", "Média 7d", "Média", "Desvio",
+                   "Cobertura (dias)", "Ponto", "Sugestão")
+        tree = ttk.Treeview(frame, columns=colunas, show="headings")
+        for coluna in colunas:
+            tree.heading(coluna, text=coluna)
+            tree.column(coluna, width=200 if coluna == "Produto" else 80,
+                        anchor="w" if coluna == "Produto" else "center")
+        tree.tag_configure('repor', background='#FFCCCB')
+        scroll = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
         
-        messagebox.showinfo("Sucesso", "Saída registrada com sucesso!")
-        popup.destroy()
-
+        def ler_parametros():
+            try:
+                valores = {chave: int(campo.get()) for chave, campo in parametros.items()}
+            except ValueError:
+                valores = {}
+            if len(valores) < 3 or min(valores.values()) <= 0:
+                messagebox.showerror("Erro", "Os parâmetros devem ser números inteiros positivos!")
+                return None
+            return valores
+        
+        def calcular():
+            valores = ler_parametros()
+            if valores is None:
+                return
+            calcular_btn.configure(state="disabled")
+            status.configure(text="Atualizando o resumo de consumo e calculando...")
+            
+            def tarefa():
+                atualizar_consumo()
+                # A lista mostra os mais urgentes; o cálculo cobre todo o catálogo
+                return relatorio_reposicao(limite=500, **valores)
+            
+            def concluir(relatorio):
+                if not tree.winfo_exists():
+                    return
+                tree.delete(*tree.get_children())
+                for linha in relatorio:
+                    valores_linha = tuple("-" if valor is None else valor for valor in linha)
+                    tree.insert("", "end", values=valores_linha, tags=('repor',) if linha[9] else ())
+                status.configure(text=f"{len(relatorio)} produtos mais urgentes "
+                                      f"(menor cobertura primeiro)")
+                calcular_btn.configure(state="normal")
+                aplicar_btn.configure(state="normal")
+            
+            def falhar(erro):
+                if tree.winfo_exists():
+                    status.configure(text="")
+                    calcular_btn.configure(state="normal")
+                self.mostrar_erro_banco(erro)
+            
+            # Atualizar o resumo grava no banco: vai para a fila de escrita
+            self.executor.gravar(tarefa, ao_concluir=concluir, ao_falhar=falhar)
+        
+        def aplicar():
+            valores = ler_parametros()
+            if valores is None:
+                return
+            if not messagebox.askyesno(
+                "Confirmar",
+                "Substituir o estoque mínimo dos produtos com consumo pelo ponto de reposição calculado?",
+                icon='warning'
+            ):
+                return
+            aplicar_btn.configure(state="disabled")
+            
+            def concluir(alterados):
+                messagebox.showinfo("Sucesso", f"Estoque mínimo atualizado em {alterados} produto(s).")
+                self.verificar_alertas_estoque()
+                if tree.winfo_exists():
+                    calcular()
+            
+            def falhar(erro):
+                if tree.winfo_exists():
+                    aplicar_btn.configure(state="normal")
+                self.mostrar_erro_banco(erro)
+            
+            self.executor.gravar(aplicar_pontos_reposicao, valores['janela'], valores['prazo'],
+                                 ao_concluir=concluir, ao_falhar=falhar)
+        
+        calcular_btn.configure(command=calcular)
+        aplicar_btn.configure(command=aplicar)
+        popup.bind('<Return>', lambda e: calcular_btn.invoke())
+        calcular()
+    
+    def tela_diagnostico(self):
+        """Chamadas, latência por função de banco.py e consultas lentas (ESTOQUE_METRICAS=1)"""
+        import banco
+        if not banco.METRICAS:
+            messagebox.showinfo(
+                "Diagnóstico",
+                "A instrumentação está desligada.\n"
+                "Defina ESTOQUE_METRICAS=1 antes de abrir o programa para medir as consultas."
+            )
+            return
+        from tkinter import ttk, filedialog
+        from metricas import obter_metricas, salvar_metricas, zerar_metricas
+        
+        frame, popup = self.criar_janela_popup("Diagnóstico do Banco", 1000, 650)
+        
+        botoes_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        botoes_frame.pack(fill="x", pady=(0, 10))
+        status = ctk.CTkLabel(frame, text="")
+        status.pack(anchor="w")
+        
+        colunas = ("Função", "Chamadas", "Erros", "Total (ms)", "Média", "p50", "p95", "p99", "Máximo")
+        tree = ttk.Treeview(frame, columns=colunas, show="headings", height=12)
+        for coluna in colunas:
+            tree.heading(coluna, text=coluna)
+            tree.column(coluna, width=220 if coluna == "Função" else 80,
+                        anchor="w" if coluna == "Função" else "center")
+        tree.pack(fill="both", expand=True)
+        
+        ctk.CTkLabel(frame, text="Consultas lentas (mais recentes primeiro):").pack(anchor="w", pady=(10, 0))
+        colunas_lentas = ("Data", "Função", "Duração (ms)", "Linhas", "Espera lock (ms)", "Comandos")
+        lentas = ttk.Treeview(frame, columns=colunas_lentas, show="headings", height=8)
+        for coluna in colunas_lentas:
+            lentas.heading(coluna, text=coluna)
+            lentas.column(coluna, width=420 if coluna == "Comandos" else 110,
+                          anchor="w" if coluna in ("Função", "Comandos") else "center")
+        lentas.pack(fill="both", expand=True)
+        
+        def atualizar():
+            metricas = obter_metricas()
+            tree.delete(*tree.get_children())
+            for nome, e in metricas['funcoes'].items():
+                tree.insert("", "end", values=(
+                    nome, e['chamadas'], e['erros'], f"{e['total_ms']:.1f}", f"{e['media_ms']:.2f}",
+                    f"{e['p50_ms']:.2f}", f"{e['p95_ms']:.2f}", f"{e['p99_ms']:.2f}", f"{e['maximo_ms']:.1f}"
+                ))
+            lentas.delete(*lentas.get_children())
+            for entrada in reversed(metricas['lentas']):
+                comandos = " | ".join(c['sql'] for c in entrada['comandos'])
+                lentas.insert("", "end", values=(
+                    entrada['data'], entrada['funcao'], f"{entrada['duracao_ms']:.1f}",
+                    "-" if entrada['linhas'] is None else entrada['linhas'],
+                    f"{entrada['espera_lock_ms']:.1f}", comandos
+                ))
+            status.configure(text=f"Desde {metricas['desde']}; lentas a partir de "
+                                  f"{metricas['limite_lenta_ms']:.0f} ms")
+        
+        def salvar():
+            caminho = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("Arquivos JSON", "*.json")],
+                title="Salvar Métricas"
+            )
+            if not caminho:
+                return
+            try:
+                salvar_metricas(caminho)
+                messagebox.showinfo("Sucesso", "Métricas salvas com sucesso!")
+            except OSError as e:
+                messagebox.showerror("Erro", f"Não foi possível salvar: {e}")
+        
+        def zerar():
+            zerar_metricas()
+            atualizar()
+        
+        ctk.CTkButton(botoes_frame, text="Atualizar", width=100, command=atualizar).pack(side="left", padx=3)
+        ctk.CTkButton(botoes_frame, text="Salvar JSON", width=100, command=salvar).pack(side="left", padx=3)
+        ctk.CTkButton(botoes_frame, text="Zerar", width=100, command=zerar).pack(side="left", padx=3)
+        atualizar()
+    
     def tela_movimentacoes(self):
-        frame, popup = self.criar_janela_popup("Histórico de Movimentações", 900, 600)
+        from tkinter import ttk
+        
+        frame, popup = self.criar_janela_popup("Histórico de Movimentações", 1000, 650)
+        
+        # Filtros (aplicados no banco, não na lista carregada)
+        filtros_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        filtros_frame.pack(fill="x", pady=(0, 10))
+        
+        filtro_inicio = ctk.CTkEntry(filtros_frame, width=100, placeholder_text="De dd/mm/aaaa")
+        filtro_inicio.pack(side="left", padx=3)
+        filtro_fim = ctk.CTkEntry(filtros_frame, width=100, placeholder_text="Até dd/mm/aaaa")
+        filtro_fim.pack(side="left", padx=3)
+        
+        filtro_tipo = ctk.CTkOptionMenu(filtros_frame, width=90, values=["Todos", "entrada", "saida", "ajuste"])
+        filtro_tipo.pack(side="left", padx=3)
+        
+        filtro_produto = ctk.CTkEntry(filtros_frame, width=150, placeholder_text="Produto (nome)")
+        filtro_produto.pack(side="left", padx=3)
+        filtro_responsavel = ctk.CTkEntry(filtros_frame, width=110, placeholder_text="Responsável")
+        filtro_responsavel.pack(side="left", padx=3)
+        
+        ctk.CTkLabel(filtros_frame, text="Página:").pack(side="left", padx=(8, 2))
+        tamanho_pagina = ctk.CTkOptionMenu(filtros_frame, width=70, values=["100", "200", "500", "1000"])
+        tamanho_pagina.set("200")
+        tamanho_pagina.pack(side="left", padx=3)
+        
+        def filtrar():
+            self.filtrar_historico(
+                filtro_inicio.get(), filtro_fim.get(), filtro_tipo.get(),
+                filtro_produto.get(), filtro_responsavel.get(), int(tamanho_pagina.get())
+            )
+        
+        filtrar_btn = ctk.CTkButton(filtros_frame, text="Filtrar (Enter)", width=100, command=filtrar)
+        filtrar_btn.pack(side="left", padx=3)
+        popup.bind('<Return>', lambda e: filtrar_btn.invoke())
         
         # Treeview
         tree = ttk.Treeview(frame, columns=("ID", "Data", "Tipo", "Produto", "Quantidade", "Responsável", "Motivo"), show="headings")
@@ -641,19 +1552,112 @@ class EstoqueApp:
         tree.heading("Motivo", text="Motivo")
         tree.column("Motivo", width=200, anchor="w")
         
-        # Scrollbar
+        # Scrollbar: ao se aproximar do fim da lista, carrega a próxima página
         scroll = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=scroll.set)
+        
+        def ao_rolar(primeiro, ultimo):
+            scroll.set(primeiro, ultimo)
+            if float(ultimo) > 0.9 and not self.historico['agendado']:
+                self.historico['agendado'] = True
+                self.root.after_idle(self.carregar_pagina_historico)
+        
+        tree.configure(yscrollcommand=ao_rolar)
         
         tree.pack(side="left", fill="both", expand=True)
         scroll.pack(side="right", fill="y")
         
-        # Carrega os dados
-        movimentacoes = obter_movimentacoes()
-        for mov in movimentacoes:
-            tree.insert("", "end", values=mov)
+        # Estado da paginação: filtros em vigor e chave (data, id) da última linha exibida
+        self.historico = {
+            'tree': tree, 'filtros': {}, 'limite': 200, 'apos': None, 'fim': False, 'agendado': False,
+            'geracao': 0, 'carregando': False
+        }
+        
+        # Carrega apenas a primeira página
+        self.carregar_pagina_historico()
+    
+    def filtrar_historico(self, data_inicio, data_fim, tipo, produto, responsavel, limite):
+        """Reinicia a paginação do histórico com novos filtros"""
+        try:
+            inicio = data_para_banco(data_inicio)
+            fim = data_para_banco(data_fim)
+        except ValueError:
+            messagebox.showerror("Erro", "Datas devem estar no formato dd/mm/aaaa!")
+            return
+        
+        if produto.strip():
+            historico = self.historico
+            
+            def aplicar(encontrado):
+                if historico is not self.historico or not historico['tree'].winfo_exists():
+                    return
+                if not encontrado:
+                    messagebox.showwarning("Aviso", "Produto não encontrado!")
+                    return
+                self.reiniciar_historico(inicio, fim, tipo, encontrado[0], responsavel, limite)
+            
+            self.executor.ler(obter_produto_por_nome, produto.strip(), ao_concluir=aplicar)
+        else:
+            self.reiniciar_historico(inicio, fim, tipo, None, responsavel, limite)
+    
+    def reiniciar_historico(self, inicio, fim, tipo, produto_id, responsavel, limite):
+        """Limpa a treeview e carrega a primeira página com os filtros validados"""
+        tree = self.historico['tree']
+        tree.delete(*tree.get_children())
+        self.historico.update({
+            'filtros': {
+                'data_inicio': inicio,
+                'data_fim': fim,
+                'tipo': None if tipo == "Todos" else tipo,
+                'produto_id': produto_id,
+                'responsavel': responsavel.strip() or None,
+            },
+            'limite': limite,
+            'apos': None,
+            'fim': False,
+            'geracao': self.historico['geracao'] + 1,  # descarta páginas dos filtros anteriores
+            'carregando': False,
+        })
+        self.carregar_pagina_historico()
+    
+    def carregar_pagina_historico(self):
+        """Acrescenta a próxima página do histórico à treeview"""
+        historico = getattr(self, 'historico', None)
+        if not historico:
+            return
+        historico['agendado'] = False
+        if historico['fim'] or historico['carregando'] or not historico['tree'].winfo_exists():
+            return
+        historico['carregando'] = True
+        geracao = historico['geracao']
+        
+        def acrescentar(pagina):
+            # Filtros trocados (ou tela reaberta) durante a leitura: página obsoleta
+            if historico is not self.historico or geracao != historico['geracao']:
+                return
+            historico['carregando'] = False
+            if not historico['tree'].winfo_exists():
+                return
+            if len(pagina) < historico['limite']:
+                historico['fim'] = True
+            if pagina:
+                ultima = pagina[-1]
+                historico['apos'] = (ultima[1], ultima[0])  # (data, id)
+            
+            for mov in pagina:
+                historico['tree'].insert("", "end", values=mov)
+        
+        def falhar(erro):
+            if geracao == historico['geracao']:
+                historico['carregando'] = False
+            self.mostrar_erro_banco(erro)
+        
+        self.executor.ler(
+            obter_movimentacoes_pagina, historico['limite'], historico['apos'], **historico['filtros'],
+            ao_concluir=acrescentar, ao_falhar=falhar
+        )
 
 if __name__ == "__main__":
     root = ctk.CTk()
     app = EstoqueApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.executor.encerrar()
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""Execução das chamadas ao banco fora da thread da interface (Tk)"""
+from concurrent.futures import ThreadPoolExecutor
+
+class ExecutorBanco:
+    """Fila de tarefas do banco com uma thread de escrita e um grupo de threads de leitura
+
+    As gravações passam todas pela mesma thread, na ordem em que foram pedidas, sem
+    disputar o lock de escrita do SQLite entre si; as leituras usam threads próprias
+    (cada uma com sua conexão persistente) e não esperam as gravações, graças ao WAL.
+    Os resultados voltam para a thread do Tk por root.after: enquanto houver tarefas
+    pendentes, elas são conferidas a cada INTERVALO ms.
+    """
+    INTERVALO = 30  # ms
+
+    def __init__(self, root, leitores=2, ao_falhar=None, ao_mudar_ocupado=None):
+        self.root = root
+        self.escrita = ThreadPoolExecutor(max_workers=1, thread_name_prefix='banco-escrita')
+        self.leitura = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix='banco-leitura')
+        self.ao_falhar = ao_falhar
+        self.ao_mudar_ocupado = ao_mudar_ocupado
+        self.pendentes = []  # (futuro, ao_concluir, ao_falhar)
+        self.acompanhamento = None
+        self.ocupado = False
+
+    def ler(self, funcao, *args, ao_concluir=None, ao_falhar=None, **kwargs):
+        """Executa uma consulta em uma thread de leitura; retorna o Future"""
+        return self._enviar(self.leitura, funcao, args, kwargs, ao_concluir, ao_falhar)
+
+    def gravar(self, funcao, *args, ao_concluir=None, ao_falhar=None, **kwargs):
+        """Executa uma gravação na thread de escrita, depois das já enviadas; retorna o Future"""
+        return self._enviar(self.escrita, funcao, args, kwargs, ao_concluir, ao_falhar)
+
+    def _enviar(self, grupo, funcao, args, kwargs, ao_concluir, ao_falhar):
+        """Enfileira a tarefa e garante que os resultados estão sendo acompanhados"""
+        futuro = grupo.submit(funcao, *args, **kwargs)
+        self.pendentes.append((futuro, ao_concluir, ao_falhar))
+        if self.acompanhamento is None:
+            self.acompanhamento = self.root.after(self.INTERVALO, self._acompanhar)
+        return futuro
+
+    def _acompanhar(self):
+        """Entrega, na thread do Tk, os resultados das tarefas que terminaram"""
+        concluidas = []
+        pendentes = []
+        for item in self.pendentes:
+            (concluidas if item[0].done() else pendentes).append(item)
+        self.pendentes = pendentes
+        try:
+            for futuro, ao_concluir, ao_falhar in concluidas:
+                if futuro.cancelled():
+                    continue
+                erro = futuro.exception()
+                if erro is not None:
+                    tratar = ao_falhar or self.ao_falhar
+                    if tratar is None:
+                        raise erro
+                    tratar(erro)
+                elif ao_concluir is not None:
+                    ao_concluir(futuro.result())
+        finally:
+            # Os callbacks podem ter enviado novas tarefas
+            if self.pendentes:
+                self._sinalizar_ocupado(True)
+                self.acompanhamento = self.root.after(self.INTERVALO, self._acompanhar)
+            else:
+                self._sinalizar_ocupado(False)
+                self.acompanhamento = None
+
+    def _sinalizar_ocupado(self, ocupado):
+        """Avisa a interface quando passa a haver (ou deixa de haver) tarefas em andamento
+
+        Só é chamado na conferência, então tarefas que terminam em menos de
+        INTERVALO ms não chegam a mostrar o indicador.
+        """
+        if ocupado != self.ocupado:
+            self.ocupado = ocupado
+            if self.ao_mudar_ocupado is not None:
+                self.ao_mudar_ocupado(ocupado)
+
+    def encerrar(self):
+        """Descarta as tarefas ainda na fila e libera as threads"""
+        if self.acompanhamento is not None:
+            self.root.after_cancel(self.acompanhamento)
+            self.acompanhamento = None
+        self.pendentes = []
+        self.leitura.shutdown(wait=False, cancel_futures=True)
+        self.escrita.shutdown(wait=False, cancel_futures=True)